@@ -1,14 +1,5 @@
 #!/bin/bash
 
-# Safety areas and velocity scaling as requested
-SIMULATIONS=("safety_areas" "velocity_scaling")
-
-# Collection names
-COLLECTIONS=("task_results_online" "task_synergies")
-
-# Base directory for file paths
-BASE_FILE_PATH="Mongodb_Collections"
-
 # Create a virtual environment in the 'venv' directory and install requirements
 VENV_DIR="venv"
 REQUIREMENTS_FILE="requirements.txt"
@@ -35,39 +26,9 @@ fi
 PYTHON_EXECUTABLE="python3"
 PYTHON_SCRIPT="import_data_to_mongodb.py"
 
-# Iterate over each simulation
-for simulation_name in "${SIMULATIONS[@]}"
-do
-    # Set database name (using the element as requested)
-    DATABASE_NAME="$simulation_name"
-    # Iterate over each collection
-    for collection_name in "${COLLECTIONS[@]}"
-    do
-        # Compose the file path
-        FILE_PATH="$simulation_name/$BASE_FILE_PATH/$collection_name"
-        echo "$FILE_PATH"
-
-        # Check if the specified file exists
-        if [ ! -f "$FILE_PATH" ]; then
-            echo "File $FILE_PATH does not exist."
-            exit 1
-        fi
-
-
-        # Execute the Python script with the provided arguments
-        echo "Running Python script to import data into MongoDB for database '$DATABASE_NAME' and collection '$collection_name'..."
-        $PYTHON_EXECUTABLE $PYTHON_SCRIPT $DATABASE_NAME $collection_name $FILE_PATH
-
-        echo "Operation completed for database '$DATABASE_NAME' and collection '$collection_name'."
-    done
-done
+# Import every collection (safety_areas, velocity_scaling and hrc_case_study databases)
+# concurrently from a single process; the job list lives in import_data_to_mongodb.py
+echo "Running Python script to import data into MongoDB..."
+$PYTHON_EXECUTABLE $PYTHON_SCRIPT --all
 
-# Experiments
-DATABASE_NAME="hrc_case_study"
-for collection_name in "${COLLECTIONS[@]}"
-do
-    FILE_PATH="hrc_case_study/hrc_case_study_results/Mongodb_Collections/$collection_name"
-    echo "Running Python script to import data into MongoDB for database '$DATABASE_NAME' and collection '$collection_name'..."
-    $PYTHON_EXECUTABLE $PYTHON_SCRIPT $DATABASE_NAME $collection_name $FILE_PATH
-    echo "Operation completed for database '$DATABASE_NAME' and collection '$collection_name'."
-done
+echo "Import completed."
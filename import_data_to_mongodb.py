@@ -1,76 +1,252 @@
+import os
 import sys
 import json
-from pymongo import MongoClient
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, ReplaceOne, DeleteOne
 from pymongo.errors import BulkWriteError, ConfigurationError
-from bson import ObjectId
-from datetime import datetime
+import bson
+from bson import json_util
 
-def convert_special_fields(document):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from extended_json import iter_documents, iter_batches, file_digest  # noqa: E402
+from statistical_pipeline import StatisticalPipeline  # noqa: E402
+from recipe_index import RECIPES_COLLECTION, store_recipes  # noqa: E402
+from query_cache import bump_generation  # noqa: E402
+
+MONGO_URI = 'mongodb://localhost:27017/'
+BATCH_SIZE = 1000
+MANIFEST_DIR = ".import_manifest"
+
+# Collections imported by import_data.sh: (database_name, collection_name, file_path)
+SIMULATIONS = ["safety_areas", "velocity_scaling"]
+COLLECTIONS = ["task_results_online", "task_synergies"]
+IMPORT_JOBS = [
+    (simulation_name, collection_name, f"{simulation_name}/Mongodb_Collections/{collection_name}")
+    for simulation_name in SIMULATIONS for collection_name in COLLECTIONS
+] + [
+    ("hrc_case_study", collection_name, f"hrc_case_study/hrc_case_study_results/Mongodb_Collections/{collection_name}")
+    for collection_name in COLLECTIONS
+]
+
+
+def create_indexes(collection):
     """
-    Recursively convert special fields like $oid and $date in a document.
+    Create the compound indexes backing the analysis pipelines (see StatisticalPipeline.recommended_indexes).
+    """
+    for keys in StatisticalPipeline.recommended_indexes().get(collection.name, []):
+        collection.create_index(keys)
+
+
+def index_recipes(collection):
+    """
+    Store the parsed identifiers of the recipes of a task results collection in the recipes collection.
+    """
+    if collection.name != RECIPES_COLLECTION and collection.find_one({"recipe": {"$exists": True}}, {"_id": True}):
+        store_recipes(collection)
+
+
+def import_data_to_mongodb(database_name, collection_name, file_path, client=None, batch_size=BATCH_SIZE):
+    """
+    Stream a collection dump into MongoDB with fixed-size unordered batches.
+    Returns True when the collection is in place (imported now or already present).
     """
-    if isinstance(document, dict):
-        for key, value in document.items():
-            if isinstance(value, dict):
-                # Check for $oid and $date fields and convert them
-                if "$oid" in value:
-                    document[key] = ObjectId(value["$oid"])
-                elif "$date" in value:
-                    document[key] = datetime.fromisoformat(value["$date"].replace("Z", "+00:00"))
-                else:
-                    # Recursively convert inner dictionaries
-                    convert_special_fields(value)
-            elif isinstance(value, list):
-                # Recursively convert lists
-                for item in value:
-                    convert_special_fields(item)
-    elif isinstance(document, list):
-        for item in document:
-            convert_special_fields(item)
-    return document
-
-def import_data_to_mongodb(database_name, collection_name, file_path):
     try:
         # Connect to MongoDB client
-        client = MongoClient('mongodb://localhost:27017/')
-        
+        if client is None:
+            client = MongoClient(MONGO_URI)
+
         # Access the database
         db = client[database_name]
-        
+
         # Check if the collection already exists
         if collection_name in db.list_collection_names():
             print(f"Collection '{collection_name}' already exists in database '{database_name}'. Data will not be inserted.")
-            return
-        
-        # Load data from the JSON file
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-        
-        # Convert special fields in the data
-        data = [convert_special_fields(doc) for doc in data]
-        
-        # Insert data into the collection
-        db[collection_name].insert_many(data)
-        
-        print(f"Data inserted successfully into collection '{collection_name}' of database '{database_name}'.")
-        
+            return True
+
+        if not os.path.isfile(file_path):
+            print(f"File {file_path} does not exist.")
+            return False
+
+        # Documents are decoded while parsing and written batch by batch
+        inserted = 0
+        for batch in iter_batches(iter_documents(file_path), batch_size):
+            inserted += len(db[collection_name].insert_many(batch, ordered=False).inserted_ids)
+        create_indexes(db[collection_name])
+        index_recipes(db[collection_name])
+
+        print(f"Data inserted successfully into collection '{collection_name}' of database '{database_name}' ({inserted} documents).")
+        return True
+
     except ConfigurationError as ce:
         print(f"MongoDB configuration error: {ce}")
     except BulkWriteError as bwe:
         print(f"Error inserting data: {bwe.details}")
     except Exception as e:
         print(f"An error occurred: {e}")
+    return False
+
+
+def document_key(document):
+    """
+    Stable manifest key of a document (its _id in Extended JSON).
+    """
+    return json_util.dumps(document["_id"])
+
+
+def document_digest(document):
+    """
+    Content digest of a decoded document, computed on its BSON encoding.
+    """
+    return hashlib.blake2b(bson.encode(document), digest_size=16).hexdigest()
+
+
+def manifest_path(database_name, collection_name):
+    return os.path.join(MANIFEST_DIR, f"{database_name}.{collection_name}.json")
+
+
+def load_manifest(database_name, collection_name):
+    path = manifest_path(database_name, collection_name)
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_manifest(database_name, collection_name, manifest):
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = manifest_path(database_name, collection_name)
+    with open(path + ".tmp", 'w') as file:
+        json.dump(manifest, file)
+    os.replace(path + ".tmp", path)
+
+
+def sync_data_to_mongodb(database_name, collection_name, file_path, client=None, batch_size=BATCH_SIZE, prune=False):
+    """
+    Incrementally synchronise a collection with its dump.
+    A manifest of per-document digests (keyed on _id) is kept in MANIFEST_DIR, so only new or
+    changed documents are upserted; documents gone from the dump are reported (and deleted with prune).
+    Returns the change report, or None on error.
+    """
+    try:
+        if client is None:
+            client = MongoClient(MONGO_URI)
+        collection = client[database_name][collection_name]
+
+        if not os.path.isfile(file_path):
+            print(f"File {file_path} does not exist.")
+            return None
+
+        stat = os.stat(file_path)
+        manifest = load_manifest(database_name, collection_name)
+        # A manifest is trusted only while the collection still holds what it describes
+        if manifest is not None and collection.estimated_document_count() != len(manifest["documents"]):
+            manifest = None
+        if manifest is None:
+            manifest = {"file": {}, "documents": {}}
+
+        report = {"inserted": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        recorded_file = manifest["file"]
+        if recorded_file.get("size") == stat.st_size and recorded_file.get("mtime_ns") == stat.st_mtime_ns:
+            report["unchanged"] = len(manifest["documents"])
+        else:
+            sha256 = file_digest(file_path)
+            if recorded_file.get("sha256") == sha256:
+                report["unchanged"] = len(manifest["documents"])
+            else:
+                previous_digests = manifest["documents"]
+                digests = {}
+                operations = []
+                for document in iter_documents(file_path):
+                    key = document_key(document)
+                    digest = document_digest(document)
+                    digests[key] = digest
+                    previous = previous_digests.get(key)
+                    if previous == digest:
+                        report["unchanged"] += 1
+                        continue
+                    report["inserted" if previous is None else "updated"] += 1
+                    operations.append(ReplaceOne({"_id": document["_id"]}, document, upsert=True))
+                    if len(operations) >= batch_size:
+                        collection.bulk_write(operations, ordered=False)
+                        operations = []
+
+                removed = [key for key in previous_digests if key not in digests]
+                report["removed"] = len(removed)
+                if prune:
+                    operations.extend(DeleteOne({"_id": json_util.loads(key)}) for key in removed)
+                else:
+                    # Removed documents stay in the collection, hence in the manifest
+                    digests.update((key, previous_digests[key]) for key in removed)
+                if operations:
+                    collection.bulk_write(operations, ordered=False)
+                if report["updated"] or (prune and removed):
+                    # Replaced or deleted documents can leave the collection fingerprints unchanged
+                    bump_generation(collection)
+                manifest["documents"] = digests
+                create_indexes(collection)
+                index_recipes(collection)
+            manifest["file"] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+            save_manifest(database_name, collection_name, manifest)
+
+        print(f"Collection '{collection_name}' of database '{database_name}' synchronised: "
+              f"{report['inserted']} inserted, {report['updated']} updated, "
+              f"{report['unchanged']} unchanged, {report['removed']} removed{'' if prune else ' (kept)'}.")
+        return report
+
+    except ConfigurationError as ce:
+        print(f"MongoDB configuration error: {ce}")
+    except BulkWriteError as bwe:
+        print(f"Error writing data: {bwe.details}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    return None
+
+
+def import_all(jobs=IMPORT_JOBS, max_workers=None, batch_size=BATCH_SIZE, sync=False, prune=False):
+    """
+    Import (or synchronise) several collections concurrently over one shared client.
+    Parsing of one dump overlaps with the network writes of the others.
+    """
+    client = MongoClient(MONGO_URI)
+    with ThreadPoolExecutor(max_workers=max_workers or len(jobs)) as executor:
+        if sync:
+            futures = [
+                executor.submit(sync_data_to_mongodb, database_name, collection_name, file_path, client, batch_size, prune)
+                for database_name, collection_name, file_path in jobs
+            ]
+            return all(future.result() is not None for future in futures)
+        futures = [
+            executor.submit(import_data_to_mongodb, database_name, collection_name, file_path, client, batch_size)
+            for database_name, collection_name, file_path in jobs
+        ]
+        return all(future.result() for future in futures)
+
 
 # Check for arguments passed from the Bash script
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print(f"Usage: {sys.argv[0]} <database_name> <collection_name> <file_path>")
-        sys.exit(1)
-    
-    # Arguments provided by the Bash script
-    database_name = sys.argv[1]
-    collection_name = sys.argv[2]
-    file_path = sys.argv[3]
-    
-    # Perform the import of data into MongoDB
-    import_data_to_mongodb(database_name, collection_name, file_path)
+    parser = argparse.ArgumentParser(description="Import Extended-JSON collection dumps into MongoDB.")
+    parser.add_argument("database_name", nargs="?", help="Target database")
+    parser.add_argument("collection_name", nargs="?", help="Target collection")
+    parser.add_argument("file_path", nargs="?", help="Collection dump to import")
+    parser.add_argument("--all", action="store_true", help="Import every collection of import_data.sh concurrently")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Documents per insert batch")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent imports (default: one per collection)")
+    parser.add_argument("--sync", action="store_true",
+                        help="Upsert only new or changed documents into existing collections (digest manifest)")
+    parser.add_argument("--prune", action="store_true", help="With --sync, delete documents no longer in the dump")
+    args = parser.parse_args()
+
+    if args.all:
+        success = import_all(max_workers=args.workers, batch_size=args.batch_size, sync=args.sync, prune=args.prune)
+    elif args.file_path is not None and args.sync:
+        success = sync_data_to_mongodb(args.database_name, args.collection_name, args.file_path,
+                                       batch_size=args.batch_size, prune=args.prune) is not None
+    elif args.file_path is not None:
+        success = import_data_to_mongodb(args.database_name, args.collection_name, args.file_path,
+                                         batch_size=args.batch_size)
+    else:
+        parser.error("either --all or <database_name> <collection_name> <file_path> is required")
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,281 @@
+#! /usr/bin/env python3
+
+import os
+import re
+from functools import reduce
+from operator import mul
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from columnar_cache import load_collection, frame_to_documents
+from instrumentation import span
+
+# Where the Extended-JSON dumps of each database live (same layout used by import_data.sh)
+DUMP_DIRECTORIES = {
+    "safety_areas": "safety_areas/Mongodb_Collections",
+    "velocity_scaling": "velocity_scaling/Mongodb_Collections",
+    "hrc_case_study": "hrc_case_study/hrc_case_study_results/Mongodb_Collections"
+}
+
+
+@dataclass
+class LocalInterface:
+    """Mongo-free drop-in for MongoInterface reading the dumps through the columnar cache
+
+    Aggregation pipelines are evaluated with vectorized pandas operations over the cached frames.
+    """
+    database_name: str
+    dump_directory: str = None
+    frames: dict = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        if self.dump_directory is None:
+            self.dump_directory = DUMP_DIRECTORIES.get(self.database_name)
+        if self.dump_directory is None or not os.path.isdir(self.dump_directory):
+            raise Exception(f"No collection dumps for database {self.database_name}")
+
+    def collection_exist(self, collection_name: str):
+        return os.path.isfile(os.path.join(self.dump_directory, collection_name))
+
+    def query(self, collection_name: str, pipeline: list):
+        frame = self.get_collection(collection_name)
+        with span("local.query", "local", database=self.database_name, collection=collection_name) as query_span:
+            documents = evaluate_pipeline(frame, pipeline)
+            query_span.set(documents=len(documents))
+        return documents
+
+    def get_collection(self, collection_name) -> pd.DataFrame:
+        if collection_name not in self.frames:
+            if not self.collection_exist(collection_name):
+                raise ValueError("This collection not in db")
+            with span("local.load_collection", "local", collection=collection_name) as load_span:
+                self.frames[collection_name] = load_collection(os.path.join(self.dump_directory, collection_name))
+                load_span.set(documents=len(self.frames[collection_name]))
+        return self.frames[collection_name]
+
+
+def evaluate_pipeline(frame: pd.DataFrame, pipeline: list) -> list:
+    """Evaluate an aggregation pipeline over a frame
+
+    Supported stages: $match (equality, $eq/$ne/$in), $sort, $group, $addFields/$set, $project and
+    $setWindowFields over whole partitions.
+
+    Returns:
+        list: Result documents, as returned by a consumed aggregation cursor
+    """
+    for stage in pipeline:
+        (operator, specification), = stage.items()
+        if operator not in STAGES:
+            raise NotImplementedError(f"Stage {operator} is not supported by the local backend")
+        frame = STAGES[operator](frame, specification)
+    return frame_to_documents(frame)
+
+
+MATCH_OPERATORS = {
+    "$eq": lambda column, value: column == value if value is not None else column.isna(),
+    "$ne": lambda column, value: column != value if value is not None else column.notna(),
+    "$in": lambda column, values: column.isin(values)
+}
+
+
+def match_stage(frame: pd.DataFrame, specification: dict) -> pd.DataFrame:
+    mask = np.ones(len(frame), dtype=bool)
+    for key, condition in specification.items():
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator not in MATCH_OPERATORS:
+                raise NotImplementedError(f"Match operator {operator} is not supported by the local backend")
+            column = frame[key] if key in frame else pd.Series(None, index=frame.index, dtype=object)
+            mask &= np.asarray(MATCH_OPERATORS[operator](column, value), dtype=bool)
+    return frame[mask]
+
+
+def sort_stage(frame: pd.DataFrame, specification: dict) -> pd.DataFrame:
+    return frame.sort_values(list(specification), ascending=[order > 0 for order in specification.values()],
+                             kind="stable")
+
+
+def add_fields_stage(frame: pd.DataFrame, specification: dict) -> pd.DataFrame:
+    frame = frame.copy()
+    for key, expression in specification.items():
+        frame[key] = evaluate_expression(frame, expression)
+    return frame
+
+
+def project_stage(frame: pd.DataFrame, specification: dict) -> pd.DataFrame:
+    columns = {}
+    if specification.get("_id", True) not in (False, 0) and "_id" in frame:
+        columns["_id"] = frame["_id"]
+    for key, expression in specification.items():
+        if key == "_id":
+            continue
+        if expression is True or expression == 1:
+            if key in frame:
+                columns[key] = frame[key]
+        elif expression is False or expression == 0:
+            raise NotImplementedError("Exclusion projections are not supported by the local backend")
+        else:
+            columns[key] = evaluate_expression(frame, expression)
+    projected = pd.DataFrame(columns, index=frame.index)
+    projected.attrs = frame.attrs
+    return projected
+
+
+def percentile_accumulator(argument: dict):
+    probabilities = list(argument["p"])
+    return lambda values: values.quantile(probabilities).tolist()
+
+
+ACCUMULATORS = {
+    "$min": lambda argument: "min",
+    "$max": lambda argument: "max",
+    "$sum": lambda argument: "sum",
+    "$avg": lambda argument: "mean",
+    "$first": lambda argument: "first",
+    "$last": lambda argument: "last",
+    "$push": lambda argument: list,
+    "$stdDevPop": lambda argument: (lambda values: values.std(ddof=0)),
+    "$stdDevSamp": lambda argument: (lambda values: values.std(ddof=1)),
+    "$median": lambda argument: "median",
+    "$percentile": percentile_accumulator
+}
+
+
+def accumulator_inputs(frame: pd.DataFrame, specification: dict):
+    """Evaluate the input of every accumulator and pick the matching pandas aggregation"""
+    values = {}
+    aggregations = {}
+    for output, accumulator in specification.items():
+        (operator, argument), = accumulator.items()
+        if operator not in ACCUMULATORS:
+            raise NotImplementedError(f"Accumulator {operator} is not supported by the local backend")
+        expression = argument["input"] if operator in ("$median", "$percentile") else argument
+        values[output] = evaluate_expression(frame, expression)
+        aggregations[output] = ACCUMULATORS[operator](argument)
+    return pd.DataFrame(values, index=frame.index), aggregations
+
+
+def group_keys(frame: pd.DataFrame, key_expression) -> pd.Series:
+    if key_expression is None:
+        return pd.Series(np.zeros(len(frame), dtype=np.int8), index=frame.index)
+    return evaluate_expression(frame, key_expression)
+
+
+def group_stage(frame: pd.DataFrame, specification: dict) -> pd.DataFrame:
+    key_expression = specification["_id"]
+    values, aggregations = accumulator_inputs(
+        frame, {output: accumulator for output, accumulator in specification.items() if output != "_id"})
+
+    key = group_keys(frame, key_expression)
+    if aggregations:
+        grouped = values.groupby(key, observed=True, sort=False, dropna=False).agg(aggregations)
+        grouped.index.name = "_id"
+        grouped = grouped.reset_index()
+    else:
+        # distinct keys only
+        grouped = pd.DataFrame({"_id": key.drop_duplicates().to_numpy()})
+    if key_expression is None:
+        grouped["_id"] = None
+    if isinstance(grouped["_id"].dtype, pd.CategoricalDtype):
+        grouped["_id"] = grouped["_id"].astype(object)
+    return grouped
+
+
+def set_window_fields_stage(frame: pd.DataFrame, specification: dict) -> pd.DataFrame:
+    output = {}
+    for field_name, window_accumulator in specification["output"].items():
+        window_accumulator = dict(window_accumulator)
+        window = window_accumulator.pop("window", None)
+        if window is not None and window != {"documents": ["unbounded", "unbounded"]}:
+            raise NotImplementedError("Only whole-partition windows are supported by the local backend")
+        output[field_name] = window_accumulator
+    values, aggregations = accumulator_inputs(frame, output)
+
+    key = group_keys(frame, specification.get("partitionBy"))
+    frame = frame.copy()
+    grouped = values.groupby(key, observed=True, sort=False, dropna=False)
+    for field_name, aggregation in aggregations.items():
+        frame[field_name] = grouped[field_name].transform(aggregation)
+    return frame
+
+
+STAGES = {
+    "$match": match_stage,
+    "$sort": sort_stage,
+    "$group": group_stage,
+    "$addFields": add_fields_stage,
+    "$set": add_fields_stage,
+    "$project": project_stage,
+    "$setWindowFields": set_window_fields_stage
+}
+
+
+def evaluate_expression(frame: pd.DataFrame, expression):
+    """Evaluate an aggregation expression column-wise
+
+    Returns:
+        pd.Series | scalar: One value per row, or a literal
+    """
+    if isinstance(expression, str) and expression == "$$ROOT":
+        return pd.Series(frame_to_documents(frame), index=frame.index, dtype=object)
+    if isinstance(expression, str) and expression.startswith("$"):
+        column = frame[expression[1:]]
+        return column.astype(object) if isinstance(column.dtype, pd.CategoricalDtype) else column
+    if isinstance(expression, dict) and len(expression) == 1:
+        (operator, arguments), = expression.items()
+        if operator in EXPRESSION_OPERATORS:
+            return EXPRESSION_OPERATORS[operator](frame, arguments)
+        if operator.startswith("$"):
+            raise NotImplementedError(f"Operator {operator} is not supported by the local backend")
+    return expression
+
+
+def list_operator(function):
+    """Operator taking a list of expressions as arguments"""
+    return lambda frame, arguments: function(*[evaluate_expression(frame, argument) for argument in arguments])
+
+
+def where(frame: pd.DataFrame, condition, then, otherwise):
+    """Row-wise choice between two evaluated expressions (Series or literals)"""
+    condition = np.broadcast_to(np.asarray(condition, dtype=bool), (len(frame),))
+    result = pd.Series(otherwise, index=frame.index, dtype=object)
+    then = pd.Series(then, index=frame.index, dtype=object)
+    result[condition] = then[condition]
+    return result.infer_objects()
+
+
+def cond_operator(frame: pd.DataFrame, arguments):
+    if isinstance(arguments, dict):
+        arguments = [arguments["if"], arguments["then"], arguments["else"]]
+    condition, then, otherwise = [evaluate_expression(frame, argument) for argument in arguments]
+    return where(frame, condition, then, otherwise)
+
+
+def switch_operator(frame: pd.DataFrame, arguments: dict):
+    result = evaluate_expression(frame, arguments.get("default"))
+    for branch in reversed(arguments["branches"]):
+        result = where(frame, evaluate_expression(frame, branch["case"]),
+                       evaluate_expression(frame, branch["then"]), result)
+    return result
+
+
+def regex_match_operator(frame: pd.DataFrame, arguments: dict):
+    flags = re.IGNORECASE if "i" in arguments.get("options", "") else 0
+    values = pd.Series(evaluate_expression(frame, arguments["input"]), index=frame.index).astype(str)
+    return values.str.contains(arguments["regex"], flags=flags, regex=True).to_numpy(dtype=bool)
+
+
+EXPRESSION_OPERATORS = {
+    "$add": list_operator(lambda *terms: sum(terms)),
+    "$subtract": list_operator(lambda minuend, subtrahend: minuend - subtrahend),
+    "$multiply": list_operator(lambda *factors: reduce(mul, factors)),
+    "$divide": list_operator(lambda dividend, divisor: dividend / divisor),
+    "$eq": list_operator(lambda left, right: left == right),
+    "$ne": list_operator(lambda left, right: left != right),
+    "$cond": cond_operator,
+    "$switch": switch_operator,
+    "$regexMatch": regex_match_operator
+}
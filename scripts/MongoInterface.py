@@ -1,10 +1,18 @@
 #! /usr/bin/env python3
 
-from dataclasses import dataclass
+import time
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass, field
 
 from pymongo import MongoClient
 import pymongo.errors
 
+from statistical_pipeline import StatisticalPipeline
+from query_cache import QueryCache, collection_fingerprint
+from instrumentation import span, traced_cursor
+
 GREEN = '\033[92m'
 YELLOW = '\033[93m'
 RED = '\033[91m'
@@ -13,35 +21,280 @@ END = '\033[0m'
 
 CONNECTION_LOST = RED + "Connection to Database lost" + END
 
+DEFAULT_URI = "mongodb://localhost:27017/"
+SERVER_SELECTION_TIMEOUT_MS = 5000  # 5 seconds of maximum connection wait
+METADATA_TTL = 60.0  # seconds a cached list of collection names stays valid
+
+# Process-wide clients (each one owns a connection pool), keyed by URI
+_clients = {}
+# asyncio clients are bound to their event loop: loop -> {uri: client}, dropped with the loop
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+# Cached collection names, keyed by (uri, database_name): (timestamp, set of names)
+_collection_names = {}
+
+
+def get_client(uri: str = DEFAULT_URI) -> MongoClient:
+    """Shared MongoClient for a URI. Clients connect lazily, on the first operation."""
+    with _clients_lock:
+        if uri not in _clients:
+            _clients[uri] = MongoClient(uri, serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS)
+        return _clients[uri]
+
+
+def get_async_client(uri: str = DEFAULT_URI):
+    """Shared asyncio client for a URI and the running event loop (pymongo >= 4.13 AsyncMongoClient)"""
+    from pymongo import AsyncMongoClient
+
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        if uri not in clients:
+            clients[uri] = AsyncMongoClient(uri, serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS)
+        return clients[uri]
+
+
+async def close_async_clients():
+    """Close the asyncio clients of the running event loop (to be awaited before the loop ends)"""
+    with _clients_lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+def invalidate_metadata(uri: str = None, database_name: str = None):
+    """Drop cached collection names (all of them, or only those of one uri/database)"""
+    with _clients_lock:
+        for key in list(_collection_names):
+            if (uri is None or key[0] == uri) and (database_name is None or key[1] == database_name):
+                del _collection_names[key]
+
+
+def cached_collection_names(key: tuple, ttl: float):
+    with _clients_lock:
+        cached = _collection_names.get(key)
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    return None
+
+
+def store_collection_names(key: tuple, names) -> set:
+    names = set(names)
+    with _clients_lock:
+        _collection_names[key] = (time.monotonic(), names)
+    return names
+
+
+def aggregate_options(batch_size: int = None, allow_disk_use: bool = None) -> dict:
+    """Keyword arguments of Collection.aggregate for the configured cursor batching"""
+    options = {}
+    if batch_size is not None:
+        options["batchSize"] = batch_size
+    if allow_disk_use is not None:
+        options["allowDiskUse"] = allow_disk_use
+    return options
+
 
 @dataclass
 class MongoInterface:
     database_name: str
+    uri: str = DEFAULT_URI
+    batch_size: int = None  # documents per cursor batch (server default if None)
+    allow_disk_use: bool = None  # let large $group/$sort stages spill to disk
+    metadata_ttl: float = METADATA_TTL
+    cache: QueryCache = None  # aggregation results cache (disabled if None)
+    _db: object = field(default=None, init=False, repr=False)
 
     def __post_init__(self):
-        client = MongoClient(serverSelectionTimeoutMS=5000)  # 5 seconds of maximum connection wait
+        self.client = get_client(self.uri)
+
+    @property
+    def db(self):
+        if self._db is None:
+            with span("mongo.list_database_names", "mongo"):
+                database_names = self.client.list_database_names()
+            if self.database_name not in database_names:
+                raise Exception(f"Database {self.database_name} is not on the server")
+            self._db = self.client[self.database_name]
+        return self._db
 
-        if self.database_name not in client.list_database_names():
-            raise Exception
+    def collection_names(self, refresh: bool = False) -> set:
+        key = (self.uri, self.database_name)
+        names = None if refresh else cached_collection_names(key, self.metadata_ttl)
+        if names is None:
+            db = self.db
+            with span("mongo.list_collection_names", "mongo", database=self.database_name):
+                names = store_collection_names(key, db.list_collection_names())
+        return names
 
-        self.db = client[self.database_name]
+    def invalidate_cache(self):
+        invalidate_metadata(self.uri, self.database_name)
 
     def collection_exist(self, collection_name: str):
-        if collection_name not in self.db.list_collection_names():
-            return False
-        return True
+        if collection_name in self.collection_names():
+            return True
+        # A collection created after the names were cached must not look missing
+        return collection_name in self.collection_names(refresh=True)
 
-    def query(self, collection_name: str, pipeline: str):
+    def query(self, collection_name: str, pipeline: list, batch_size: int = None, allow_disk_use: bool = None):
+        """Run an aggregation. Returns a cursor, or a list of documents when the results cache is enabled."""
         if not self.collection_exist(collection_name):
             raise Exception(f"Collection {collection_name} is not in database")
 
-        try:
-            result = self.db[collection_name].aggregate(pipeline)
-        except pymongo.errors.AutoReconnect:
-            raise Exception(CONNECTION_LOST)
-        return result
+        with span("mongo.query", "mongo", database=self.database_name, collection=collection_name) as query_span:
+            try:
+                if self.cache is not None:
+                    key = self.cache.key(self.database_name, collection_name, pipeline)
+                    fingerprint = collection_fingerprint(self.db[collection_name])
+                    result = self.cache.get(key, fingerprint)
+                    query_span.set(cached=result is not None)
+                    if result is not None:
+                        query_span.set(documents=len(result))
+                        return result
+
+                options = aggregate_options(self.batch_size if batch_size is None else batch_size,
+                                            self.allow_disk_use if allow_disk_use is None else allow_disk_use)
+                result = self.db[collection_name].aggregate(pipeline, **options)
+
+                if self.cache is not None:
+                    result = list(traced_cursor(result, "mongo.cursor", collection=collection_name))
+                    self.cache.put(key, fingerprint, result)
+                    query_span.set(documents=len(result))
+                    return result
+            except pymongo.errors.AutoReconnect:
+                raise Exception(CONNECTION_LOST)
+        # consumed by the caller, after the query span
+        return traced_cursor(result, "mongo.cursor", collection=collection_name)
 
     def get_collection(self, collection_name):
-        if collection_name not in self.db.list_collection_names():
+        if not self.collection_exist(collection_name):
             raise ValueError("This collection not in db")
         return self.db[collection_name]
+
+    def ensure_indexes(self, collection_name: str = None):
+        """Create the indexes recommended for the shipped pipelines (no-op when they already exist)
+
+        Args:
+            collection_name (str): Collection to index; all the known collections of the db if None
+
+        Returns:
+            dict: collection name -> names of its recommended indexes
+        """
+        recommended = StatisticalPipeline.recommended_indexes()
+        collection_names = [collection_name] if collection_name is not None else self.collection_names(refresh=True)
+        created = {}
+        for name in collection_names:
+            if name not in recommended or not self.collection_exist(name):
+                continue
+            created[name] = [self.db[name].create_index(keys) for keys in recommended[name]]
+        return created
+
+    def explain(self, collection_name: str, pipeline: list):
+        """Summarise the query plan chosen for an aggregation
+
+        Returns:
+            dict: plan stages, indexes used and whether the pipeline avoids collection scans
+                  and in-memory sorts
+        """
+        if not self.collection_exist(collection_name):
+            raise Exception(f"Collection {collection_name} is not in database")
+
+        try:
+            explanation = self.db.command("explain", {"aggregate": collection_name, "pipeline": pipeline, "cursor": {}},
+                                          verbosity="queryPlanner")
+        except pymongo.errors.AutoReconnect:
+            raise Exception(CONNECTION_LOST)
+
+        stages = []
+        indexes = []
+
+        def visit(node):
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if key == "rejectedPlans":
+                        continue
+                    if key == "stage" and isinstance(value, str):
+                        stages.append(value)
+                    elif key == "indexName" and isinstance(value, str):
+                        indexes.append(value)
+                    else:
+                        visit(value)
+            elif isinstance(node, list):
+                for item in node:
+                    visit(item)
+
+        visit(explanation)
+        return {
+            "stages": stages,
+            "pipeline_stages": [next(iter(stage)) for stage in explanation.get("stages", [])],
+            "indexes": sorted(set(indexes)),
+            "index_backed": "COLLSCAN" not in stages and "SORT" not in stages
+        }
+
+
+@dataclass
+class AsyncMongoInterface:
+    """asyncio counterpart of MongoInterface, sharing one pooled client per URI and event loop
+
+    Several pipelines can be awaited concurrently (see query_many) over the same connection pool; await
+    close_async_clients() before the loop ends to close it.
+    """
+    database_name: str
+    uri: str = DEFAULT_URI
+    batch_size: int = None
+    allow_disk_use: bool = None
+    metadata_ttl: float = METADATA_TTL
+    # database handles of the clients of each event loop
+    _dbs: weakref.WeakKeyDictionary = field(default_factory=weakref.WeakKeyDictionary, init=False, repr=False)
+
+    async def get_db(self):
+        loop = asyncio.get_running_loop()
+        client = get_async_client(self.uri)
+        db = self._dbs.get(loop)
+        if db is None or db.client is not client:
+            if self.database_name not in await client.list_database_names():
+                raise Exception(f"Database {self.database_name} is not on the server")
+            db = self._dbs[loop] = client[self.database_name]
+        return db
+
+    async def collection_names(self, refresh: bool = False) -> set:
+        key = (self.uri, self.database_name)
+        names = None if refresh else cached_collection_names(key, self.metadata_ttl)
+        if names is None:
+            db = await self.get_db()
+            names = store_collection_names(key, await db.list_collection_names())
+        return names
+
+    def invalidate_cache(self):
+        invalidate_metadata(self.uri, self.database_name)
+
+    async def collection_exist(self, collection_name: str):
+        if collection_name in await self.collection_names():
+            return True
+        return collection_name in await self.collection_names(refresh=True)
+
+    async def query(self, collection_name: str, pipeline: list, batch_size: int = None, allow_disk_use: bool = None):
+        """Run an aggregation and return all its documents"""
+        if not await self.collection_exist(collection_name):
+            raise Exception(f"Collection {collection_name} is not in database")
+
+        options = aggregate_options(self.batch_size if batch_size is None else batch_size,
+                                    self.allow_disk_use if allow_disk_use is None else allow_disk_use)
+        db = await self.get_db()
+        with span("mongo.async_query", "mongo", database=self.database_name, collection=collection_name) as query_span:
+            try:
+                cursor = await db[collection_name].aggregate(pipeline, **options)
+                documents = await cursor.to_list(None)
+            except pymongo.errors.AutoReconnect:
+                raise Exception(CONNECTION_LOST)
+            query_span.set(documents=len(documents))
+        return documents
+
+    async def query_many(self, queries):
+        """Run several (collection_name, pipeline) aggregations concurrently
+
+        Returns:
+            list: Documents of each query, in the order of queries
+        """
+        return await asyncio.gather(*(self.query(collection_name, pipeline) for collection_name, pipeline in queries))
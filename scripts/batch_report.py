@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+import os
+os.environ.setdefault("MPLBACKEND", "Agg")  # set before matplotlib is imported, inherited by the workers
+
+import glob
+import json
+import hashlib
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bson import json_util
+
+from LocalInterface import DUMP_DIRECTORIES
+from plan_corpus import plan_paths
+from hrtp_core import DATABASES, DISTANCE_FILES, RESULTS_COLLECTION, SYNERGIES_COLLECTION, open_interface
+import instrumentation
+from instrumentation import span
+
+OUTPUT_DIR = "reports"
+MANIFEST_FILE = "manifest.json"
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Analysis -> collections it reads (the distance and plan analyses read files instead)
+ANALYSIS_COLLECTIONS = {
+    "duration": [RESULTS_COLLECTION],
+    "distance": [],
+    "synergies": [SYNERGIES_COLLECTION],
+    "plans": [SYNERGIES_COLLECTION],
+    "timing": [RESULTS_COLLECTION]
+}
+
+
+def code_digest() -> str:
+    """Digest of the analysis code: any change to the scripts rebuilds every artifact"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(SCRIPTS_DIR, "*.py"))):
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def file_stat(path: str) -> list:
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+
+def input_fingerprint(experiment: str, analysis: str, offline: bool, code: str) -> str:
+    """Digest of everything an artifact depends on (raises when an input is missing)"""
+    database_name = DATABASES[experiment]
+    inputs = {"code": code, "offline": offline, "files": [], "collections": {}}
+    if analysis == "distance":
+        inputs["files"].append(file_stat(DISTANCE_FILES[experiment]))
+    if analysis == "plans":
+        paths = plan_paths(database_name)
+        if not paths:
+            raise FileNotFoundError(f"No task plans for {experiment}")
+        inputs["files"].extend(file_stat(path) for path in paths)
+    for collection_name in ANALYSIS_COLLECTIONS[analysis]:
+        if offline:
+            dump_directory = DUMP_DIRECTORIES.get(database_name) or ""
+            inputs["collections"][collection_name] = file_stat(os.path.join(dump_directory, collection_name))
+        else:
+            from MongoInterface import MongoInterface
+            from query_cache import collection_fingerprint
+            inputs["collections"][collection_name] = collection_fingerprint(
+                MongoInterface(database_name).get_collection(collection_name))
+    return hashlib.sha256(json_util.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def write_table(frame, path: str, showindex=False):
+    from tabulate import tabulate
+    with open(path, 'w') as file:
+        file.write(tabulate(frame, headers="keys", tablefmt="latex_raw", showindex=showindex) + "\n")
+    return path
+
+
+def save_figure(figure, path: str, bbox_inches='tight'):
+    with span("figure.save", "figure", path=path):
+        figure.savefig(path, bbox_inches=bbox_inches)
+
+
+def duration_artifacts(experiment: str, directory: str, offline: bool, use_cache: bool) -> list:
+    import matplotlib.pyplot as plt
+    from duration_statistics import duration_comparison, duration_intervals
+
+    plt.figure()
+    result_pd, mean_duration = duration_comparison(open_interface(DATABASES[experiment], offline, use_cache))
+    if result_pd is None:
+        return []
+    figure_path = os.path.join(directory, "duration_comparison.pdf")
+    save_figure(plt.gcf(), figure_path)
+    return [figure_path, write_table(mean_duration, os.path.join(directory, "duration_comparison.tex")),
+            write_table(duration_intervals(result_pd), os.path.join(directory, "duration_intervals.tex"))]
+
+
+def distance_artifacts(experiment: str, directory: str, offline: bool, use_cache: bool) -> list:
+    from distance_statistics import distance_comparison, percentage_intervals
+
+    fig, percentage_grid, min_distances_pd, percentage_under_risky_dataset = distance_comparison(
+        DISTANCE_FILES[experiment], zoom=True)
+    cdf_path = os.path.join(directory, "cumulative_distance.png")
+    percentage_path = os.path.join(directory, "percentage_under_safety_distance.png")
+    save_figure(fig, cdf_path, bbox_inches=None)
+    save_figure(percentage_grid.figure, percentage_path, bbox_inches=None)
+    return [cdf_path, percentage_path, write_table(min_distances_pd, os.path.join(directory, "min_distances.tex")),
+            write_table(percentage_intervals(percentage_under_risky_dataset),
+                        os.path.join(directory, "percentage_under_safety_distance.tex"))]
+
+
+def synergy_artifacts(experiment: str, directory: str, offline: bool, use_cache: bool) -> list:
+    from synergy_matrix import SynergyMatrix
+    from synergies import synergy_figures
+
+    synergy_matrix = SynergyMatrix.from_interface(open_interface(DATABASES[experiment], offline, use_cache))
+    if synergy_matrix.duplicated().any():
+        raise ValueError("There are duplicated tasks")
+    paths = []
+    for agent, figure in synergy_figures(synergy_matrix):
+        paths.append(os.path.join(directory, f"synergy_matrix_{agent}.pdf"))
+        save_figure(figure, paths[-1])
+    return paths
+
+
+def plan_artifacts(experiment: str, directory: str, offline: bool, use_cache: bool) -> list:
+    from synergy_matrix import SynergyMatrix
+    from plan_corpus import PlanTable
+    from plan_evaluator import evaluate_plans, planner_summary
+
+    synergy_matrix = SynergyMatrix.from_interface(open_interface(DATABASES[experiment], offline, use_cache))
+    scores = evaluate_plans(PlanTable.load([DATABASES[experiment]]), synergy_matrix)
+    return [write_table(planner_summary(scores).astype(object), os.path.join(directory, "plan_scores.tex"),
+                        showindex=True)]
+
+
+def timing_artifacts(experiment: str, directory: str, offline: bool, use_cache: bool) -> list:
+    from timing_deviation import query_run_deviations, planner_summary
+
+    runs = query_run_deviations(open_interface(DATABASES[experiment], offline, use_cache))
+    if runs is None:
+        return []
+    return [write_table(planner_summary(runs).astype(object), os.path.join(directory, "timing_deviation.tex"),
+                        showindex=True)]
+
+
+ANALYSES = {
+    "duration": duration_artifacts,
+    "distance": distance_artifacts,
+    "synergies": synergy_artifacts,
+    "plans": plan_artifacts,
+    "timing": timing_artifacts
+}
+
+
+def run_analysis(experiment: str, analysis: str, output_dir: str, offline: bool, use_cache: bool) -> list:
+    """Worker: render one (experiment, analysis) pair into output_dir/experiment"""
+    import matplotlib.pyplot as plt
+
+    directory = os.path.join(output_dir, experiment)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        with span(f"report.{analysis}", "report", experiment=experiment):
+            return ANALYSES[analysis](experiment, directory, offline, use_cache)
+    finally:
+        plt.close("all")
+        # pool workers do not run exit handlers
+        instrumentation.flush()
+
+
+def load_manifest(path: str) -> dict:
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_manifest(path: str, manifest: dict):
+    with open(path + ".tmp", 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def build_reports(experiments, analyses, output_dir: str = OUTPUT_DIR, offline: bool = False, use_cache: bool = True,
+                  force: bool = False, max_workers: int = None) -> bool:
+    """Render every (experiment, analysis) pair whose inputs changed since the last build, in a process pool
+
+    Returns:
+        bool: True if no analysis failed
+    """
+    code = code_digest()
+    manifests = {experiment: load_manifest(os.path.join(output_dir, experiment, MANIFEST_FILE))
+                 for experiment in experiments}
+
+    jobs = {}
+    for experiment in experiments:
+        for analysis in analyses:
+            try:
+                fingerprint = input_fingerprint(experiment, analysis, offline, code)
+            except Exception as exception:
+                print(f"{experiment}/{analysis}: skipped, missing inputs ({exception})")
+                continue
+            entry = manifests[experiment].get(analysis)
+            if not force and entry and entry["inputs"] == fingerprint and all(map(os.path.isfile, entry["artifacts"])):
+                print(f"{experiment}/{analysis}: up to date")
+                continue
+            jobs[(experiment, analysis)] = fingerprint
+
+    success = True
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run_analysis, experiment, analysis, output_dir, offline, use_cache):
+                       (experiment, analysis) for experiment, analysis in jobs}
+            for future in as_completed(futures):
+                experiment, analysis = futures[future]
+                try:
+                    artifacts = future.result()
+                except Exception:
+                    print(f"{experiment}/{analysis}: failed")
+                    traceback.print_exc()
+                    success = False
+                    continue
+                manifests[experiment][analysis] = {"inputs": jobs[(experiment, analysis)], "artifacts": artifacts}
+                save_manifest(os.path.join(output_dir, experiment, MANIFEST_FILE), manifests[experiment])
+                print(f"{experiment}/{analysis}: {', '.join(artifacts) or 'no results'}")
+    return success
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the figures and LaTeX tables of every experiment.")
+    parser.add_argument("--experiment", nargs="+", choices=DATABASES.keys(), default=list(DATABASES),
+                        help="Experiments to render (default: all)")
+    parser.add_argument("--analysis", nargs="+", choices=ANALYSES.keys(), default=list(ANALYSES),
+                        help="Analyses to run (default: all)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Directory of the per-experiment outputs")
+    parser.add_argument("--offline", action="store_true", help="Read the collection dumps through the local columnar cache instead of MongoDB")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse cached aggregation results")
+    parser.add_argument("--force", action="store_true", help="Rebuild artifacts even if their inputs did not change")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+
+    args = parser.parse_args()
+
+    success = build_reports(args.experiment, args.analysis, args.output_dir, offline=args.offline,
+                            use_cache=not args.no_cache, force=args.force, max_workers=args.workers)
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+import os
+import gc
+import math
+import json
+import glob
+import shutil
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from tabulate import tabulate
+
+import synthetic_data
+from hrtp_core import RECIPE_NAMES
+from extended_json import iter_documents
+from columnar_cache import convert_dump, cache_paths
+from LocalInterface import LocalInterface
+from statistical_pipeline import StatisticalPipeline
+from distance_store import convert_csv, open_store, store_directory
+from distance_statistics import distance_summary
+from synergy_matrix import SynergyMatrix
+from plan_corpus import PLAN_PATTERN, PlanTable, parse_plans, plan_metadata
+from plan_evaluator import evaluate_plans
+
+BASELINE_FILE = "benchmark_baseline.json"
+TOLERANCE = 0.25  # allowed slowdown (and peak memory growth) over the baseline before reporting a regression
+MIN_MEMORY_GROWTH_MB = 1.0
+MIN_SAMPLE_SECONDS = 0.2  # timed samples loop over short cases until they last this long
+BENCHMARK_DATABASE = "hrtp_benchmark"
+
+PIPELINES = {
+    "recipes_duration": ("task_results_online", StatisticalPipeline.recipes_duration_pipeline()),
+    "planner_durations": ("task_results_online", StatisticalPipeline.planner_durations_pipeline(RECIPE_NAMES)),
+    "planner_duration_summary": ("task_results_online",
+                                 StatisticalPipeline.planner_duration_summary_pipeline(RECIPE_NAMES)),
+    "task_timings": ("task_results_online", StatisticalPipeline.task_timings_pipeline(RECIPE_NAMES)),
+    "synergies": ("task_synergies", StatisticalPipeline.synergies_pipeline()),
+    "grouped_synergies": ("task_synergies", StatisticalPipeline.grouped_synergies_pipeline())
+}
+
+
+# Every case takes the synthetic experiment layout (and the parsed arguments) and returns
+# (run, items, unit): run() is the timed function, items what it processes
+
+def import_parse_case(layout, args):
+    path = layout["task_results_online"]
+    items = sum(1 for _ in iter_documents(path))
+    return (lambda: sum(1 for _ in iter_documents(path))), items, "docs"
+
+
+def import_columnar_case(layout, args):
+    path = layout["task_results_online"]
+    items = sum(1 for _ in iter_documents(path))
+    return (lambda: convert_dump(path)), items, "docs"
+
+
+def import_mongo_case(layout, args):
+    from pymongo import MongoClient
+    from import_data_to_mongodb import import_data_to_mongodb
+
+    client = MongoClient(args.mongo_uri)
+    path = layout["task_results_online"]
+    items = sum(1 for _ in iter_documents(path))
+
+    def run():
+        client.drop_database(BENCHMARK_DATABASE)
+        import_data_to_mongodb(BENCHMARK_DATABASE, "task_results_online", path, client=client)
+    return run, items, "docs"
+
+
+def pipeline_case(name):
+    collection_name, pipeline = PIPELINES[name]
+
+    def case(layout, args):
+        if args.mongo_uri:
+            from MongoInterface import MongoInterface
+            from import_data_to_mongodb import import_data_to_mongodb
+
+            mongo_interface = MongoInterface(BENCHMARK_DATABASE, uri=args.mongo_uri)
+            mongo_interface.client.drop_database(BENCHMARK_DATABASE)
+            import_data_to_mongodb(BENCHMARK_DATABASE, collection_name, layout[collection_name],
+                                   client=mongo_interface.client)
+            items = mongo_interface.client[BENCHMARK_DATABASE][collection_name].estimated_document_count()
+        else:
+            mongo_interface = LocalInterface(BENCHMARK_DATABASE, dump_directory=layout["collections"])
+            items = len(mongo_interface.get_collection(collection_name))
+        return (lambda: list(mongo_interface.query(collection_name, pipeline))), items, "docs"
+    return case
+
+
+def distance_store_case(layout, args):
+    path = layout["hr_distance"]
+    store = open_store(path)
+    items = sum(store.rows(recipe) for recipe in store.recipes)
+    return (lambda: convert_csv(path)), items, "rows"
+
+
+def distance_summary_case(layout, args):
+    path = layout["hr_distance"]
+    store = open_store(path)
+    items = sum(store.rows(recipe) for recipe in store.recipes)
+    return (lambda: distance_summary(path)), items, "rows"
+
+
+def synergy_matrix_case(layout, args):
+    frame = LocalInterface(BENCHMARK_DATABASE, dump_directory=layout["collections"]).get_collection("task_synergies")
+
+    def run():
+        synergy_matrix = SynergyMatrix(frame.drop(columns="_id"))
+        return [synergy_matrix.matrix(agent, concurrent_agent)
+                for agent, concurrent_agent in synergy_matrix.agent_pairs()]
+    return run, len(frame), "docs"
+
+
+def synthetic_plan_table(layout, max_workers=None) -> PlanTable:
+    paths = sorted(glob.glob(os.path.join(layout["plans"], "*", PLAN_PATTERN)))
+    return PlanTable.from_plans([plan_metadata(path, "synthetic") for path in paths], parse_plans(paths, max_workers))
+
+
+def plan_parse_case(layout, args):
+    paths = glob.glob(os.path.join(layout["plans"], "*", PLAN_PATTERN))
+    return (lambda: synthetic_plan_table(layout, args.workers)), len(paths), "plans"
+
+
+def plan_evaluate_case(layout, args):
+    table = synthetic_plan_table(layout, args.workers)
+    frame = LocalInterface(BENCHMARK_DATABASE, dump_directory=layout["collections"]).get_collection("task_synergies")
+    synergy_matrix = SynergyMatrix(frame.drop(columns="_id"))
+    return (lambda: evaluate_plans(table, synergy_matrix)), len(table.plans), "plans"
+
+
+CASES = {
+    "import.parse": import_parse_case,
+    "import.columnar": import_columnar_case,
+    "import.mongo": import_mongo_case,
+    **{f"pipeline.{name}": pipeline_case(name) for name in PIPELINES},
+    "distance.store": distance_store_case,
+    "distance.summary": distance_summary_case,
+    "synergy.matrix": synergy_matrix_case,
+    "plans.parse": plan_parse_case,
+    "plans.evaluate": plan_evaluate_case
+}
+
+# Cases that need a MongoDB server (--mongo-uri)
+MONGO_CASES = {"import.mongo"}
+
+
+def measure(run, repeat: int, min_sample: float = MIN_SAMPLE_SECONDS) -> dict:
+    """Best time per call over repeat samples, then one more call under tracemalloc for the peak memory
+
+    Like timeit, a sample loops over the call until it lasts at least min_sample seconds, so that
+    millisecond-long cases are not dominated by timer and scheduling noise. The first (calibration) call
+    also serves as warm-up.
+    """
+    start = time.perf_counter()
+    run()
+    loops = max(1, math.ceil(min_sample / max(time.perf_counter() - start, 1e-9)))
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        seconds.append((time.perf_counter() - start) / loops)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(seconds), "peak_mb": peak / 2 ** 20}
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> str:
+    """Ratios to the baseline ('' without a baseline), flagged when beyond the tolerance"""
+    if baseline is None:
+        return ""
+    time_ratio = result["seconds"] / baseline["seconds"]
+    memory_ratio = result["peak_mb"] / baseline["peak_mb"] if baseline["peak_mb"] else 1.0
+    # growth of a few hundred kB is allocator noise, not a regression
+    memory_regression = memory_ratio > 1 + tolerance and result["peak_mb"] - baseline["peak_mb"] > MIN_MEMORY_GROWTH_MB
+    status = "REGRESSION" if time_ratio > 1 + tolerance or memory_regression else "ok"
+    return f"{time_ratio:.2f}x time, {memory_ratio:.2f}x memory ({status})"
+
+
+def run_benchmarks(cases, scales, args) -> list:
+    results = []
+    for scale in scales:
+        root = os.path.join(args.data_dir, f"scale_{scale:g}")
+        layout = synthetic_data.generate(root, scale, args.seed)
+        for name in cases:
+            run, items, unit = CASES[name](layout, args)
+            result = {"case": name, "scale": scale, "items": items, "unit": unit, **measure(run, args.repeat)}
+            result["throughput"] = items / result["seconds"] if result["seconds"] else float("inf")
+            results.append(result)
+            print(f"{name} x{scale:g}: {result['seconds']:.3f} s, {result['throughput']:,.0f} {unit}/s, "
+                  f"{result['peak_mb']:.1f} MB", flush=True)
+        # keep only the generated data: drop the distance store and the parquet copies of the dumps
+        shutil.rmtree(store_directory(layout["hr_distance"]), ignore_errors=True)
+        for collection_name in ("task_results_online", "task_synergies"):
+            for path in cache_paths(layout[collection_name]):
+                if os.path.isfile(path):
+                    os.remove(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the import, pipelines, distance metrics, synergy matrices "
+                                                 "and plan evaluation on synthetic data.")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1, 10],
+                        help="Data sizes relative to the shipped data (default: 1 10)")
+    parser.add_argument("--case", nargs="+", choices=CASES.keys(), help="Cases to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed samples per case (the best one is kept)")
+    parser.add_argument("--data-dir", help="Where the synthetic data is generated and kept (default: temporary)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic data")
+    parser.add_argument("--workers", type=int, default=None, help="Plan parsing worker processes")
+    parser.add_argument("--mongo-uri", help="Run the import and the pipelines against this MongoDB server "
+                                            f"(uses and drops database {BENCHMARK_DATABASE})")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed slowdown over the baseline")
+
+    args = parser.parse_args()
+
+    cases = args.case or [name for name in CASES if args.mongo_uri or name not in MONGO_CASES]
+    temporary = args.data_dir is None
+    if temporary:
+        args.data_dir = tempfile.mkdtemp(prefix="hrtp_benchmark_")
+    try:
+        results = run_benchmarks(cases, args.scale, args)
+    finally:
+        if temporary:
+            shutil.rmtree(args.data_dir, ignore_errors=True)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+
+    rows = []
+    regressions = 0
+    for result in results:
+        key = f"{result['case']}@{result['scale']:g}"
+        comparison = compare(result, baseline.get(key), args.tolerance)
+        regressions += comparison.endswith("(REGRESSION)")
+        rows.append([result["case"], f"{result['scale']:g}", result["items"], result["seconds"],
+                     f"{result['throughput']:,.0f} {result['unit']}/s", result["peak_mb"], comparison])
+    print(tabulate(rows, headers=["case", "scale", "items", "seconds", "throughput", "peak MB", "vs baseline"],
+                   tablefmt="github", floatfmt=".3f"))
+
+    if args.save_baseline:
+        baseline.update({f"{result['case']}@{result['scale']:g}": {"seconds": result["seconds"],
+                                                                    "peak_mb": result["peak_mb"]}
+                         for result in results})
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+    elif regressions:
+        print(f"{regressions} regressions over {args.baseline}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import traced
+
+RESAMPLES = 10000
+CONFIDENCE = 0.95
+CHUNK_SIZE = 2000  # resamples per index matrix: bounds the memory to CHUNK_SIZE x samples values
+
+STATISTICS = {
+    "mean": lambda resampled: resampled.mean(axis=1),
+    "median": lambda resampled: np.median(resampled, axis=1)
+}
+
+
+def seed_sequence(seed) -> np.random.SeedSequence:
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+def resample_indices(n_samples: int, resamples: int, rng: np.random.Generator) -> np.ndarray:
+    """(resamples, n_samples) matrix of indices drawn with replacement, one bootstrap sample per row"""
+    return rng.integers(0, n_samples, size=(resamples, n_samples))
+
+
+def chunk_replicates(values: np.ndarray, statistic: str, resamples: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Statistic of every resample of one chunk, computed on the whole (resamples, samples, ...) array at once
+
+    The mean of samples with extra axes is a product of the (resamples, samples) draw counts with the values,
+    so the resampled array (resamples x samples x columns) is never built.
+    """
+    indices = resample_indices(len(values), resamples, np.random.default_rng(seed))
+    if statistic == "mean" and values.ndim > 1:
+        n_samples = len(values)
+        counts = np.bincount((indices + np.arange(resamples)[:, None] * n_samples).ravel(),
+                             minlength=resamples * n_samples).reshape(resamples, n_samples)
+        return (counts @ values.reshape(n_samples, -1) / n_samples).reshape((resamples,) + values.shape[1:])
+    return STATISTICS[statistic](values[indices])
+
+
+def bootstrap(values, statistic: str = "mean", resamples: int = RESAMPLES, seed=None, max_workers: int = 1) -> np.ndarray:
+    """Bootstrap replicates of a statistic
+
+    The resamples are split in chunks of CHUNK_SIZE, each with its own child seed, so the result only
+    depends on the seed, not on the number of worker processes.
+
+    Args:
+        values (array-like): Samples along the first axis; extra axes (e.g. one column per threshold)
+            are resampled together and reduced independently
+        statistic (str): One of STATISTICS
+        resamples (int): Number of bootstrap samples
+        seed (int | np.random.SeedSequence): Random seed
+        max_workers (int): Worker processes computing the chunks (1: in this process)
+
+    Returns:
+        np.ndarray: (resamples, ...) replicates
+    """
+    values = np.asarray(values, dtype=float)
+    sizes = [min(CHUNK_SIZE, resamples - start) for start in range(0, resamples, CHUNK_SIZE)]
+    seeds = seed_sequence(seed).spawn(len(sizes))
+    arguments = (repeat(values), repeat(statistic), sizes, seeds)
+    if max_workers == 1 or len(sizes) < 2:
+        return np.concatenate(list(map(chunk_replicates, *arguments)))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return np.concatenate(list(executor.map(chunk_replicates, *arguments)))
+
+
+def percentile_interval(replicates: np.ndarray, confidence: float = CONFIDENCE) -> tuple:
+    """(lower, upper) percentile interval of the replicates, along the resample axis"""
+    tail = (1 - confidence) / 2 * 100
+    lower, upper = np.percentile(replicates, [tail, 100 - tail], axis=0)
+    return lower, upper
+
+
+@traced("bootstrap.reductions")
+def reduction_intervals(samples: dict, references, statistic: str = "mean", resamples: int = RESAMPLES,
+                        confidence: float = CONFIDENCE, seed=None, max_workers: int = 1) -> pd.DataFrame:
+    """Percentage reduction of a statistic of every group with respect to reference groups, with bootstrap CIs
+
+    Groups are resampled independently; the reduction of a replicate is (reference - group) / reference * 100,
+    as in StatisticalPipeline.planner_duration_summary_pipeline.
+
+    Args:
+        samples (dict): group -> 1-D samples
+        references (list): Reference groups (absent ones give NaN reductions)
+
+    Returns:
+        pd.DataFrame: One row per (group, reference): group, reference, statistic (of the group),
+        reduction, lower, upper
+    """
+    seeds = dict(zip(samples, seed_sequence(seed).spawn(len(samples))))
+    estimates = {group: STATISTICS[statistic](np.asarray(values, dtype=float)[None, :])[0]
+                 for group, values in samples.items()}
+    replicates = {group: bootstrap(values, statistic, resamples, seeds[group], max_workers)
+                  for group, values in samples.items()}
+
+    rows = []
+    for reference in references:
+        for group in samples:
+            row = {"group": group, "reference": reference, "statistic": estimates[group],
+                   "reduction": np.nan, "lower": np.nan, "upper": np.nan}
+            if reference in samples:
+                row["reduction"] = (estimates[reference] - estimates[group]) / estimates[reference] * 100
+                reductions = (replicates[reference] - replicates[group]) / replicates[reference] * 100
+                row["lower"], row["upper"] = percentile_interval(reductions, confidence)
+            rows.append(row)
+    return pd.DataFrame(rows, columns=["group", "reference", "statistic", "reduction", "lower", "upper"])
+
+
+@traced("bootstrap.means")
+def mean_intervals(samples: dict, labels, resamples: int = RESAMPLES, confidence: float = CONFIDENCE, seed=None,
+                   max_workers: int = 1) -> pd.DataFrame:
+    """Mean of every column of each group's (samples, columns) array, with bootstrap CIs
+
+    The rows (e.g. runs) of a group are resampled together, so one index matrix serves all its columns.
+
+    Args:
+        samples (dict): group -> (samples, len(labels)) array
+        labels (list): Column labels
+
+    Returns:
+        pd.DataFrame: One row per (group, label): group, label, mean, lower, upper
+    """
+    seeds = dict(zip(samples, seed_sequence(seed).spawn(len(samples))))
+    frames = []
+    for group, values in samples.items():
+        values = np.asarray(values, dtype=float)
+        lower, upper = percentile_interval(bootstrap(values, "mean", resamples, seeds[group], max_workers), confidence)
+        frames.append(pd.DataFrame({"group": group, "label": list(labels), "mean": values.mean(axis=0),
+                                    "lower": lower, "upper": upper}))
+    return pd.concat(frames, ignore_index=True)
+
+
+@traced("bootstrap.bands")
+def mean_bands(samples: dict, resamples: int = RESAMPLES, confidence: float = CONFIDENCE, seed=None,
+               max_workers: int = 1) -> dict:
+    """Mean curve of each group's (samples, points) array, with a pointwise bootstrap percentile band
+
+    Returns:
+        dict: group -> (mean, lower, upper), arrays of one value per point
+    """
+    seeds = dict(zip(samples, seed_sequence(seed).spawn(len(samples))))
+    bands = {}
+    for group, values in samples.items():
+        values = np.asarray(values, dtype=float)
+        lower, upper = percentile_interval(bootstrap(values, "mean", resamples, seeds[group], max_workers), confidence)
+        bands[group] = (values.mean(axis=0), lower, upper)
+    return bands
+
+
+def format_interval(lower, upper, decimals: int = 2) -> str:
+    """'[lower, upper]' ('' when undefined)"""
+    if np.isnan(lower) or np.isnan(upper):
+        return ""
+    return f"[{lower:.{decimals}f}, {upper:.{decimals}f}]"
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import shutil
+import argparse
+from datetime import datetime, timezone
+
+import pyarrow as pa
+from bson import ObjectId, Int64, json_util
+from bson.json_util import CANONICAL_JSON_OPTIONS
+
+from extended_json import iter_documents, iter_batches
+from hrtp_core import DATABASES
+from instrumentation import traced
+
+ARCHIVE_DIR = "archives"
+MANIFEST_FILE = "manifest.json"
+ROOT_TABLE = "documents"
+COMPRESSION = "zstd"
+BATCH_SIZE = 10000  # documents per record batch of the root table
+
+LAYOUT_COLUMN = "$fields"  # key order of each document, dictionary-encoded (absent key: missing field)
+LAYOUT_SEPARATOR = "\x1f"
+INT_SUFFIX = "$int"  # marks the integers of a "number" (int/float) column
+LENGTH_SUFFIX = "$length"  # number of child rows of an array of sub-documents
+MAX_EXACT_INT = 2 ** 53  # integers stored in a float64 column come back unchanged up to this magnitude
+DOCUMENTS = "documents"  # type tag of arrays of sub-documents
+
+# Column kind of each Python type; anything else (sub-documents, arrays of scalars, mixed types) is stored
+# as canonical Extended JSON
+SCALAR_KINDS = {bool: "bool", int: "int", Int64: "int64", float: "float", str: "string", ObjectId: "objectid"}
+ARROW_TYPES = {
+    "null": pa.null(),
+    "bool": pa.bool_(),
+    "int": pa.int64(),
+    "int64": pa.int64(),
+    "float": pa.float64(),
+    "number": pa.float64(),
+    "string": pa.dictionary(pa.int32(), pa.string()),
+    "objectid": pa.binary(12),
+    "date": pa.timestamp("us", tz="UTC"),
+    "json": pa.string(),
+    "documents": pa.int64()
+}
+
+
+def type_tag(value):
+    """Type of a value as far as the column kinds are concerned (None for null values)"""
+    if value is None:
+        return None
+    if isinstance(value, list) and all(isinstance(item, dict) for item in value):
+        return DOCUMENTS
+    if type(value) is datetime:
+        return "aware date" if value.tzinfo is not None else "naive date"
+    if type(value) is int and abs(value) > MAX_EXACT_INT:
+        return "large int"
+    return type(value)
+
+
+class TableSchema:
+    """Column kinds of one table (the documents, or the sub-documents of an array field), inferred from the data"""
+
+    def __init__(self):
+        self.tags = {}  # key -> set of type tags
+        self.children = {}  # key -> TableSchema of its sub-documents
+
+    def observe(self, documents):
+        for document in documents:
+            for key, value in document.items():
+                tag = type_tag(value)
+                self.tags.setdefault(key, set()).add(tag)
+                if tag == DOCUMENTS:
+                    self.children.setdefault(key, TableSchema()).observe(value)
+
+    def kind(self, key: str) -> str:
+        tags = self.tags[key] - {None}
+        if not tags:
+            return "null"
+        if tags == {DOCUMENTS}:
+            return "documents"
+        if tags <= {int, "large int"}:
+            return "int"
+        if tags == {int, float}:
+            return "number"
+        if tags in ({"aware date"}, {"naive date"}):
+            return "date"
+        if len(tags) == 1 and next(iter(tags)) in SCALAR_KINDS:
+            return SCALAR_KINDS[next(iter(tags))]
+        return "json"
+
+    def fields(self) -> dict:
+        """key -> kind, plus tz_aware for dates"""
+        fields = {}
+        for key in self.tags:
+            fields[key] = {"kind": self.kind(key)}
+            if fields[key]["kind"] == "date":
+                fields[key]["tz_aware"] = self.tags[key] - {None} == {"aware date"}
+        return fields
+
+    def arrow_schema(self) -> pa.Schema:
+        columns = [pa.field(LAYOUT_COLUMN, pa.dictionary(pa.int32(), pa.string()))]
+        for key, field in self.fields().items():
+            columns.append(pa.field(key, ARROW_TYPES[field["kind"]]))
+            if field["kind"] == "number":
+                columns.append(pa.field(key + INT_SUFFIX, pa.bool_()))
+            elif field["kind"] == "documents":
+                columns.append(pa.field(key + LENGTH_SUFFIX, pa.int32()))
+        return pa.schema(columns)
+
+
+def table_file(name: str) -> str:
+    return f"{name}.arrow"
+
+
+class ArchiveWriter:
+    """Writes documents as one Arrow IPC file per table; arrays of sub-documents go to child tables whose rows
+    are referenced by (offset, length) columns of the parent"""
+
+    def __init__(self, directory: str, schema: TableSchema, compression: str = COMPRESSION):
+        self.directory = directory
+        self.compression = compression
+        self.writers = {}
+        self.rows = {}
+        self.schemas = {}
+        self.fields = {}
+        self.register(ROOT_TABLE, schema)
+
+    def register(self, name: str, schema: TableSchema):
+        self.schemas[name] = schema
+        self.fields[name] = schema.fields()
+        self.rows[name] = 0
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        self.writers[name] = pa.ipc.new_file(os.path.join(self.directory, table_file(name)), schema.arrow_schema(),
+                                             options=options)
+        for key, child in schema.children.items():
+            self.register(f"{name}.{key}", child)
+
+    def write(self, name: str, documents: list):
+        schema = self.schemas[name]
+        fields = self.fields[name]
+        columns = {LAYOUT_COLUMN: pa.array([LAYOUT_SEPARATOR.join(document) for document in documents],
+                                           pa.string()).dictionary_encode()}
+        for key, field in fields.items():
+            values = [document.get(key) for document in documents]
+            kind = field["kind"]
+            if kind == "documents":
+                child_name = f"{name}.{key}"
+                offsets, lengths, children = [], [], []
+                for value in values:
+                    if value is None:
+                        offsets.append(None)
+                        lengths.append(None)
+                        continue
+                    if type_tag(value) != DOCUMENTS:
+                        raise ValueError(f"{key}: value not seen while inferring the schema (was the collection "
+                                         f"modified during the export?)")
+                    offsets.append(self.rows[child_name] + len(children))
+                    lengths.append(len(value))
+                    children.extend(value)
+                columns[key] = pa.array(offsets, pa.int64())
+                columns[key + LENGTH_SUFFIX] = pa.array(lengths, pa.int32())
+                self.write(child_name, children)
+            elif kind == "number":
+                columns[key] = pa.array([None if value is None else float(value) for value in values], pa.float64())
+                columns[key + INT_SUFFIX] = pa.array([None if value is None else type(value) is int for value in values],
+                                                     pa.bool_())
+            elif kind == "objectid":
+                columns[key] = pa.array([None if value is None else value.binary for value in values], pa.binary(12))
+            elif kind == "date":
+                if not field["tz_aware"]:
+                    values = [None if value is None else value.replace(tzinfo=timezone.utc) for value in values]
+                columns[key] = pa.array(values, ARROW_TYPES["date"])
+            elif kind == "json":
+                columns[key] = pa.array([None if value is None else json_util.dumps(value, json_options=CANONICAL_JSON_OPTIONS)
+                                         for value in values], pa.string())
+            elif kind == "string":
+                columns[key] = pa.array(values, pa.string()).dictionary_encode()
+            else:
+                columns[key] = pa.array(values, ARROW_TYPES[kind])
+        batch = pa.RecordBatch.from_pydict(columns, schema=schema.arrow_schema())
+        self.writers[name].write_batch(batch)
+        self.rows[name] += len(documents)
+
+    def close(self) -> dict:
+        for writer in self.writers.values():
+            writer.close()
+        return {name: {"rows": self.rows[name], "fields": self.fields[name]} for name in self.writers}
+
+
+@traced("archive.export")
+def export_documents(documents, directory: str, compression: str = COMPRESSION, batch_size: int = BATCH_SIZE,
+                     source: dict = None) -> dict:
+    """Write documents as a collection archive
+
+    Args:
+        documents (callable): Returns a new iterator over the documents; it is called twice, once to infer the
+            column kinds and once to write them
+        directory (str): Archive directory (replaced if it exists)
+        compression (str): Arrow IPC buffer compression: zstd, lz4 or None (uncompressed buffers are read
+            zero-copy from the memory-mapped files)
+        source (dict): Description of the exported collection, stored in the manifest
+
+    Returns:
+        dict: The manifest
+    """
+    schema = TableSchema()
+    for batch in iter_batches(documents(), batch_size):
+        schema.observe(batch)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    writer = ArchiveWriter(directory, schema, compression)
+    try:
+        for batch in iter_batches(documents(), batch_size):
+            writer.write(ROOT_TABLE, batch)
+    finally:
+        tables = writer.close()
+    manifest = {"source": source or {}, "compression": compression, "tables": tables}
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def decode_column(column: pa.Array, field: dict) -> list:
+    """Python values of a column, as they were in the documents"""
+    kind = field["kind"]
+    values = column.to_pylist()
+    if kind == "objectid":
+        return [None if value is None else ObjectId(value) for value in values]
+    if kind == "int64":
+        return [None if value is None else Int64(value) for value in values]
+    if kind == "date" and not field["tz_aware"]:
+        return [None if value is None else value.replace(tzinfo=None) for value in values]
+    if kind == "json":
+        return [None if value is None else json_util.loads(value, json_options=CANONICAL_JSON_OPTIONS)
+                for value in values]
+    return values
+
+
+class CollectionArchive:
+    """Memory-mapped collection archive written by export_documents
+
+    Tables are named after their path: "documents" for the collection, "documents.<field>" for the
+    sub-documents of an array field. Only the requested columns are read (and cached per column set);
+    without compression their buffers point straight into the mapped files.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE), 'r') as file:
+            self.manifest = json.load(file)
+        self._tables = {}
+
+    def __len__(self) -> int:
+        return self.manifest["tables"][ROOT_TABLE]["rows"]
+
+    @property
+    def tables(self) -> list:
+        return list(self.manifest["tables"])
+
+    def table(self, name: str = ROOT_TABLE, columns: list = None) -> pa.Table:
+        """Arrow table (some columns only, if given: the buffers of the others are neither read nor decompressed)"""
+        if (name, None) in self._tables:
+            table = self._tables[(name, None)]
+            return table if columns is None else table.select(columns)
+        key = (name, None if columns is None else tuple(columns))
+        if key not in self._tables:
+            source = pa.memory_map(os.path.join(self.directory, table_file(name)), 'r')
+            options = None
+            if columns is not None:
+                schema = pa.ipc.open_file(source).schema
+                indexes = [schema.get_field_index(column) for column in columns]
+                if -1 in indexes:
+                    raise KeyError(f"No column {columns[indexes.index(-1)]} in table {name}")
+                options = pa.ipc.IpcReadOptions(included_fields=sorted(set(indexes)))
+            table = pa.ipc.open_file(source, options=options).read_all()
+            self._tables[key] = table if columns is None else table.select(list(columns))
+        return self._tables[key]
+
+    def frame(self, name: str = ROOT_TABLE, columns: list = None):
+        """pandas frame of a table (document fields only by default): strings as categoricals, ObjectIds as hex
+        strings, like columnar_cache"""
+        fields = self.manifest["tables"][name]["fields"]
+        frame = self.table(name, columns or list(fields)).to_pandas()
+        for column in frame.columns:
+            if fields.get(column, {}).get("kind") == "objectid":
+                frame[column] = frame[column].map(lambda value: None if value is None else value.hex()).astype("string")
+        return frame
+
+    def documents(self, name: str = ROOT_TABLE, start: int = 0, stop: int = None) -> list:
+        """Rows start..stop of a table rebuilt as documents, sub-documents included"""
+        table = self.table(name)
+        stop = table.num_rows if stop is None else stop
+        table = table.slice(start, stop - start)
+        fields = self.manifest["tables"][name]["fields"]
+
+        columns = {}
+        for key, field in fields.items():
+            if field["kind"] == "documents":
+                offsets = table.column(key).to_pylist()
+                lengths = table.column(key + LENGTH_SUFFIX).to_pylist()
+                present = [offset for offset in offsets if offset is not None]
+                first = min(present, default=0)
+                last = max((offset + length for offset, length in zip(offsets, lengths) if offset is not None),
+                           default=0)
+                children = self.documents(f"{name}.{key}", first, last)
+                columns[key] = [None if offset is None else children[offset - first:offset - first + length]
+                                for offset, length in zip(offsets, lengths)]
+            elif field["kind"] == "number":
+                integers = table.column(key + INT_SUFFIX).to_pylist()
+                columns[key] = [int(value) if integer else value
+                                for value, integer in zip(table.column(key).to_pylist(), integers)]
+            else:
+                columns[key] = decode_column(table.column(key).combine_chunks(), field)
+
+        layouts = {}
+        documents = []
+        for row, layout in enumerate(table.column(LAYOUT_COLUMN).to_pylist()):
+            if layout not in layouts:
+                layouts[layout] = layout.split(LAYOUT_SEPARATOR) if layout else []
+            documents.append({key: columns[key][row] for key in layouts[layout]})
+        return documents
+
+    def iter_documents(self, batch_size: int = BATCH_SIZE):
+        """Stream the collection documents"""
+        for start in range(0, len(self), batch_size):
+            yield from self.documents(ROOT_TABLE, start, min(start + batch_size, len(self)))
+
+
+def open_archive(directory: str) -> CollectionArchive:
+    return CollectionArchive(directory)
+
+
+def archive_directory(database_name: str, collection_name: str, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, database_name, collection_name)
+
+
+def export_collection(database_name: str, collection_name: str, directory: str = None, offline: bool = False,
+                      compression: str = COMPRESSION) -> dict:
+    """Archive a collection of the database, or of its dump when offline"""
+    directory = directory or archive_directory(database_name, collection_name)
+    source = {"database": database_name, "collection": collection_name}
+    if offline:
+        from LocalInterface import DUMP_DIRECTORIES
+        dump_path = os.path.join(DUMP_DIRECTORIES.get(database_name) or "", collection_name)
+        if not os.path.isfile(dump_path):
+            raise FileNotFoundError(f"No dump of {collection_name} for database {database_name}")
+        return export_documents(lambda: iter_documents(dump_path), directory, compression, source=source)
+    from MongoInterface import MongoInterface
+    collection = MongoInterface(database_name).get_collection(collection_name)
+    return export_documents(lambda: collection.find().sort("_id", 1), directory, compression, source=source)
+
+
+def import_archive(directory: str, database_name: str, collection_name: str = None, batch_size: int = BATCH_SIZE) -> int:
+    """Insert the documents of an archive into an empty (or new) collection
+
+    Returns:
+        int: Number of inserted documents
+    """
+    from MongoInterface import MongoInterface
+    from import_data_to_mongodb import create_indexes
+
+    archive = open_archive(directory)
+    collection_name = collection_name or archive.manifest["source"]["collection"]
+    collection = MongoInterface(database_name).client[database_name][collection_name]
+    if collection.estimated_document_count():
+        raise ValueError(f"Collection {collection_name} of database {database_name} is not empty")
+    inserted = 0
+    for batch in iter_batches(archive.iter_documents(batch_size), batch_size):
+        inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+    create_indexes(collection)
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a collection to a compressed columnar archive, or import one.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Archive a collection")
+    export.add_argument("--experiment", choices=DATABASES.keys(), required=True, help="Select the database to use")
+    export.add_argument("--collection", default="utils_task_results", help="Collection to archive")
+    export.add_argument("--output", help=f"Archive directory (default: {ARCHIVE_DIR}/<database>/<collection>)")
+    export.add_argument("--offline", action="store_true", help="Archive the collection dump instead of the database")
+    export.add_argument("--compression", choices=["zstd", "lz4", "none"], default=COMPRESSION,
+                        help="Buffer compression (none: larger files, read without copies)")
+
+    restore = subparsers.add_parser("import", help="Insert an archive into the database")
+    restore.add_argument("archive", help="Archive directory")
+    restore.add_argument("--experiment", choices=DATABASES.keys(), required=True, help="Select the database to use")
+    restore.add_argument("--collection", help="Target collection (default: the archived one)")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        compression = None if args.compression == "none" else args.compression
+        directory = args.output or archive_directory(DATABASES[args.experiment], args.collection)
+        manifest = export_collection(DATABASES[args.experiment], args.collection, directory, args.offline, compression)
+        size = sum(os.path.getsize(os.path.join(directory, table_file(name))) for name in manifest["tables"])
+        rows = ", ".join(f"{name}: {table['rows']}" for name, table in manifest["tables"].items())
+        print(f"{directory}: {size / 2 ** 20:.2f} MB ({rows})")
+    else:
+        inserted = import_archive(args.archive, DATABASES[args.experiment], args.collection)
+        print(f"{inserted} documents inserted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#! /usr/bin/env python3
+
+import os
+import json
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+from bson import ObjectId, json_util
+
+from extended_json import iter_documents, iter_batches, file_digest
+from instrumentation import traced
+
+CACHE_DIR = ".columnar_cache"
+CONVERSION_BATCH_SIZE = 50000
+
+# Fields always stored as float64 even when a dump has integer-looking values
+FLOAT_COLUMNS = ("t_start", "t_end", "t_start_planned", "t_end_planned",
+                 "duration_planned", "duration_real", "planning_time", "delta_time")
+
+
+def cache_paths(dump_path: str, cache_dir: str = CACHE_DIR):
+    """Return the (parquet, metadata) paths of the cached copy of a dump"""
+    key = hashlib.sha1(os.path.abspath(dump_path).encode()).hexdigest()[:12]
+    stem = os.path.join(cache_dir, f"{os.path.basename(dump_path)}-{key}")
+    return stem + ".parquet", stem + ".json"
+
+
+def load_collection(dump_path: str, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """Load a collection dump as a typed DataFrame, converting it to Parquet on first use
+
+    The cached file is reused while the dump size/mtime match; if only the mtime changed,
+    the content hash decides.
+
+    Args:
+        dump_path (str): Extended-JSON dump of the collection
+        cache_dir (str): Directory holding the Parquet files
+
+    Returns:
+        pd.DataFrame: One row per document. frame.attrs holds the conversion metadata.
+    """
+    parquet_path, meta_path = cache_paths(dump_path, cache_dir)
+    stat = os.stat(dump_path)
+
+    meta = None
+    if os.path.isfile(meta_path) and os.path.isfile(parquet_path):
+        with open(meta_path, 'r') as file:
+            meta = json.load(file)
+        if meta["size"] != stat.st_size or meta["mtime_ns"] != stat.st_mtime_ns:
+            if meta["size"] == stat.st_size and meta["sha256"] == file_digest(dump_path):
+                meta["mtime_ns"] = stat.st_mtime_ns
+                write_meta(meta_path, meta)
+            else:
+                meta = None
+
+    if meta is None:
+        frame, meta = convert_dump(dump_path)
+        meta.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=file_digest(dump_path))
+        os.makedirs(cache_dir, exist_ok=True)
+        frame.to_parquet(parquet_path, index=False)
+        write_meta(meta_path, meta)
+    else:
+        frame = pd.read_parquet(parquet_path)
+
+    frame.attrs.update(object_id_columns=meta["object_id_columns"], json_columns=meta["json_columns"])
+    return frame
+
+
+def write_meta(meta_path: str, meta: dict):
+    with open(meta_path + ".tmp", 'w') as file:
+        json.dump(meta, file)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+@traced("columnar.convert_dump")
+def convert_dump(dump_path: str):
+    """Convert a dump into a typed frame
+
+    ObjectIds are stored as hex strings, nested values (sub-documents, arrays) as Extended JSON
+    strings, other strings as dictionary-encoded categoricals.
+
+    Returns:
+        tuple[pd.DataFrame, dict]: Frame and metadata needed to rebuild the documents
+    """
+    object_id_columns = set()
+    json_columns = set()
+
+    def flatten(document):
+        row = {}
+        for key, value in document.items():
+            if isinstance(value, ObjectId):
+                object_id_columns.add(key)
+                value = str(value)
+            elif isinstance(value, (dict, list)):
+                json_columns.add(key)
+                value = json_util.dumps(value)
+            row[key] = value
+        return row
+
+    chunks = [
+        pd.DataFrame.from_records([flatten(document) for document in batch])
+        for batch in iter_batches(iter_documents(dump_path), CONVERSION_BATCH_SIZE)
+    ]
+    frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    for column in frame.columns:
+        if column in FLOAT_COLUMNS:
+            frame[column] = frame[column].astype("float64")
+        elif column in object_id_columns or column in json_columns:
+            frame[column] = frame[column].astype("string")
+        elif frame[column].dtype == object and frame[column].map(lambda value: isinstance(value, datetime)).all():
+            frame[column] = pd.to_datetime(frame[column], utc=True)
+        elif frame[column].dtype == object or pd.api.types.is_string_dtype(frame[column]):
+            frame[column] = frame[column].astype("category")
+
+    meta = {"object_id_columns": sorted(object_id_columns), "json_columns": sorted(json_columns)}
+    return frame, meta
+
+
+def frame_to_documents(frame: pd.DataFrame) -> list:
+    """Rebuild documents from (a slice of) a frame returned by load_collection
+
+    Missing values are dropped, so fields absent from a document stay absent.
+    """
+    object_id_columns = [column for column in frame.attrs.get("object_id_columns", []) if column in frame]
+    json_columns = [column for column in frame.attrs.get("json_columns", []) if column in frame]
+    documents = []
+    for record in frame.to_dict("records"):
+        document = {}
+        for key, value in record.items():
+            if value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and value != value):
+                continue
+            if key in object_id_columns:
+                value = ObjectId(value)
+            elif key in json_columns:
+                value = json_util.loads(value)
+            elif isinstance(value, pd.Timestamp):
+                value = value.to_pydatetime()
+            document[key] = value
+        documents.append(document)
+    return documents
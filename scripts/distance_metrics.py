@@ -0,0 +1,169 @@
+#! /usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+
+
+def distance_grid(values, step: float = 0.01, upper: float = 4.0) -> np.ndarray:
+    """Common evaluation grid from the smallest sample up to (at least) upper"""
+    values = np.asarray(values, dtype=float)
+    return np.arange(np.nanmin(values), max(upper, np.nanmin(values)) + step, step)
+
+
+def ecdf_matrix(values, run_index, grid, n_runs: int = None) -> np.ndarray:
+    """Empirical CDF of every run evaluated on a common grid
+
+    All runs are sorted at once: each run is shifted onto its own disjoint key range, so a single
+    np.searchsorted call answers every (run, grid point) pair.
+
+    Args:
+        values (array-like): Samples of all runs, concatenated in any order
+        run_index (array-like): Run index (0..n_runs-1) of each sample
+        grid (array-like): Points where the ECDFs are evaluated
+        n_runs (int): Number of runs (default: max(run_index) + 1)
+
+    Returns:
+        np.ndarray: (n_runs, len(grid)) array, F[r, g] = fraction of samples of run r <= grid[g]
+    """
+    values = np.asarray(values, dtype=float)
+    run_index = np.asarray(run_index, dtype=np.intp)
+    grid = np.asarray(grid, dtype=float)
+    if n_runs is None:
+        n_runs = int(run_index.max()) + 1 if len(run_index) else 0
+
+    counts = np.bincount(run_index, minlength=n_runs)
+    low = min(values.min(initial=np.inf), grid.min(initial=np.inf))
+    high = max(values.max(initial=-np.inf), grid.max(initial=-np.inf))
+    span = (high - low) + 1.0
+
+    keys = np.sort((values - low) + run_index * span)
+    offsets = np.arange(n_runs) * span
+    grid_keys = (grid - low)[None, :] + offsets[:, None]
+    below = np.searchsorted(keys, grid_keys, side="right")
+
+    starts = np.cumsum(counts) - counts
+    return (below - starts[:, None]) / np.maximum(counts, 1)[:, None]
+
+
+def ecdf_band_moments(values, run_index, run_types, grid, types):
+    """Per-type sums needed for the ECDF mean/std bands (mergeable across batches of runs)
+
+    Args:
+        values (array-like): Samples of all runs
+        run_index (array-like): Run index of each sample
+        run_types (array-like): Type label of each run (length n_runs)
+        grid (array-like): Evaluation grid
+        types (list): Type labels, fixing the row order of the result
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: (runs per type, sum of ECDFs, sum of squared ECDFs)
+    """
+    run_types = np.asarray(run_types)
+    matrix = ecdf_matrix(values, run_index, grid, n_runs=len(run_types))
+    membership = (np.asarray(types)[:, None] == run_types[None, :]).astype(float)
+    return membership.sum(axis=1), membership @ matrix, membership @ (matrix * matrix)
+
+
+def bands_from_moments(counts, sums, squares, types) -> dict:
+    """Mean and (population) standard deviation bands from ecdf_band_moments output"""
+    counts = np.maximum(counts, 1)[:, None]
+    mean = sums / counts
+    std = np.sqrt(np.maximum(squares / counts - mean * mean, 0.0))
+    return {planner_type: (mean[row], std[row]) for row, planner_type in enumerate(types)}
+
+
+def ecdf_bands(values, run_index, run_types, grid, types=None) -> dict:
+    """Mean/std ECDF band of each run type in one vectorized call
+
+    Args:
+        values (array-like): Samples of all runs
+        run_index (array-like): Run index of each sample
+        run_types (array-like): Type label of each run (length n_runs)
+        grid (array-like): Evaluation grid
+        types (list): Types to return (default: all, in order of appearance)
+
+    Returns:
+        dict: type -> (mean ECDF, std ECDF), both arrays shaped like grid
+    """
+    if types is None:
+        types = list(pd.unique(np.asarray(run_types)))
+    counts, sums, squares = ecdf_band_moments(values, run_index, run_types, grid, types)
+    return bands_from_moments(counts, sums, squares, types)
+
+
+def time_under_thresholds(values, timestamps, run_index, thresholds, n_runs: int = None) -> np.ndarray:
+    """Percentage of each run's duration spent with the distance below every threshold
+
+    Sample i of a run lasts until sample i+1. Every sample's dwell time is added once into the bin of
+    the first threshold it is below (np.searchsorted), then a cumulative sum over the sorted thresholds
+    gives the time under each of them: O(samples * log(thresholds) + runs * thresholds).
+
+    Args:
+        values (array-like): Distance samples of all runs
+        timestamps (array-like): Timestamp of each sample
+        run_index (array-like): Run index of each sample; samples of a run must be in time order
+        thresholds (array-like): Distance thresholds, in any order
+        n_runs (int): Number of runs (default: max(run_index) + 1)
+
+    Returns:
+        np.ndarray: (n_runs, len(thresholds)) percentages, columns in the order of thresholds
+    """
+    values = np.asarray(values, dtype=float)
+    timestamps = np.asarray(timestamps, dtype=float)
+    run_index = np.asarray(run_index, dtype=np.intp)
+    thresholds = np.asarray(thresholds, dtype=float)
+    if n_runs is None:
+        n_runs = int(run_index.max()) + 1 if len(run_index) else 0
+
+    order = np.argsort(run_index, kind="stable")
+    values, timestamps, run_index = values[order], timestamps[order], run_index[order]
+
+    same_run = run_index[1:] == run_index[:-1]
+    dwell = np.where(same_run, timestamps[1:] - timestamps[:-1], 0.0)
+    values, run_index = values[:-1], run_index[:-1]
+
+    threshold_order = np.argsort(thresholds)
+    sorted_thresholds = thresholds[threshold_order]
+    first_above = np.searchsorted(sorted_thresholds, values, side="right")  # value < T[j] for j >= first_above
+
+    n_bins = len(thresholds) + 1
+    dwell_bins = np.bincount(run_index * n_bins + first_above, weights=dwell,
+                             minlength=n_runs * n_bins).reshape(n_runs, n_bins)
+    time_under = np.cumsum(dwell_bins, axis=1)[:, :-1]
+    total_time = dwell_bins.sum(axis=1)
+
+    percentages = np.empty_like(time_under)
+    percentages[:, threshold_order] = time_under / np.where(total_time > 0, total_time, np.nan)[:, None] * 100
+    return percentages
+
+
+def time_under_thresholds_frame(distance_dataset: pd.DataFrame, run_names, run_types, thresholds,
+                                run_column: str = "Recipe", value_column: str = "Mean",
+                                time_column: str = "Timestamp") -> pd.DataFrame:
+    """Tidy (recipe, planner type, threshold) -> percentage table for the selected runs
+
+    Args:
+        distance_dataset (pd.DataFrame): Distance monitoring log
+        run_names (list): Recipes to evaluate
+        run_types (list): Planner type of each recipe
+        thresholds (array-like): Distance thresholds (m)
+
+    Returns:
+        pd.DataFrame: Columns recipe, planner_type, threshold, percentage; one row per run and threshold
+    """
+    runs_dataset = distance_dataset[distance_dataset[run_column].isin(run_names)]
+    run_index = pd.Index(run_names).get_indexer(runs_dataset[run_column])
+    percentages = time_under_thresholds(runs_dataset[value_column], runs_dataset[time_column], run_index,
+                                        thresholds, n_runs=len(run_names))
+    return threshold_table(run_names, run_types, thresholds, percentages)
+
+
+def threshold_table(run_names, run_types, thresholds, percentages) -> pd.DataFrame:
+    """Tidy frame from a (runs, thresholds) percentage array as returned by time_under_thresholds"""
+    n_thresholds = len(thresholds)
+    return pd.DataFrame({
+        "recipe": np.repeat(np.asarray(run_names, dtype=object), n_thresholds),
+        "planner_type": np.repeat(np.asarray(run_types, dtype=object), n_thresholds),
+        "threshold": np.tile(np.asarray(thresholds, dtype=float), len(run_names)),
+        "percentage": np.asarray(percentages).ravel()
+    })
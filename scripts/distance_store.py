@@ -0,0 +1,162 @@
+#! /usr/bin/env python3
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import traced
+
+RECIPE_COLUMN = "Recipe"
+CSV_CHUNK_SIZE = 1_000_000  # rows per read_csv chunk
+BATCH_ROWS = 5_000_000  # rows per batch handed to the distance metrics
+INDEX_FILE = "index.json"
+
+
+def store_directory(csv_path: str) -> str:
+    return csv_path + ".store"
+
+
+def read_chunks(csv_path: str, chunk_size: int = CSV_CHUNK_SIZE):
+    """Read the monitoring log in chunks, dropping infinite/missing samples like the analyses do"""
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        yield chunk.replace([np.inf, -np.inf], np.nan).dropna()
+
+
+@traced("distance.convert_csv")
+def convert_csv(csv_path: str, chunk_size: int = CSV_CHUNK_SIZE) -> str:
+    """Convert hr_distance.csv into a recipe-partitioned binary store
+
+    The store holds one raw float64 file per numeric column, with the rows of each recipe contiguous
+    (in their original order), and an index mapping every recipe to its row range and per-column minima.
+    Two chunked passes over the CSV keep memory bounded: the first counts the rows of each recipe,
+    the second scatters each chunk into its recipes' row ranges.
+
+    Args:
+        csv_path (str): Distance monitoring log
+        chunk_size (int): Rows read from the CSV at a time
+
+    Returns:
+        str: Store directory
+    """
+    row_counts = {}
+    minima = {}
+    columns = None
+    for chunk in read_chunks(csv_path, chunk_size):
+        if columns is None:
+            columns = [column for column in chunk.columns
+                       if column != RECIPE_COLUMN and pd.api.types.is_numeric_dtype(chunk[column])]
+        grouped = chunk.groupby(RECIPE_COLUMN, sort=False)
+        for recipe, count in grouped.size().items():
+            row_counts[recipe] = row_counts.get(recipe, 0) + int(count)
+        for recipe, row in grouped[columns].min().iterrows():
+            previous = minima.get(recipe)
+            minima[recipe] = row.to_dict() if previous is None else {
+                column: min(previous[column], value) for column, value in row.items()}
+    columns = columns or []
+
+    recipes = list(row_counts)
+    counts = np.array([row_counts[recipe] for recipe in recipes], dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    n_rows = int(counts.sum())
+
+    directory = store_directory(csv_path)
+    os.makedirs(directory, exist_ok=True)
+    arrays = {
+        column: np.lib.format.open_memmap(os.path.join(directory, f"{column}.npy"), mode="w+",
+                                          dtype=np.float64, shape=(n_rows,))
+        for column in columns
+    }
+
+    recipe_codes = pd.Index(recipes)
+    cursor = starts.copy()
+    for chunk in read_chunks(csv_path, chunk_size):
+        codes = recipe_codes.get_indexer(chunk[RECIPE_COLUMN])
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        chunk_counts = np.bincount(codes, minlength=len(recipes))
+        first_in_chunk = np.cumsum(chunk_counts) - chunk_counts
+        destination = cursor[sorted_codes] + np.arange(len(order)) - first_in_chunk[sorted_codes]
+        for column, array in arrays.items():
+            array[destination] = chunk[column].to_numpy(dtype=np.float64)[order]
+        cursor += chunk_counts
+    for array in arrays.values():
+        array.flush()
+
+    stat = os.stat(csv_path)
+    index = {
+        "source": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+        "columns": columns,
+        "recipes": {
+            recipe: {"start": int(start), "stop": int(start + count), "min": minima[recipe]}
+            for recipe, start, count in zip(recipes, starts, counts)
+        }
+    }
+    with open(os.path.join(directory, INDEX_FILE + ".tmp"), 'w') as file:
+        json.dump(index, file)
+    os.replace(os.path.join(directory, INDEX_FILE + ".tmp"), os.path.join(directory, INDEX_FILE))
+    return directory
+
+
+def open_store(csv_path: str) -> "DistanceStore":
+    """Open the binary store of a monitoring log, (re)building it when the CSV changed"""
+    directory = store_directory(csv_path)
+    index_path = os.path.join(directory, INDEX_FILE)
+    stat = os.stat(csv_path)
+    if os.path.isfile(index_path):
+        with open(index_path, 'r') as file:
+            source = json.load(file)["source"]
+        if source["size"] == stat.st_size and source["mtime_ns"] == stat.st_mtime_ns:
+            return DistanceStore(directory)
+    return DistanceStore(convert_csv(csv_path))
+
+
+class DistanceStore:
+    """Memory-mapped, recipe-partitioned view of a distance monitoring log"""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, INDEX_FILE), 'r') as file:
+            index = json.load(file)
+        self.columns = index["columns"]
+        self.index = index["recipes"]
+        self.arrays = {column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode="r")
+                       for column in self.columns}
+
+    @property
+    def recipes(self) -> list:
+        return list(self.index)
+
+    def minimum(self, recipe: str, column: str) -> float:
+        return self.index[recipe]["min"][column]
+
+    def rows(self, recipe: str) -> int:
+        return self.index[recipe]["stop"] - self.index[recipe]["start"]
+
+    def column(self, recipe: str, column: str) -> np.ndarray:
+        """Zero-copy slice of one column for one recipe"""
+        entry = self.index[recipe]
+        return self.arrays[column][entry["start"]:entry["stop"]]
+
+    def iter_batches(self, recipes, columns, max_rows: int = BATCH_ROWS):
+        """Stream groups of whole recipes, at most max_rows rows per group (or one recipe if larger)
+
+        Yields:
+            tuple[list, dict, np.ndarray]: (recipes of the batch, column -> concatenated values, run index
+            of each row within the batch)
+        """
+        batch = []
+        batch_rows = 0
+        for recipe in recipes:
+            if batch and batch_rows + self.rows(recipe) > max_rows:
+                yield self._batch(batch, columns)
+                batch, batch_rows = [], 0
+            batch.append(recipe)
+            batch_rows += self.rows(recipe)
+        if batch:
+            yield self._batch(batch, columns)
+
+    def _batch(self, recipes, columns):
+        values = {column: np.concatenate([self.column(recipe, column) for recipe in recipes]) for column in columns}
+        run_index = np.repeat(np.arange(len(recipes)), [self.rows(recipe) for recipe in recipes])
+        return recipes, values, run_index
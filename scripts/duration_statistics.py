@@ -1,86 +1,144 @@
 #!/usr/bin/env python3
 
 import argparse
-from MongoInterface import MongoInterface
 from statistical_pipeline import StatisticalPipeline
+from hrtp_core import DATABASES, RESULTS_COLLECTION, ORDER as PLANNER_ORDER, PAPER_NAMES, recipe_names, open_interface
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 from tabulate import tabulate
-import plotly.express as px
-
-RECIPE_NAMES = {
-    "TESTdsfds": "Safety Areas - HA",
-    "SAFETY_AREA_NO_AWARE": "Safety Areas - Random",
-    "NOT_NEIGHBORING_TASKS": "Not Neighboring TP",
-    "TEST_WITH_GOHOME": "test",
-    "ONELINE": "AWARE",
-    "RELAXED_HA_SOLVER": "Relaxed S. TP",
-    "BASIC_SOLVER": "Baseline TP",
-    "COMPLETE_SOLVER": "Synergistic TP",
-    "COMPLETE_HA_SOLVER": "Synergistic TP",
-    "TEST_COMPLETE": "Test",
-    "TEST_RELAXED": "Test REL",
-    "NEW": "New"
-}
-
-DATABASES = {
-    "safety_areas": ("safety_areas", "task_results_online"),
-    "velocity_scaling": ("velocity_scaling", "task_results_online"),
-    "realworld_case_study": ("hrc_case_study", "task_results_online")
-}
-
-ORDER = ["Baseline TP", "Not Neighboring TP", "Relaxed S. TP", "Synergistic TP"]
+from instrumentation import span, traced
+from recipe_index import load_recipe_table, annotate
+from bootstrap import RESAMPLES, CONFIDENCE, reduction_intervals, format_interval
+
+RECIPE_NAMES = recipe_names(PAPER_NAMES)
+
+ORDER = [PAPER_NAMES.get(planner_type, planner_type) for planner_type in PLANNER_ORDER]
+
+# Column label -> planner type the reductions are computed from
+REFERENCES = {"Baseline": ORDER[0], "Not Neighboring": ORDER[1]}
+
+@traced("duration.tables")
+def duration_tables(mongo_interface, results_collection_name=RESULTS_COLLECTION):
+    """Plan durations per recipe and the mean duration table per planner type
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: (recipe durations, mean duration table), (None, None) without results
+    """
+    # Planner type classification and per-type statistics are computed by the database
+    pipeline = StatisticalPipeline.planner_durations_pipeline(RECIPE_NAMES)
+    result_pd = pd.DataFrame(list(mongo_interface.query(results_collection_name, pipeline)))
+    if result_pd.empty:
+        return None, None
+    summary_pipeline = StatisticalPipeline.planner_duration_summary_pipeline(RECIPE_NAMES)
+    summary_pd = pd.DataFrame(list(mongo_interface.query(results_collection_name, summary_pipeline)))
+
+    result_pd.rename(columns={'recipe_duration': 'Plan Duration (s)', 'planner_type': 'Task Planner Type'}, inplace=True)
+    mean_duration = summary_pd.rename(columns={
+        "planner_type": "Task Planner Type",
+        "mean_duration": "Mean Duration (s)",
+        "reduction_from_baseline": "Reduction from Baseline (%)",
+        "reduction_from_reference": "Reduction from Not Neighboring (%)"
+    })[["Task Planner Type", "Mean Duration (s)", "Reduction from Baseline (%)", "Reduction from Not Neighboring (%)"]]
+    return result_pd, mean_duration
+
+@traced("duration.intervals")
+def duration_intervals(result_pd, statistics=("mean", "median"), resamples=RESAMPLES, confidence=CONFIDENCE, seed=0,
+                       max_workers=1):
+    """Mean/median duration per planner type and its reductions from the references, with bootstrap CIs
+
+    Args:
+        result_pd (pd.DataFrame): Recipe durations, as returned by duration_tables
+
+    Returns:
+        pd.DataFrame: One row per (planner type, statistic)
+    """
+    durations = result_pd.groupby("Task Planner Type")["Plan Duration (s)"]
+    planner_types = [planner_type for planner_type in ORDER if planner_type in durations.groups]
+    planner_types += sorted(set(durations.groups) - set(planner_types))
+    samples = {planner_type: durations.get_group(planner_type).to_numpy() for planner_type in planner_types}
+
+    ci = f"{confidence:.0%} CI"
+    tables = []
+    for statistic in statistics:
+        intervals = reduction_intervals(samples, REFERENCES.values(), statistic, resamples, confidence, seed,
+                                        max_workers)
+        table = pd.DataFrame({"Task Planner Type": planner_types, "Statistic": statistic.capitalize()})
+        table["Duration (s)"] = intervals.groupby("group", sort=False)["statistic"].first().to_numpy()
+        for label, reference in REFERENCES.items():
+            rows = intervals[intervals["reference"] == reference]
+            table[f"Reduction from {label} (%)"] = rows["reduction"].to_numpy()
+            # the reference itself has no interval
+            table[f"{label} {ci}"] = [format_interval(lower, upper) if group != reference else ""
+                                      for group, lower, upper in zip(rows["group"], rows["lower"], rows["upper"])]
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+def grouped_durations(result_pd, recipes, field="rec"):
+    """Mean plan duration per planner type and recipe index (rec) or repetition (rep)
+
+    Args:
+        result_pd (pd.DataFrame): Recipe durations, as returned by duration_tables
+        recipes (pd.DataFrame): Recipe lookup table (recipe_index.load_recipe_table)
+
+    Returns:
+        pd.DataFrame: Planner types as rows, one column per rec/rep value
+    """
+    runs = annotate(result_pd, recipes, column="recipe_name", fields=[field])
+    grouped = runs.pivot_table(index="Task Planner Type", columns=field, values="Plan Duration (s)", aggfunc="mean")
+    grouped = grouped.reindex([planner_type for planner_type in ORDER if planner_type in grouped.index]
+                              + [planner_type for planner_type in grouped.index if planner_type not in ORDER])
+    grouped.columns = [f"{field} {value}" for value in grouped.columns]
+    return grouped
+
+@traced("duration.boxplot")
+def duration_boxplot(result_pd):
+    """Boxplot of the plan durations per planner type, drawn on the current figure"""
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+
+    sns.set_theme()
+    ax = sns.boxplot(data=result_pd, x="Plan Duration (s)", y="Task Planner Type", showfliers=False, order=ORDER)
+    plt.ylabel("")
+    return ax
+
+def duration_comparison(mongo_interface, results_collection_name=RESULTS_COLLECTION):
+    """duration_tables, with the boxplot drawn on the current figure"""
+    result_pd, mean_duration = duration_tables(mongo_interface, results_collection_name)
+    if result_pd is not None:
+        duration_boxplot(result_pd)
+    return result_pd, mean_duration
 
 def main():
     parser = argparse.ArgumentParser(description="Process some integers.")
     parser.add_argument("--latex", action="store_true", help="Output results in LaTeX format")
     parser.add_argument("--plotly", action="store_true", help="Show results using Plotly")
     parser.add_argument("--experiment", choices=DATABASES.keys(), required=True, help="Select the database to use")
+    parser.add_argument("--offline", action="store_true", help="Read the collection dumps through the local columnar cache instead of MongoDB")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse cached aggregation results")
+    parser.add_argument("--resamples", type=int, default=RESAMPLES, help="Bootstrap resamples of the confidence intervals (0: none)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes computing the bootstrap resamples")
+    parser.add_argument("--group-by", choices=["rec", "rep"], help="Also print the mean durations per recipe index or repetition")
 
     args = parser.parse_args()
 
-    database_name, results_collection_name = DATABASES[args.experiment]
-    mongo_interface = MongoInterface(database_name)
-
-    pipeline = StatisticalPipeline.recipes_duration_pipeline()
-    results = mongo_interface.query(results_collection_name, pipeline)
-    results_base_tp = []
-
-    for recipe_result in results:
-        if "recipe_name" not in recipe_result:
-            return 0
-        for recipe_name in RECIPE_NAMES:
-            if recipe_name in recipe_result["recipe_name"]:
-                if "TEST" in recipe_result["recipe_name"]:
-                    recipe_result["recipe_name"] = "Test"
-                    results_base_tp.append(recipe_result)
-                    continue
-                recipe_result["recipe_name"] = RECIPE_NAMES[recipe_name]
-                # print(RECIPE_NAMES[recipe_name])
-                results_base_tp.append(recipe_result)
-
-    result_pd = pd.DataFrame(results_base_tp)
-    sns.set_theme()
-
-    result_pd.rename(columns={'recipe_duration': 'Plan Duration (s)', 'recipe_name': 'Task Planner Type'}, inplace=True)
-    ax = sns.boxplot(data=result_pd, x="Plan Duration (s)", y="Task Planner Type", showfliers=False, 
-                     order=["Baseline TP", "Not Neighboring TP", "HA-TP (Relaxed)", "HA-TP"])
-
-    mean_duration = result_pd.groupby("Task Planner Type")["Plan Duration (s)"].mean().reset_index()
-    mean_duration.rename(columns={"Plan Duration (s)": "Mean Duration (s)"}, inplace=True)
-
-    baseline_duration = mean_duration[mean_duration["Task Planner Type"] == "Baseline TP"]["Mean Duration (s)"].values[0]
-    not_neighboring_duration = mean_duration[mean_duration["Task Planner Type"] == "Not Neighboring TP"]["Mean Duration (s)"].values[0]
+    mongo_interface = open_interface(DATABASES[args.experiment], args.offline, use_cache=not args.no_cache)
 
-    mean_duration["Reduction from Baseline (%)"] = ((baseline_duration - mean_duration["Mean Duration (s)"]) / baseline_duration) * 100
-    mean_duration["Reduction from Not Neighboring (%)"] = ((not_neighboring_duration - mean_duration["Mean Duration (s)"]) / not_neighboring_duration) * 100
+    result_pd, mean_duration = duration_comparison(mongo_interface)
+    if result_pd is None:
+        return 0
 
     if args.latex:
         latex_table = tabulate(mean_duration, headers="keys", tablefmt="latex_raw")
         print(latex_table)
+        if args.resamples:
+            intervals = duration_intervals(result_pd, resamples=args.resamples, max_workers=args.workers)
+            print(tabulate(intervals, headers="keys", tablefmt="latex_raw", floatfmt=".2f"))
+
+    if args.group_by:
+        grouped = grouped_durations(result_pd, load_recipe_table(mongo_interface, RESULTS_COLLECTION), args.group_by)
+        print(tabulate(grouped, headers="keys", tablefmt="latex_raw" if args.latex else "github", floatfmt=".2f"))
 
     if args.plotly:
+        import plotly.express as px
         fig = px.box(result_pd, x="Plan Duration (s)", y="Task Planner Type", color="Task Planner Type", category_orders={"Task Planner Type": ORDER})
         # fig.update_layout(
         #     paper_bgcolor='rgba(0,0,0,0)',
@@ -88,8 +146,9 @@ def main():
         # fig.write_html(f"{database_name}_durations.html", full_html=False, include_plotlyjs='cdn')
         fig.show()
 
-    plt.ylabel("")
-    plt.savefig("duration_comparison.pdf", bbox_inches='tight')
+    import matplotlib.pyplot as plt
+    with span("figure.save", "figure", path="duration_comparison.pdf"):
+        plt.savefig("duration_comparison.pdf", bbox_inches='tight')
     plt.show()
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import os
+import argparse
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+from tabulate import tabulate
+
+from hrtp_core import DATABASES, DISTANCE_FILES, SYNERGIES_COLLECTION, ORDER, PAPER_NAMES, open_interface
+from instrumentation import span
+
+ANALYSES = ("duration", "distance", "synergies")
+EXPERIMENT_COLUMN = "Experiment"
+PLANNER_COLUMN = "Task Planner Type"
+# Planner types are aligned on the names of the paper
+PLANNER_ORDER = [PAPER_NAMES.get(planner_type, planner_type) for planner_type in ORDER]
+
+DURATION_COLUMNS = ["Mean Duration (s)", "Reduction from Baseline (%)", "Reduction from Not Neighboring (%)"]
+PLAN_COLUMNS = {"makespan": "Plan Makespan (s)", "overlap_time": "Plan Overlap (s)", "overlap_cost": "Plan Overlap Risk"}
+
+
+def duration_metrics(experiment: str, offline: bool = False, use_cache: bool = True) -> pd.DataFrame:
+    """Mean duration and reductions per planner type (run in a thread: the work is the database query)"""
+    from duration_statistics import duration_tables
+
+    with span("compare.duration", "compare", experiment=experiment):
+        _, mean_duration = duration_tables(open_interface(DATABASES[experiment], offline, use_cache))
+    if mean_duration is None:
+        return None
+    return mean_duration.set_index(PLANNER_COLUMN)[DURATION_COLUMNS]
+
+
+def distance_metrics(experiment: str) -> pd.DataFrame:
+    """Minimum distance and mean time under each safety distance per planner type (run in a worker process)"""
+    from distance_statistics import (distance_summary, RECIPE_TYPE_COLUMN, RECIPE_S_D_TYPE_COLUMN,
+                                     RECIPE_PERCENTAGE_COLUMN)
+    import instrumentation
+
+    if not os.path.isfile(DISTANCE_FILES[experiment]):
+        raise FileNotFoundError(f"No distance measurements: {DISTANCE_FILES[experiment]}")
+    try:
+        with span("compare.distance", "compare", experiment=experiment):
+            _, _, min_distances_pd, percentage_under_risky_dataset = distance_summary(DISTANCE_FILES[experiment])
+    finally:
+        # pool workers do not run exit handlers
+        instrumentation.flush()
+    under = percentage_under_risky_dataset.pivot_table(index=RECIPE_TYPE_COLUMN, columns=RECIPE_S_D_TYPE_COLUMN,
+                                                       values=RECIPE_PERCENTAGE_COLUMN)
+    under.columns = [f"{level} (%)" for level in under.columns]
+    return min_distances_pd.set_index("Method")[["Min Distance (m)"]].join(under)
+
+
+def synergy_metrics(experiment: str, offline: bool = False, use_cache: bool = True) -> pd.DataFrame:
+    """Mean makespan, overlap and synergy-weighted overlap risk of the task plans per planner type"""
+    from synergy_matrix import SynergyMatrix
+    from plan_corpus import PlanTable, plan_paths
+    from plan_evaluator import evaluate_plans, planner_summary
+
+    database_name = DATABASES[experiment]
+    if not plan_paths(database_name):
+        raise FileNotFoundError(f"No task plans for {experiment}")
+    with span("compare.synergies", "compare", experiment=experiment):
+        synergy_matrix = SynergyMatrix.from_interface(open_interface(database_name, offline, use_cache),
+                                                      SYNERGIES_COLLECTION)
+        summary = planner_summary(evaluate_plans(PlanTable.load([database_name]), synergy_matrix))
+    summary = summary[list(PLAN_COLUMNS)].rename(columns=PLAN_COLUMNS)
+    summary.index = summary.index.map(lambda planner_type: PAPER_NAMES.get(planner_type, planner_type))
+    return summary
+
+
+def compare_experiments(experiments, analyses=ANALYSES, offline: bool = False, use_cache: bool = True,
+                        max_threads: int = None, max_workers: int = None) -> pd.DataFrame:
+    """Metrics of several experiments, fetched concurrently and aligned on the planner type
+
+    The database queries (durations, synergies) run in a thread pool, the distance metrics in a process
+    pool, so every experiment is processed at the same time. Analyses whose inputs are missing are skipped.
+
+    Returns:
+        pd.DataFrame: (experiment, planner type) rows, one column per metric (NaN where an analysis is missing)
+    """
+    results = {}
+    processes = ProcessPoolExecutor(max_workers=max_workers) if "distance" in analyses else nullcontext()
+    with processes, ThreadPoolExecutor(max_workers=max_threads) as threads:
+        futures = {}
+        # worker processes are started before the threads
+        for experiment in experiments:
+            if "distance" in analyses:
+                futures[processes.submit(distance_metrics, experiment)] = (experiment, "distance")
+        for experiment in experiments:
+            if "duration" in analyses:
+                futures[threads.submit(duration_metrics, experiment, offline, use_cache)] = (experiment, "duration")
+            if "synergies" in analyses:
+                futures[threads.submit(synergy_metrics, experiment, offline, use_cache)] = (experiment, "synergies")
+        for future in as_completed(futures):
+            experiment, analysis = futures[future]
+            try:
+                frame = future.result()
+            except Exception as exception:
+                print(f"{experiment}/{analysis}: skipped ({exception})")
+                continue
+            if frame is not None:
+                results[(experiment, analysis)] = frame
+
+    frames = []
+    for experiment in experiments:
+        parts = [results[(experiment, analysis)] for analysis in analyses if (experiment, analysis) in results]
+        if not parts:
+            continue
+        frame = pd.concat(parts, axis=1)
+        frame.index.name = PLANNER_COLUMN
+        frames.append(frame.reset_index().assign(**{EXPERIMENT_COLUMN: experiment}))
+    if not frames:
+        return pd.DataFrame(columns=[EXPERIMENT_COLUMN, PLANNER_COLUMN]).set_index([EXPERIMENT_COLUMN, PLANNER_COLUMN])
+
+    combined = pd.concat(frames, ignore_index=True)
+    planner_types = PLANNER_ORDER + sorted(set(combined[PLANNER_COLUMN]) - set(PLANNER_ORDER))
+    combined[PLANNER_COLUMN] = pd.Categorical(combined[PLANNER_COLUMN], categories=planner_types, ordered=True)
+    combined[EXPERIMENT_COLUMN] = pd.Categorical(combined[EXPERIMENT_COLUMN], categories=list(experiments), ordered=True)
+    combined = combined.sort_values([EXPERIMENT_COLUMN, PLANNER_COLUMN])
+    columns = [column for frame in frames for column in frame.columns if column not in (EXPERIMENT_COLUMN, PLANNER_COLUMN)]
+    return combined.set_index([EXPERIMENT_COLUMN, PLANNER_COLUMN])[list(dict.fromkeys(columns))]
+
+
+def metric_table(combined: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """One metric with planner types as rows and experiments as columns"""
+    return combined[metric].unstack(EXPERIMENT_COLUMN, sort=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the durations, distances and plan synergies of several "
+                                                 "experiments per planner type.")
+    parser.add_argument("--experiment", nargs="+", choices=DATABASES.keys(), default=list(DATABASES),
+                        help="Experiments to compare (default: all)")
+    parser.add_argument("--analysis", nargs="+", choices=ANALYSES, default=list(ANALYSES),
+                        help="Analyses to run (default: all)")
+    parser.add_argument("--metric", help="Print only this metric, one column per experiment")
+    parser.add_argument("--latex", action="store_true", help="Output the table in LaTeX format")
+    parser.add_argument("--offline", action="store_true", help="Read the collection dumps through the local columnar cache instead of MongoDB")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse cached aggregation results")
+    parser.add_argument("--threads", type=int, default=None, help="Threads running the database queries")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes computing the distance metrics")
+
+    args = parser.parse_args()
+
+    combined = compare_experiments(args.experiment, args.analysis, offline=args.offline, use_cache=not args.no_cache,
+                                   max_threads=args.threads, max_workers=args.workers)
+    if args.metric:
+        if args.metric not in combined.columns:
+            raise SystemExit(f"Unknown metric {args.metric}, available: {', '.join(combined.columns)}")
+        table = metric_table(combined, args.metric)
+    else:
+        table = combined.reset_index()
+    print(tabulate(table, headers="keys", tablefmt="latex_raw" if args.latex else "github", floatfmt=".2f",
+                   showindex=bool(args.metric)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#! /usr/bin/env python3
+
+import json
+import hashlib
+from datetime import datetime, timezone
+from itertools import islice
+
+from bson import ObjectId
+
+READ_CHUNK_SIZE = 1 << 20  # 1 MiB of text per read
+WHITESPACE = " \t\n\r"
+
+
+def decode_special_fields(document: dict):
+    """Object hook converting Extended-JSON wrappers ($oid, $date) while parsing.
+
+    Args:
+        document (dict): JSON object just decoded by the parser
+
+    Returns:
+        ObjectId | datetime | dict: Converted value or the untouched document
+    """
+    if len(document) == 1:
+        if "$oid" in document:
+            return ObjectId(document["$oid"])
+        if "$date" in document:
+            return decode_date(document["$date"])
+    return document
+
+
+def decode_date(value) -> datetime:
+    """Decode the value of an Extended-JSON $date (relaxed ISO string or canonical milliseconds)"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if isinstance(value, dict):
+        value = int(value["$numberLong"])
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+
+def iter_documents(file_path: str, chunk_size: int = READ_CHUNK_SIZE):
+    """Stream the documents of an Extended-JSON array dump (mongoexport --jsonArray)
+
+    The file is read in chunks and every array element is decoded on its own, so memory
+    is bounded by the chunk size and the largest document, not by the dump size.
+
+    Args:
+        file_path (str): Path of the collection dump
+        chunk_size (int): Number of characters read from the file at a time
+
+    Yields:
+        dict: Documents with $oid/$date already converted
+    """
+    decoder = json.JSONDecoder(object_hook=decode_special_fields)
+
+    with open(file_path, 'r') as file:
+        buffer = ""
+        position = 0
+        eof = False
+
+        def refill():
+            nonlocal buffer, position, eof
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            return not eof
+
+        def next_token():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in WHITESPACE:
+                    position += 1
+                if position < len(buffer):
+                    return buffer[position]
+                if not refill():
+                    return None
+
+        if next_token() != "[":
+            raise ValueError(f"{file_path} is not a JSON array dump")
+        position += 1
+
+        expect_separator = False
+        while True:
+            token = next_token()
+            if token == "]":
+                return
+            if token is None:
+                raise ValueError(f"Unexpected end of file in {file_path}")
+            if expect_separator:
+                if token != ",":
+                    raise ValueError(f"Expected ',' at offset {position} of the current chunk in {file_path}")
+                position += 1
+                next_token()
+
+            while True:
+                try:
+                    document, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # The document straddles the chunk boundary: read more and retry
+                    if not refill():
+                        raise
+                    continue
+                if end == len(buffer) and not eof and refill():
+                    continue  # a bare scalar could have been cut at the boundary
+                break
+
+            position = end
+            expect_separator = True
+            yield document
+
+
+def iter_batches(documents, batch_size: int):
+    """Group an iterable of documents into lists of at most batch_size elements"""
+    iterator = iter(documents)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of a dump, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        while block := file.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
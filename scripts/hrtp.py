@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import os
+import argparse
+
+from hrtp_core import DATABASES, DISTANCE_FILES, Timings, open_interface
+from instrumentation import span
+
+# pandas, pymongo and the analysis modules are imported by the subcommands, the plotting libraries only when a
+# figure is shown (--plot) or saved (--save)
+
+
+def table_format(args) -> str:
+    return "latex_raw" if args.latex else "github"
+
+
+def pyplot(args):
+    """matplotlib.pyplot, with a non-interactive backend when figures are only saved"""
+    import matplotlib
+    if not args.plot:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def save_figure(figure, args, file_name: str):
+    os.makedirs(args.save, exist_ok=True)
+    with span("figure.save", "figure", path=os.path.join(args.save, file_name)):
+        figure.savefig(os.path.join(args.save, file_name), bbox_inches='tight')
+
+
+def duration_command(args, timings: Timings):
+    with timings.stage("import"):
+        from tabulate import tabulate
+        from duration_statistics import duration_tables, duration_intervals, duration_boxplot, ORDER
+    with timings.stage("connect"):
+        mongo_interface = timings.interface(open_interface(DATABASES[args.experiment], args.offline,
+                                                           use_cache=not args.no_cache))
+    with timings.stage("compute"):
+        result_pd, mean_duration = duration_tables(mongo_interface)
+        intervals = None
+        if result_pd is not None and args.resamples:
+            intervals = duration_intervals(result_pd, resamples=args.resamples, max_workers=args.workers)
+    if result_pd is None:
+        return None
+    print(tabulate(mean_duration, headers="keys", tablefmt=table_format(args)))
+    if intervals is not None:
+        print(tabulate(intervals, headers="keys", tablefmt=table_format(args), floatfmt=".2f"))
+
+    if args.plot or args.save:
+        with timings.stage("import"):
+            plt = pyplot(args)
+            import seaborn  # noqa: F401
+        with timings.stage("plot"):
+            figure = plt.figure()
+            duration_boxplot(result_pd)
+            if args.save:
+                save_figure(figure, args, "duration_comparison.pdf")
+    if args.plotly:
+        with timings.stage("import"):
+            import plotly.express as px
+        with timings.stage("plot"):
+            px.box(result_pd, x="Plan Duration (s)", y="Task Planner Type", color="Task Planner Type",
+                   category_orders={"Task Planner Type": ORDER}).show()
+    return plt if args.plot else None
+
+
+def distance_command(args, timings: Timings):
+    with timings.stage("import"):
+        from tabulate import tabulate
+        from distance_statistics import distance_summary, percentage_intervals, distance_figures
+    if not os.path.isfile(DISTANCE_FILES[args.experiment]):
+        raise SystemExit(f"No distance measurements for {args.experiment}: {DISTANCE_FILES[args.experiment]}")
+    with timings.stage("compute"):
+        x_axis, cdf_runs, min_distances_pd, percentage_under_risky_dataset = distance_summary(
+            DISTANCE_FILES[args.experiment])
+        intervals = None
+        if args.resamples:
+            intervals = percentage_intervals(percentage_under_risky_dataset, resamples=args.resamples,
+                                             max_workers=args.workers)
+    print(tabulate(min_distances_pd, headers="keys", tablefmt=table_format(args)))
+    if intervals is not None:
+        print(tabulate(intervals, headers="keys", tablefmt=table_format(args), floatfmt=".2f", showindex=False))
+
+    if args.plot or args.save:
+        with timings.stage("import"):
+            plt = pyplot(args)
+            import seaborn  # noqa: F401
+        with timings.stage("plot"):
+            figure, percentage_grid = distance_figures(x_axis, cdf_runs, percentage_under_risky_dataset,
+                                                       zoom=args.zoom, resamples=args.resamples,
+                                                       max_workers=args.workers)
+            if args.save:
+                save_figure(figure, args, "cumulative_distance.png")
+                save_figure(percentage_grid.figure, args, "percentage_under_safety_distance.png")
+    return plt if args.plot else None
+
+
+def synergies_command(args, timings: Timings):
+    with timings.stage("import"):
+        from tabulate import tabulate
+        from hrtp_core import SYNERGIES_COLLECTION
+        from synergy_matrix import SynergyMatrix
+    with timings.stage("connect"):
+        mongo_interface = timings.interface(open_interface(DATABASES[args.experiment], args.offline,
+                                                           use_cache=not args.no_cache))
+    with timings.stage("compute"):
+        synergy_matrix = SynergyMatrix.from_interface(mongo_interface, SYNERGIES_COLLECTION)
+        duplicated = synergy_matrix.duplicated()
+        matrices = [] if duplicated.any() else [synergy_matrix.matrix(agent, concurrent_agent)
+                                                for agent, concurrent_agent in synergy_matrix.agent_pairs()]
+    if duplicated.any():
+        print("There are duplicated tasks")
+        print(synergy_matrix.frame[duplicated])
+        return None
+    for matrix in matrices:
+        print(tabulate(matrix, headers="keys", tablefmt=table_format(args), floatfmt=".2f"))
+
+    if args.plot or args.save:
+        with timings.stage("import"):
+            plt = pyplot(args)
+            import seaborn  # noqa: F401
+            from synergies import synergy_figures
+        with timings.stage("plot"):
+            for agent, figure in synergy_figures(synergy_matrix):
+                if args.save:
+                    save_figure(figure, args, f"synergy_matrix_{agent}.pdf")
+    return plt if args.plot else None
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="hrtp", description="Human-robot task planning results.")
+    parser.add_argument("--timings", action="store_true", help="Print import, connection, query, compute and plot times")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--experiment", choices=DATABASES.keys(), required=True, help="Select the experiment")
+    common.add_argument("--latex", action="store_true", help="Output the tables in LaTeX format")
+    common.add_argument("--plot", action="store_true", help="Show the figures")
+    common.add_argument("--save", metavar="DIRECTORY", help="Save the figures in DIRECTORY")
+
+    database = argparse.ArgumentParser(add_help=False)
+    database.add_argument("--offline", action="store_true", help="Read the collection dumps through the local columnar cache instead of MongoDB")
+    database.add_argument("--no-cache", action="store_true", help="Do not reuse cached aggregation results")
+
+    bootstrap = argparse.ArgumentParser(add_help=False)
+    bootstrap.add_argument("--resamples", type=int, default=10000, help="Bootstrap resamples of the confidence intervals (0: none)")
+    bootstrap.add_argument("--workers", type=int, default=1, help="Worker processes computing the bootstrap resamples")
+
+    duration = subparsers.add_parser("duration", parents=[common, database, bootstrap], help="Plan durations per planner type")
+    duration.add_argument("--plotly", action="store_true", help="Show the durations using Plotly")
+    duration.set_defaults(function=duration_command)
+
+    distance = subparsers.add_parser("distance", parents=[common, bootstrap], help="Human-robot distance per planner type")
+    distance.add_argument("--zoom", action="store_true", help="Enable zoom in the plot")
+    distance.set_defaults(function=distance_command)
+
+    synergies = subparsers.add_parser("synergies", parents=[common, database], help="Synergy matrices")
+    synergies.set_defaults(function=synergies_command)
+
+    args = parser.parse_args()
+
+    timings = Timings(args.timings)
+    plt = args.function(args, timings)
+    timings.report()
+    if plt is not None:
+        plt.show()
+
+
+if __name__ == "__main__":
+    main()
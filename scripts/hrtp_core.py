@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+from contextlib import contextmanager
+
+from instrumentation import span
+
+# Only the standard library (and instrumentation) is imported here: the CLIs load pandas, pymongo and the plotting libraries lazily
+
+DATABASES = {
+    "safety_areas": "safety_areas",
+    "velocity_scaling": "velocity_scaling",
+    "realworld_case_study": "hrc_case_study"
+}
+
+DISTANCE_FILES = {
+    "safety_areas": "safety_areas/Distance_Monitoring/hr_distance.csv",
+    "velocity_scaling": "velocity_scaling/Distance_Monitoring/hr_distance.csv",
+    "realworld_case_study": "hrc_case_study/hrc_case_study_results/Distance_Monitoring/hr_distance.csv"
+}
+
+RESULTS_COLLECTION = "task_results_online"
+SYNERGIES_COLLECTION = "task_synergies"
+
+# Recipe name prefix -> planner type
+RECIPE_NAMES = {
+    "TESTdsfds": "Safety Areas - HA",
+    "SAFETY_AREA_NO_AWARE": "Safety Areas - Random",
+    "NOT_NEIGHBORING_TASKS": "Not Neighboring TP",
+    "TEST_WITH_GOHOME": "test",
+    "ONELINE": "AWARE",
+    "RELAXED_HA_SOLVER": "HA-TP (Relaxed)",
+    "BASIC_SOLVER": "Baseline TP",
+    "COMPLETE_SOLVER": "HA-TP",
+    "COMPLETE_HA_SOLVER": "HA-TP",
+    "TEST_COMPLETE": "Test",
+    "TEST_RELAXED": "Test REL",
+    "NEW": "New"
+}
+
+ORDER = ["Baseline TP", "Not Neighboring TP", "HA-TP (Relaxed)", "HA-TP"]
+
+# Planner names used in the duration figures and tables of the paper
+PAPER_NAMES = {
+    "HA-TP (Relaxed)": "Relaxed S. TP",
+    "HA-TP": "Synergistic TP"
+}
+
+
+def recipe_names(renames: dict = None) -> dict:
+    """RECIPE_NAMES with the planner types renamed (e.g. with PAPER_NAMES)"""
+    renames = renames or {}
+    return {prefix: renames.get(planner_type, planner_type) for prefix, planner_type in RECIPE_NAMES.items()}
+
+
+def open_interface(database_name: str, offline: bool = False, use_cache: bool = True):
+    """LocalInterface over the dumps when offline, MongoInterface (with the results cache unless disabled) otherwise"""
+    if offline:
+        from LocalInterface import LocalInterface
+        return LocalInterface(database_name)
+    from MongoInterface import MongoInterface
+    from query_cache import QueryCache
+    return MongoInterface(database_name, cache=QueryCache() if use_cache else None)
+
+
+class Timings:
+    """Wall time per stage (import, query, compute, plot); a no-op when disabled"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        with span(f"hrtp.{name}", "hrtp"):
+            if not self.enabled:
+                yield
+                return
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def interface(self, interface):
+        """Wrap an interface so that its queries (cursor consumption included) count as query time"""
+        return TimedInterface(interface, self) if self.enabled else interface
+
+    def report(self, file=sys.stderr):
+        if not self.enabled:
+            return
+        # query time is spent inside the analysis, report it apart from the computation
+        stages = dict(self.stages)
+        if "compute" in stages:
+            stages["compute"] -= stages.get("query", 0.0)
+        for name, seconds in stages.items():
+            print(f"{name:>8}: {seconds * 1000:9.1f} ms", file=file)
+        print(f"{'total':>8}: {sum(stages.values()) * 1000:9.1f} ms", file=file)
+
+
+class TimedInterface:
+    def __init__(self, interface, timings: Timings):
+        self._interface = interface
+        self._timings = timings
+
+    def query(self, collection_name: str, pipeline: list):
+        with self._timings.stage("query"):
+            return list(self._interface.query(collection_name, pipeline))
+
+    def __getattr__(self, name):
+        return getattr(self._interface, name)
@@ -0,0 +1,306 @@
+#! /usr/bin/env python3
+
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from plan_metrics import overlapping_pairs
+from instrumentation import traced
+
+SKETCH_RELATIVE_ACCURACY = 0.005
+
+
+@dataclass
+class RunningMoments:
+    """Weighted count/mean/M2 (Welford), mergeable with Chan's parallel formula
+
+    With unit weights, variance(ddof=1) is the usual sample variance.
+    """
+    count: int = 0
+    weight: float = 0.0
+    mean: float = 0.0
+    m2: float = 0.0
+    minimum: float = math.inf
+    maximum: float = -math.inf
+
+    def merge(self, other: "RunningMoments") -> "RunningMoments":
+        if other.weight == 0:
+            return self
+        weight = self.weight + other.weight
+        delta = other.mean - self.mean
+        self.mean += delta * other.weight / weight
+        self.m2 += other.m2 + delta * delta * self.weight * other.weight / weight
+        self.weight = weight
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    def add(self, values, weights=None) -> "RunningMoments":
+        """Fold a batch of values (moments of the batch computed vectorized, then merged)"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64)
+        weight = weights.sum()
+        mean = np.dot(weights, values) / weight
+        return self.merge(RunningMoments(len(values), float(weight), float(mean),
+                                         float(np.dot(weights, (values - mean) ** 2)),
+                                         float(values.min()), float(values.max())))
+
+    def variance(self, ddof: int = 0) -> float:
+        if self.count <= ddof:
+            return math.nan
+        # ddof rescales the weighted variance by the number of samples, as for unit weights
+        return self.m2 / self.weight * self.count / (self.count - ddof)
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "RunningMoments":
+        return cls(**values)
+
+
+@dataclass
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error guarantees (logarithmic buckets, as in DDSketch)
+
+    A positive value x falls in bucket ceil(log_gamma(x)); every quantile estimate is within
+    relative_accuracy of the true value. Non-positive values are only counted.
+    """
+    relative_accuracy: float = SKETCH_RELATIVE_ACCURACY
+    bins: dict = field(default_factory=dict)
+    non_positive: int = 0
+
+    @property
+    def gamma(self) -> float:
+        return (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    @property
+    def count(self) -> int:
+        return self.non_positive + sum(self.bins.values())
+
+    def add(self, values) -> "QuantileSketch":
+        values = np.asarray(values, dtype=np.float64)
+        positive = values[values > 0]
+        self.non_positive += len(values) - len(positive)
+        indexes, counts = np.unique(np.ceil(np.log(positive) / math.log(self.gamma)).astype(np.int64),
+                                    return_counts=True)
+        for index, count in zip(indexes.tolist(), counts.tolist()):
+            self.bins[index] = self.bins.get(index, 0) + count
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Sketches with different accuracies cannot be merged")
+        self.non_positive += other.non_positive
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        return self
+
+    def quantile(self, q: float) -> float:
+        count = self.count
+        if count == 0:
+            return math.nan
+        rank = q * (count - 1)
+        if rank < self.non_positive:
+            return 0.0
+        seen = self.non_positive
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> dict:
+        # BSON keys must be strings
+        return {"relative_accuracy": self.relative_accuracy, "non_positive": self.non_positive,
+                "bins": {str(index): count for index, count in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "QuantileSketch":
+        return cls(values["relative_accuracy"], {int(index): count for index, count in values["bins"].items()},
+                   values["non_positive"])
+
+
+@dataclass
+class StatisticsState:
+    """Running task_durations / task_synergies aggregates and the last folded document
+
+    durations: (agent, name) -> {"moments", "sketch", "successes"} over the task durations.
+    synergies: (agent, agent_skill, concurrent_agent, concurrent_skill) -> {"moments", "successes"} over the
+    dynamic_risk samples: one per execution of the agent task overlapping the concurrent skill, its duration
+    over the expected duration of the agent task when it is folded. A state seeded from existing documents
+    (from_statistics) starts from their dynamic_risk as the mean of counter such samples.
+    changed_durations / changed_synergies hold the keys folded into since the state was loaded.
+    """
+    durations: dict = field(default_factory=dict)
+    synergies: dict = field(default_factory=dict)
+    watermark: object = None
+    changed_durations: set = field(default_factory=set)
+    changed_synergies: set = field(default_factory=set)
+
+    @traced("statistics.fold")
+    def fold(self, tasks: pd.DataFrame, new: np.ndarray = None):
+        """Fold task executions into the aggregates
+
+        Args:
+            tasks (pd.DataFrame): Task executions (agent, name, recipe, outcome, t_start, t_end). Besides the new
+                executions it may hold already folded executions of the same recipes, so that new tasks overlapping
+                old ones still produce synergy samples.
+            new (np.ndarray): Boolean mask of the executions not folded yet (default: all)
+        """
+        if tasks.empty:
+            return
+        new = np.ones(len(tasks), dtype=bool) if new is None else np.asarray(new, dtype=bool)
+        tasks = tasks.reset_index(drop=True)
+        duration = (tasks["t_end"] - tasks["t_start"]).to_numpy(dtype=np.float64)
+        success = tasks["outcome"].to_numpy(dtype=np.float64) > 0
+
+        for (agent, name), rows in tasks[new].groupby(["agent", "name"], observed=True, sort=False).indices.items():
+            rows = np.flatnonzero(new)[rows]
+            entry = self.durations.setdefault((agent, name), {"moments": RunningMoments(), "sketch": QuantileSketch(),
+                                                              "successes": 0})
+            entry["moments"].add(duration[rows])
+            entry["sketch"].add(duration[rows])
+            entry["successes"] += int(success[rows].sum())
+            self.changed_durations.add((agent, name))
+
+        recipe = pd.factorize(tasks["recipe"])[0]
+        agents = tasks["agent"].to_numpy()
+        t_start, t_end = tasks["t_start"].to_numpy(dtype=np.float64), tasks["t_end"].to_numpy(dtype=np.float64)
+        for agent in pd.unique(agents):
+            first, second, overlap = overlapping_pairs(recipe, t_start, t_end, np.flatnonzero(agents == agent),
+                                                       np.flatnonzero(agents != agent))
+            # pairs of two already folded executions were counted in an earlier update
+            keep = (new[first] | new[second]) & (duration[first] > 0)
+            first, second, overlap = first[keep], second[keep], overlap[keep]
+            pairs = pd.DataFrame({"agent_skill": tasks["name"].to_numpy()[first],
+                                  "concurrent_agent": agents[second],
+                                  "concurrent_skill": tasks["name"].to_numpy()[second]})
+            for (agent_skill, concurrent_agent, concurrent_skill), rows in pairs.groupby(
+                    ["agent_skill", "concurrent_agent", "concurrent_skill"], sort=False).indices.items():
+                if (agent, agent_skill) not in self.durations:
+                    continue
+                key = (agent, agent_skill, concurrent_agent, concurrent_skill)
+                entry = self.synergies.setdefault(key, {"moments": RunningMoments(), "successes": 0})
+                executions = first[rows]
+                entry["moments"].add(duration[executions] / self.durations[(agent, agent_skill)]["moments"].mean)
+                entry["successes"] += int(success[executions].sum())
+                self.changed_synergies.add(key)
+
+    def merge(self, other: "StatisticsState") -> "StatisticsState":
+        """Combine the aggregates of disjoint sets of executions"""
+        for key, entry in other.durations.items():
+            mine = self.durations.setdefault(key, {"moments": RunningMoments(), "sketch": QuantileSketch(),
+                                                   "successes": 0})
+            mine["moments"].merge(entry["moments"])
+            mine["sketch"].merge(entry["sketch"])
+            mine["successes"] += entry["successes"]
+        for key, entry in other.synergies.items():
+            mine = self.synergies.setdefault(key, {"moments": RunningMoments(), "successes": 0})
+            mine["moments"].merge(entry["moments"])
+            mine["successes"] += entry["successes"]
+        return self
+
+    def duration_documents(self, keys=None) -> list:
+        """Documents in the task_durations format (of the given (agent, name) keys, default all)"""
+        documents = []
+        for agent, name in self.durations if keys is None else keys:
+            entry = self.durations[(agent, name)]
+            moments = entry["moments"]
+            documents.append({
+                "_id": {"agent": agent, "name": name},
+                "counter": moments.count,
+                "success_rate": entry["successes"] / moments.count,
+                "min": moments.minimum,
+                "max": moments.maximum,
+                "name": name,
+                "agent": agent,
+                "expected_duration": moments.mean,
+                "duration_stddev": math.sqrt(moments.variance(ddof=1)) if moments.count > 1 else 0.0,
+                "median": entry["sketch"].quantile(0.5)
+            })
+        return documents
+
+    def synergy_documents(self, keys=None) -> list:
+        """Documents in the task_synergies format, without _id (of the given keys, default all)"""
+        documents = []
+        for agent, agent_skill, concurrent_agent, concurrent_skill in self.synergies if keys is None else keys:
+            entry = self.synergies[(agent, agent_skill, concurrent_agent, concurrent_skill)]
+            moments = entry["moments"]
+            documents.append({
+                "agent": agent,
+                "concurrent_agent": concurrent_agent,
+                "agent_skill": agent_skill,
+                "concurrent_skill": concurrent_skill,
+                "success_rate": entry["successes"] / moments.count,
+                "dynamic_risk": moments.mean,
+                "std_err": math.sqrt(moments.variance() / moments.count),
+                "counter": moments.count
+            })
+        return documents
+
+    def to_documents(self) -> list:
+        """State documents (one per aggregate, plus the watermark)"""
+        documents = [{"_id": {"kind": "watermark"}, "watermark": self.watermark}]
+        for (agent, name), entry in self.durations.items():
+            documents.append({"_id": {"kind": "duration", "agent": agent, "name": name},
+                              "moments": entry["moments"].to_dict(), "sketch": entry["sketch"].to_dict(),
+                              "successes": entry["successes"]})
+        for (agent, agent_skill, concurrent_agent, concurrent_skill), entry in self.synergies.items():
+            documents.append({"_id": {"kind": "synergy", "agent": agent, "agent_skill": agent_skill,
+                                      "concurrent_agent": concurrent_agent, "concurrent_skill": concurrent_skill},
+                              "moments": entry["moments"].to_dict(), "successes": entry["successes"]})
+        return documents
+
+    @classmethod
+    def from_documents(cls, documents) -> "StatisticsState":
+        state = cls()
+        for document in documents:
+            key = document["_id"]
+            if key["kind"] == "watermark":
+                state.watermark = document["watermark"]
+            elif key["kind"] == "duration":
+                state.durations[(key["agent"], key["name"])] = {
+                    "moments": RunningMoments.from_dict(document["moments"]),
+                    "sketch": QuantileSketch.from_dict(document["sketch"]),
+                    "successes": document["successes"]}
+            elif key["kind"] == "synergy":
+                state.synergies[(key["agent"], key["agent_skill"], key["concurrent_agent"], key["concurrent_skill"])] = {
+                    "moments": RunningMoments.from_dict(document["moments"]),
+                    "successes": document["successes"]}
+        return state
+
+    @classmethod
+    def from_statistics(cls, duration_documents, synergy_documents, watermark=None) -> "StatisticsState":
+        """State reproducing existing task_durations / task_synergies documents
+
+        The moments are rebuilt from counter, mean and standard deviation (std_err for the synergies), so
+        folding new executions updates the stored values instead of recomputing them. The documents only
+        summarize the distribution of the durations by its median: each sketch starts with counter samples
+        at the stored median.
+
+        Args:
+            watermark: _id of the last execution the documents summarize
+        """
+        state = cls(watermark=watermark)
+        for document in duration_documents:
+            count = document["counter"]
+            state.durations[(document["agent"], document["name"])] = {
+                "moments": RunningMoments(count, float(count), document["expected_duration"],
+                                          document["duration_stddev"] ** 2 * (count - 1),
+                                          document["min"], document["max"]),
+                "sketch": QuantileSketch().add(np.full(count, document["median"])),
+                "successes": round(document["success_rate"] * count)}
+        for document in synergy_documents:
+            count = document["counter"]
+            state.synergies[(document["agent"], document["agent_skill"], document["concurrent_agent"],
+                             document["concurrent_skill"])] = {
+                "moments": RunningMoments(count, float(count), document["dynamic_risk"],
+                                          (document["std_err"] * count) ** 2),
+                "successes": round(document["success_rate"] * count)}
+        return state
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import argparse
+from MongoInterface import MongoInterface
+from statistical_pipeline import StatisticalPipeline
+from tabulate import tabulate
+from hrtp_core import DATABASES
+
+PIPELINES = {
+    "recipes_duration_pipeline": ("task_results_online", StatisticalPipeline.recipes_duration_pipeline()),
+    "grouped_synergies_pipeline": ("task_synergies", StatisticalPipeline.grouped_synergies_pipeline())
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the recommended indexes and report how the pipelines use them.")
+    parser.add_argument("--experiment", choices=DATABASES.keys(), required=True, help="Select the database to use")
+    parser.add_argument("--no-create", action="store_true", help="Only report, do not create missing indexes")
+
+    args = parser.parse_args()
+
+    mongo_interface = MongoInterface(DATABASES[args.experiment])
+    if not args.no_create:
+        for collection_name, index_names in mongo_interface.ensure_indexes().items():
+            print(f"{collection_name}: {', '.join(index_names)}")
+
+    report = []
+    for pipeline_name, (collection_name, pipeline) in PIPELINES.items():
+        if not mongo_interface.collection_exist(collection_name):
+            continue
+        explanation = mongo_interface.explain(collection_name, pipeline)
+        report.append([pipeline_name, collection_name, " > ".join(explanation["stages"]),
+                       ", ".join(explanation["indexes"]) or "-", explanation["index_backed"]])
+
+    print(tabulate(report, headers=["Pipeline", "Collection", "Plan stages", "Indexes", "Index backed"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+import os
+import glob
+import json
+import atexit
+import functools
+import threading
+import time
+
+# HRTP_TRACE=trace.json records spans and writes them as a Chrome trace (chrome://tracing, ui.perfetto.dev);
+# HRTP_PROFILE=run.prof also dumps cProfile statistics (pstats format). Both are off by default.
+TRACE_VARIABLE = "HRTP_TRACE"
+PROFILE_VARIABLE = "HRTP_PROFILE"
+# pid of the process that owns the output files, inherited by worker processes (forked or spawned)
+OWNER_VARIABLE = "HRTP_TRACE_OWNER"
+
+
+class NullSpan:
+    """Span returned while tracing is disabled: entering, leaving and annotating it do nothing"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is not None:
+            self.args["error"] = exception_type.__name__
+        self.tracer.record(self.name, self.category, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+    def set(self, **args):
+        """Annotate the span (document counts, bytes, cache hits...)"""
+        self.args.update(args)
+
+
+class Tracer:
+    """Complete ("X") events of the current process, written in the Chrome trace event format
+
+    Timestamps come from the monotonic clock, shared by the processes of a pool, so the per-process
+    files written by workers (path.<pid>.json) line up when the parent merges them at exit.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.time()
+        self.events = []
+        self.lock = threading.Lock()
+
+    def record(self, name: str, category: str, start_ns: int, end_ns: int, args: dict):
+        event = {"name": name, "cat": category, "ph": "X", "ts": start_ns / 1000, "dur": (end_ns - start_ns) / 1000,
+                 "pid": os.getpid(), "tid": threading.get_ident(), "args": args}
+        with self.lock:
+            self.events.append(event)
+
+    def process_path(self) -> str:
+        return process_path(self.path, ".json")
+
+    def worker_paths(self) -> list:
+        stem, extension = os.path.splitext(self.path)
+        paths = glob.glob(f"{glob.escape(stem)}.*{extension or '.json'}")
+        return [path for path in paths if path[len(stem) + 1:len(path) - len(extension or '.json')].isdigit()
+                and os.path.getmtime(path) >= self.started]
+
+    def write(self):
+        """Write this process' events; the main process also merges (and removes) the files of its workers"""
+        with self.lock:
+            events = list(self.events)
+        path = self.process_path()
+        if path == self.path:
+            for worker_path in self.worker_paths():
+                with open(worker_path, 'r') as file:
+                    events.extend(json.load(file)["traceEvents"])
+                os.remove(worker_path)
+        events.extend({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"hrtp {pid}"}}
+                      for pid in sorted({event["pid"] for event in events}))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", 'w') as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        os.replace(path + ".tmp", path)
+
+
+_tracer = None
+_profiler = None
+_profile_path = None
+
+
+def is_owner() -> bool:
+    return os.environ.get(OWNER_VARIABLE) == str(os.getpid())
+
+
+def process_path(path: str, default_extension: str) -> str:
+    """path in the owner process, path.<pid> (same extension) in its workers"""
+    if is_owner():
+        return path
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{os.getpid()}{extension or default_extension}"
+
+
+def enable(trace_path: str = None, profile_path: str = None):
+    """Start tracing to trace_path and/or profiling to profile_path (written at exit or by flush)"""
+    global _tracer, _profiler, _profile_path
+    if _tracer is None and _profiler is None:
+        os.environ.setdefault(OWNER_VARIABLE, str(os.getpid()))
+        atexit.register(flush)
+        os.register_at_fork(after_in_child=_after_fork)
+    if trace_path and _tracer is None:
+        _tracer = Tracer(trace_path)
+    if profile_path and _profiler is None:
+        import cProfile
+        _profile_path = profile_path
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def _after_fork():
+    """A forked worker starts with empty events and a fresh profiler, not with copies of the parent's"""
+    global _profiler
+    if _tracer is not None:
+        _tracer.events = []
+        _tracer.lock = threading.Lock()
+    if _profiler is not None:
+        import cProfile
+        _profiler.disable()
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, category: str = "analysis", **args):
+    """Context manager timing a block as a trace span (NULL_SPAN when tracing is disabled)"""
+    if _tracer is None:
+        return NULL_SPAN
+    return Span(_tracer, name, category, args)
+
+
+def traced(name: str, category: str = "analysis"):
+    """Decorator recording every call of a function as a span"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with Span(_tracer, name, category, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_cursor(cursor, name: str, category: str = "mongo", **args):
+    """Iterate a cursor recording its consumption (documents and BSON bytes received) as one span
+
+    The span covers the first to the last document fetched, including the time the consumer spends between
+    documents (usually negligible: results are consumed with list()). Returns the cursor itself when disabled.
+    """
+    if _tracer is None:
+        return cursor
+    return _consume(_tracer, cursor, name, category, args)
+
+
+def _consume(tracer: Tracer, cursor, name: str, category: str, args: dict):
+    import bson
+
+    documents = 0
+    size = 0
+    start = time.perf_counter_ns()
+    try:
+        for document in cursor:
+            documents += 1
+            size += len(bson.encode(document))
+            yield document
+    finally:
+        args.update(documents=documents, bytes=size)
+        tracer.record(name, category, start, time.perf_counter_ns(), args)
+
+
+def flush():
+    """Write the trace and profile collected so far
+
+    Runs at exit in the main process; worker processes of a pool do not run exit handlers, so the
+    functions they execute call it when they are done.
+    """
+    if _tracer is not None:
+        _tracer.write()
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(process_path(_profile_path, ".prof"))
+        _profiler.enable()
+
+
+if os.environ.get(TRACE_VARIABLE) or os.environ.get(PROFILE_VARIABLE):
+    enable(os.environ.get(TRACE_VARIABLE), os.environ.get(PROFILE_VARIABLE))
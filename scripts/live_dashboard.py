@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+import os
+import math
+import time
+import argparse
+from datetime import datetime
+
+import pandas as pd
+import pymongo.errors
+
+from MongoInterface import MongoInterface
+from statistical_pipeline import StatisticalPipeline
+from hrtp_core import DATABASES, RESULTS_COLLECTION
+from duration_statistics import RECIPE_NAMES, ORDER
+from recipe_index import parse_recipe
+
+OUTPUT_FILE = "live_durations.html"
+REFRESH_SECONDS = 5.0
+BATCH_SIZE = 1000  # documents folded between two checks of the refresh interval
+TASK_FIELDS = {"_id": True, "recipe": True, "t_start": True, "t_end": True}
+
+
+class LiveDurations:
+    """Recipe durations and per planner type count/mean/std, updated one task result at a time
+
+    A recipe lasts from its first task start to its last task end, so a new task result only moves the
+    start/end of its own recipe and the running sums of that recipe's planner type: the cost of an update
+    does not depend on how many runs are stored. min/max make updates idempotent, so documents seen twice
+    (by the initial aggregation and by the change stream) are harmless.
+    """
+
+    def __init__(self, planner_types: dict = RECIPE_NAMES):
+        self.planner_types = planner_types
+        self.recipes = {}  # recipe -> [start, end, planner type]
+        self.totals = {}  # planner type -> [runs, sum of durations, sum of squared durations]
+
+    def planner_type(self, recipe: str):
+        fields = parse_recipe(recipe)
+        return self.planner_types.get(fields["planner"]) if fields else None
+
+    def update(self, recipe: str, start, end) -> bool:
+        """Extend a recipe with a task (or recipe) interval; returns whether its duration changed"""
+        if not isinstance(recipe, str) or start is None or end is None:
+            return False
+        entry = self.recipes.get(recipe)
+        if entry is None:
+            planner_type = self.planner_type(recipe)
+            if planner_type is None:
+                return False
+            entry = self.recipes[recipe] = [start, end, planner_type]
+            totals = self.totals.setdefault(planner_type, [0, 0.0, 0.0])
+            totals[0] += 1
+            duration = end - start
+            totals[1] += duration
+            totals[2] += duration * duration
+            return True
+        previous = entry[1] - entry[0]
+        entry[0], entry[1] = min(entry[0], start), max(entry[1], end)
+        duration = entry[1] - entry[0]
+        if duration == previous:
+            return False
+        totals = self.totals[entry[2]]
+        totals[1] += duration - previous
+        totals[2] += duration * duration - previous * previous
+        return True
+
+    def add(self, documents) -> int:
+        """Fold task result documents (recipe, t_start, t_end); returns the number of recipes changed"""
+        return sum(self.update(document.get("recipe"), document.get("t_start"), document.get("t_end"))
+                   for document in documents)
+
+    def add_recipes(self, documents) -> int:
+        """Fold recipes_duration_pipeline documents (recipe_name, recipe_start, recipe_end)"""
+        return sum(self.update(document.get("recipe_name"), document.get("recipe_start"), document.get("recipe_end"))
+                   for document in documents)
+
+    def frame(self) -> pd.DataFrame:
+        """Recipe durations, with the columns of duration_tables"""
+        return pd.DataFrame({
+            "Plan Duration (s)": [end - start for start, end, _ in self.recipes.values()],
+            "Task Planner Type": [planner_type for _, _, planner_type in self.recipes.values()]
+        })
+
+    def summary(self) -> pd.DataFrame:
+        rows = []
+        for planner_type in ORDER + sorted(set(self.totals) - set(ORDER)):
+            if planner_type not in self.totals:
+                continue
+            runs, total, squares = self.totals[planner_type]
+            mean = total / runs
+            std = math.sqrt(max(squares / runs - mean * mean, 0.0) * runs / (runs - 1)) if runs > 1 else math.nan
+            rows.append([planner_type, runs, mean, std])
+        return pd.DataFrame(rows, columns=["Task Planner Type", "Runs", "Mean Duration (s)", "Std Duration (s)"])
+
+
+def open_change_stream(collection, refresh: float):
+    """Change stream of the inserted documents, None when the server does not support it (standalone mongod)"""
+    try:
+        return collection.watch([{"$match": {"operationType": "insert"}}], max_await_time_ms=int(refresh * 1000))
+    except pymongo.errors.OperationFailure:
+        return None
+
+
+def stream_batches(stream, batch_size: int = BATCH_SIZE):
+    """Inserted documents of a change stream, in batches (empty when nothing arrived within max_await_time_ms)"""
+    with stream:
+        while stream.alive:
+            batch = []
+            change = stream.try_next()
+            while change is not None:
+                batch.append(change["fullDocument"])
+                if len(batch) >= batch_size:
+                    break
+                change = stream.try_next()
+            yield batch
+
+
+def tail_batches(collection, last_id, refresh: float, batch_size: int = BATCH_SIZE):
+    """Documents with an _id above last_id, polled every refresh seconds (ObjectIds grow with insertion time)"""
+    while True:
+        batch = list(collection.find({} if last_id is None else {"_id": {"$gt": last_id}}, TASK_FIELDS)
+                     .sort("_id", 1).limit(batch_size))
+        if batch:
+            last_id = batch[-1]["_id"]
+        else:
+            time.sleep(refresh)
+        yield batch
+
+
+def write_dashboard(live: LiveDurations, path: str, refresh: float, title: str):
+    """Box plot of the durations (as in duration_statistics.py --plotly) in an HTML page reloading itself"""
+    import plotly.express as px
+
+    runs = live.frame()
+    figure = px.box(runs, x="Plan Duration (s)", y="Task Planner Type", color="Task Planner Type",
+                    category_orders={"Task Planner Type": ORDER},
+                    title=f"{title}: {len(runs)} runs, updated {datetime.now():%H:%M:%S}")
+    summary = live.summary().to_html(index=False, float_format="{:.2f}".format)
+    html = figure.to_html(full_html=True, include_plotlyjs="cdn")
+    html = html.replace("<head>", f'<head><meta http-equiv="refresh" content="{max(1, round(refresh))}">', 1)
+    html = html.replace("</body>", summary + "</body>", 1)
+    with open(path + ".tmp", 'w') as file:
+        file.write(html)
+    os.replace(path + ".tmp", path)
+
+
+def run_dashboard(mongo_interface: MongoInterface, collection_name: str = RESULTS_COLLECTION,
+                  output: str = OUTPUT_FILE, refresh: float = REFRESH_SECONDS, poll: bool = False):
+    """Keep output up to date with the durations of collection_name until interrupted"""
+    collection = mongo_interface.get_collection(collection_name)
+    # Subscribe (or note where to tail from) before the initial aggregation, so no insert falls in between
+    stream = None if poll else open_change_stream(collection, refresh)
+    last_id = None
+    if stream is None:
+        newest = collection.find_one({}, {"_id": True}, sort=[("_id", -1)])
+        last_id = newest["_id"] if newest else None
+
+    live = LiveDurations()
+    live.add_recipes(mongo_interface.query(collection_name, StatisticalPipeline.recipes_duration_pipeline()))
+    batches = stream_batches(stream) if stream is not None else tail_batches(collection, last_id, refresh)
+    print(f"{len(live.recipes)} runs loaded, following {collection_name} "
+          f"({'change stream' if stream is not None else 'polling by _id'}), writing {output}")
+
+    title = f"{mongo_interface.database_name}.{collection_name}"
+    write_dashboard(live, output, refresh, title)
+    rendered = time.monotonic()
+    pending = 0
+    for batch in batches:
+        pending += live.add(batch)
+        if pending and time.monotonic() - rendered >= refresh:
+            write_dashboard(live, output, refresh, title)
+            print(f"{datetime.now():%H:%M:%S} {pending} runs updated, {len(live.recipes)} runs")
+            rendered = time.monotonic()
+            pending = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live box plot of the plan durations, updated as task results are "
+                                                 "written to the database.")
+    parser.add_argument("--experiment", choices=DATABASES.keys(), required=True, help="Select the database to use")
+    parser.add_argument("--collection", default=RESULTS_COLLECTION, help="Collection of the task results")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="HTML page written (and reloaded by the browser)")
+    parser.add_argument("--refresh", type=float, default=REFRESH_SECONDS, help="Seconds between two page updates")
+    parser.add_argument("--poll", action="store_true", help="Poll for new documents by _id instead of using a change stream")
+
+    args = parser.parse_args()
+
+    try:
+        run_dashboard(MongoInterface(DATABASES[args.experiment]), args.collection, args.output, args.refresh, args.poll)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
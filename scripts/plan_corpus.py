@@ -0,0 +1,193 @@
+#! /usr/bin/env python3
+
+import os
+import re
+import glob
+import json
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from instrumentation import traced
+
+# libyaml bindings when available (pyyaml built without them falls back to the pure-Python loader)
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+CACHE_DIR = ".plan_cache"
+PARALLEL_THRESHOLD = 64  # below this many files a process pool costs more than it saves
+
+# Where the task plans of each experiment live
+PLAN_DIRECTORIES = {
+    "safety_areas": "safety_areas/TPs_solutions",
+    "velocity_scaling": "velocity_scaling/TPs_solutions",
+    "hrc_case_study": "hrc_case_study/hrc_case_study_results/TPs_solutions"
+}
+
+# Plan folder -> planner type (same labels as the recipe names of the databases)
+PLANNER_FOLDERS = {
+    "BaselineTP": "Baseline TP",
+    "Baseline": "Baseline TP",
+    "NotNeighboring": "Not Neighboring TP",
+    "HA_RELAXED": "HA-TP (Relaxed)",
+    "HA-Relaxed": "HA-TP (Relaxed)",
+    "HA": "HA-TP"
+}
+
+PLAN_PATTERN = "recipe_solution_*.yaml"
+RECIPE_NUMBER = re.compile(r"^recipe_solution_(\d+)_")
+TASK_INDEX = re.compile(r"_\d+$")
+
+PLAN_COLUMNS = ["plan_id", "experiment", "planner_type", "recipe"]
+CATEGORICAL_TASK_COLUMNS = ["task", "skill", "agent"]
+
+
+def plan_paths(experiment: str) -> list:
+    """Plan files of an experiment, grouped by planner folder"""
+    directory = PLAN_DIRECTORIES[experiment]
+    return sorted(glob.glob(os.path.join(directory, "*", PLAN_PATTERN)))
+
+
+def plan_metadata(path: str, experiment: str) -> dict:
+    folder = os.path.basename(os.path.dirname(path))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    recipe = RECIPE_NUMBER.match(stem)
+    return {
+        "plan_id": f"{experiment}/{folder}/{stem}",
+        "experiment": experiment,
+        "planner_type": PLANNER_FOLDERS.get(folder, folder),
+        "recipe": int(recipe.group(1)) if recipe else -1
+    }
+
+
+def load_plan(path: str) -> dict:
+    """task name -> {t_start, t_end, agent}"""
+    with open(path, 'r') as file:
+        return yaml.load(file, Loader=YAML_LOADER) or {}
+
+
+@traced("plans.parse")
+def parse_plans(paths: list, max_workers: int = None) -> list:
+    """Parse plan files, in a process pool when there are enough of them"""
+    if max_workers == 1 or len(paths) < PARALLEL_THRESHOLD:
+        return [load_plan(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(load_plan, paths, chunksize=max(1, len(paths) // (4 * (os.cpu_count() or 1)))))
+
+
+def source_stats(paths: list) -> list:
+    """(path, size, mtime) of every plan file, used to invalidate the cache"""
+    stats = []
+    for path in paths:
+        stat = os.stat(path)
+        stats.append([path, stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+@dataclass
+class PlanTable:
+    """All the tasks of a set of plans in flat arrays
+
+    plans has one row per plan; tasks one row per planned task, grouped by plan (tasks.plan is the
+    row of the plan in plans) so each plan is the contiguous range offsets[p]:offsets[p + 1].
+    """
+    plans: pd.DataFrame
+    tasks: pd.DataFrame
+
+    @property
+    def offsets(self) -> np.ndarray:
+        counts = np.bincount(self.tasks["plan"].to_numpy(), minlength=len(self.plans))
+        return np.concatenate([[0], np.cumsum(counts)])
+
+    @classmethod
+    def from_plans(cls, metadata: list, plans: list) -> "PlanTable":
+        """Build the table from plan metadata (plan_metadata) and parsed plans (load_plan)"""
+        counts = [len(plan) for plan in plans]
+        entries = [(task, values) for plan in plans for task, values in plan.items()]
+        task_names = pd.Series([task for task, _ in entries], dtype=object)
+        tasks = pd.DataFrame({
+            "plan": np.repeat(np.arange(len(plans), dtype=np.int32), counts),
+            "task": task_names.astype("category"),
+            "skill": task_names.str.replace(TASK_INDEX, "", regex=True).astype("category"),
+            "agent": pd.Categorical([values["agent"] for _, values in entries]),
+            "t_start": np.array([values["t_start"] for _, values in entries], dtype=np.float64),
+            "t_end": np.array([values["t_end"] for _, values in entries], dtype=np.float64)
+        })
+        return cls(pd.DataFrame(metadata, columns=PLAN_COLUMNS), tasks)
+
+    @classmethod
+    def concat(cls, tables: list) -> "PlanTable":
+        """Stack tables, renumbering the plans and unifying the categories"""
+        plan_offsets = np.cumsum([0] + [len(table.plans) for table in tables[:-1]])
+        tasks = pd.concat([table.tasks.assign(plan=table.tasks["plan"] + offset)
+                           for table, offset in zip(tables, plan_offsets)], ignore_index=True)
+        for column in CATEGORICAL_TASK_COLUMNS:
+            tasks[column] = pd.api.types.union_categoricals([table.tasks[column] for table in tables])
+        plans = pd.concat([table.plans for table in tables], ignore_index=True)
+        return cls(plans, tasks)
+
+    @classmethod
+    def load(cls, experiments, cache_dir: str = CACHE_DIR, max_workers: int = None) -> "PlanTable":
+        """Plans of the given experiments, from the binary cache when no plan file changed"""
+        tables = [load_experiment(experiment, cache_dir, max_workers) for experiment in experiments]
+        return tables[0] if len(tables) == 1 else cls.concat(tables)
+
+    def save(self, path: str, sources: list):
+        """Write the table as one uncompressed .npz (categoricals as codes + categories)"""
+        arrays = {
+            "sources": np.array(json.dumps(sources)),
+            "plan": self.tasks["plan"].to_numpy(dtype=np.int32),
+            "t_start": self.tasks["t_start"].to_numpy(),
+            "t_end": self.tasks["t_end"].to_numpy(),
+            "recipe": self.plans["recipe"].to_numpy(dtype=np.int64)
+        }
+        for column in ["plan_id", "experiment", "planner_type"]:
+            arrays[column] = self.plans[column].to_numpy(dtype=str)
+        for column in CATEGORICAL_TASK_COLUMNS:
+            arrays[f"{column}_codes"] = self.tasks[column].cat.codes.to_numpy()
+            arrays[f"{column}_categories"] = self.tasks[column].cat.categories.to_numpy(dtype=str)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def read(cls, path: str):
+        """Table saved with save(), and the source stats it was built from"""
+        with np.load(path, allow_pickle=False) as arrays:
+            plans = pd.DataFrame({column: arrays[column].astype(object) for column in ["plan_id", "experiment",
+                                                                                       "planner_type"]})
+            plans["recipe"] = arrays["recipe"]
+            tasks = pd.DataFrame({"plan": arrays["plan"]})
+            for column in CATEGORICAL_TASK_COLUMNS:
+                tasks[column] = pd.Categorical.from_codes(arrays[f"{column}_codes"],
+                                                          arrays[f"{column}_categories"].astype(object))
+            tasks["t_start"] = arrays["t_start"]
+            tasks["t_end"] = arrays["t_end"]
+            sources = json.loads(str(arrays["sources"]))
+        return cls(plans, tasks), sources
+
+
+def cache_path(experiment: str, cache_dir: str = CACHE_DIR) -> str:
+    return os.path.join(cache_dir, f"{experiment}.npz")
+
+
+def load_experiment(experiment: str, cache_dir: str = CACHE_DIR, max_workers: int = None) -> PlanTable:
+    """Plans of one experiment: cached table if every file has the same size/mtime, else a fresh parse"""
+    paths = plan_paths(experiment)
+    sources = source_stats(paths)
+    cached = cache_path(experiment, cache_dir)
+    if os.path.isfile(cached):
+        try:
+            table, cached_sources = PlanTable.read(cached)
+        except (OSError, ValueError, KeyError):
+            table, cached_sources = None, None
+        if cached_sources == sources:
+            return table
+
+    table = PlanTable.from_plans([plan_metadata(path, experiment) for path in paths],
+                                 parse_plans(paths, max_workers))
+    table.save(cached, sources)
+    return table
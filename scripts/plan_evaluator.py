@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+
+from hrtp_core import DATABASES, SYNERGIES_COLLECTION, ORDER, open_interface
+from plan_corpus import PlanTable
+from synergy_matrix import SynergyMatrix
+from plan_metrics import disjoint_keys, overlapping_pairs
+from instrumentation import traced
+
+HUMAN_AGENT = "human_right_arm"
+ROBOT_AGENT = "ur5_on_guide"
+
+
+def plan_extents(plan, t_start, t_end, n_plans: int):
+    """(first start, last end) of every plan"""
+    start = np.full(n_plans, np.inf)
+    end = np.full(n_plans, -np.inf)
+    np.minimum.at(start, plan, t_start)
+    np.maximum.at(end, plan, t_end)
+    return start, end
+
+
+def busy_time(group, t_start, t_end, n_groups: int) -> np.ndarray:
+    """Length of the union of the intervals of every group (sweep over start-sorted intervals)
+
+    Each interval only adds the part beyond the furthest end seen so far in its group.
+    """
+    key = disjoint_keys(np.concatenate([t_start, t_end]))
+    order = np.lexsort((t_start, group))
+    starts, ends = key(t_start[order], group[order]), key(t_end[order], group[order])
+    furthest = np.maximum.accumulate(ends)
+    previous = np.concatenate([[-np.inf], furthest[:-1]])    # from an earlier group: below this group's keys
+    covered = np.maximum(ends - np.maximum(starts, previous), 0.0)
+    return np.bincount(group[order], weights=covered, minlength=n_groups)
+
+
+def synergy_skill(synergy_matrix: SynergyMatrix, agent: str, skill: str) -> str:
+    """Skill name used in task_synergies (agent-specific skills such as place_blue_box_<agent>)"""
+    known = synergy_matrix.skills(agent)
+    if skill not in known and f"{skill}_{agent}" in known:
+        return f"{skill}_{agent}"
+    return skill
+
+
+def pair_risks(tasks: pd.DataFrame, first_pairs, second_pairs, synergy_matrix: SynergyMatrix,
+               default_risk: float) -> np.ndarray:
+    """dynamic_risk of every task pair, looked up once per distinct (agent, skill, agent, skill)"""
+    agents, skills = tasks["agent"], tasks["skill"]
+    codes = np.stack([agents.cat.codes.to_numpy()[first_pairs], skills.cat.codes.to_numpy()[first_pairs],
+                      agents.cat.codes.to_numpy()[second_pairs], skills.cat.codes.to_numpy()[second_pairs]], axis=1)
+    distinct, inverse = np.unique(codes, axis=0, return_inverse=True)
+    risks = np.empty(len(distinct))
+    for row, (agent, skill, concurrent_agent, concurrent_skill) in enumerate(distinct):
+        agent, concurrent_agent = agents.cat.categories[agent], agents.cat.categories[concurrent_agent]
+        risks[row] = synergy_matrix.dynamic_risk(
+            agent, synergy_skill(synergy_matrix, agent, skills.cat.categories[skill]),
+            concurrent_agent, synergy_skill(synergy_matrix, concurrent_agent, skills.cat.categories[concurrent_skill]),
+            default=default_risk)
+    return risks[inverse.reshape(-1)]
+
+
+@traced("plans.evaluate")
+def evaluate_plans(table: PlanTable, synergy_matrix: SynergyMatrix, human_agent: str = HUMAN_AGENT,
+                   robot_agent: str = ROBOT_AGENT, default_risk: float = 1.0) -> pd.DataFrame:
+    """Makespan, idle time per agent and synergy-weighted human/robot overlap of every plan
+
+    The overlap cost is the sum, over every overlapping (human task, robot task) pair, of the overlap
+    duration times the dynamic_risk of the pair (default_risk when the pair never appears in the synergies).
+
+    Returns:
+        pd.DataFrame: table.plans with columns makespan, idle_<agent>, overlap_time and overlap_cost
+    """
+    tasks = table.tasks
+    n_plans = len(table.plans)
+    plan = tasks["plan"].to_numpy(dtype=np.intp)
+    t_start, t_end = tasks["t_start"].to_numpy(), tasks["t_end"].to_numpy()
+    agent_codes = tasks["agent"].cat.codes.to_numpy(dtype=np.intp)
+    agents = list(tasks["agent"].cat.categories)
+
+    start, end = plan_extents(plan, t_start, t_end, n_plans)
+    makespan = end - start
+    busy = busy_time(plan * len(agents) + agent_codes, t_start, t_end, n_plans * len(agents))
+    idle = makespan[:, None] - busy.reshape(n_plans, len(agents))
+
+    result = table.plans.copy()
+    result["makespan"] = makespan
+    for column, agent in enumerate(agents):
+        result[f"idle_{agent}"] = idle[:, column]
+
+    agent_names = tasks["agent"].to_numpy()
+    human, robot = np.flatnonzero(agent_names == human_agent), np.flatnonzero(agent_names == robot_agent)
+    first_pairs, second_pairs, overlap = overlapping_pairs(plan, t_start, t_end, human, robot)
+    risks = pair_risks(tasks, first_pairs, second_pairs, synergy_matrix, default_risk)
+    result["overlap_time"] = np.bincount(plan[first_pairs], weights=overlap, minlength=n_plans)
+    result["overlap_cost"] = np.bincount(plan[first_pairs], weights=overlap * risks, minlength=n_plans)
+    return result
+
+
+def planner_summary(scores: pd.DataFrame) -> pd.DataFrame:
+    """Mean scores per planner type (evaluate_plans output), planners in ORDER"""
+    columns = [column for column in scores.columns if column in ("makespan", "overlap_time", "overlap_cost")
+               or column.startswith("idle_")]
+    summary = scores.groupby("planner_type")[columns].mean()
+    summary = summary.reindex([planner for planner in ORDER if planner in summary.index]
+                              + [planner for planner in summary.index if planner not in ORDER])
+    summary.insert(0, "plans", scores.groupby("planner_type").size())
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the task plans of an experiment")
+    parser.add_argument("--experiment", choices=DATABASES.keys(), required=True, help="Select the database to use")
+    parser.add_argument("--latex", action="store_true", help="Output results in LaTeX format")
+    parser.add_argument("--offline", action="store_true", help="Read the collection dumps through the local columnar cache instead of MongoDB")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse cached aggregation results")
+
+    args = parser.parse_args()
+
+    database_name = DATABASES[args.experiment]
+    mongo_interface = open_interface(database_name, args.offline, use_cache=not args.no_cache)
+
+    synergy_matrix = SynergyMatrix.from_interface(mongo_interface, SYNERGIES_COLLECTION)
+    scores = evaluate_plans(PlanTable.load([database_name]), synergy_matrix)
+
+    summary = planner_summary(scores)
+    print(tabulate(summary.astype(object), headers="keys", tablefmt="latex_raw" if args.latex else "github", floatfmt=".2f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+def disjoint_keys(times):
+    """Key function shifting the times of every group onto its own range (group g in [g*span, (g+1)*span))"""
+    low = times.min(initial=0.0)
+    span = times.max(initial=0.0) - low + 1.0
+    return lambda values, group: (values - low) + group * span
+
+
+def overlapping_pairs(plan, t_start, t_end, first, second):
+    """Every (first task, second task) pair of the same plan whose intervals overlap
+
+    The second tasks are sorted by start once; for each first task a binary search bounds the
+    candidates to those starting before it ends and whose running maximum end is after its start,
+    so the work is O((n + pairs) log n) instead of pairwise.
+
+    Args:
+        plan (np.ndarray): Plan index of every task
+        t_start, t_end (np.ndarray): Planned interval of every task
+        first, second (np.ndarray): Positions of the tasks on each side (e.g. human and robot tasks)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: (first positions, second positions, overlap durations)
+    """
+    key = disjoint_keys(np.concatenate([t_start, t_end]))
+    second = second[np.lexsort((t_start[second], plan[second]))]
+    second_starts = key(t_start[second], plan[second])
+    second_furthest = np.maximum.accumulate(key(t_end[second], plan[second]))
+
+    low = np.searchsorted(second_furthest, key(t_start[first], plan[first]), side="right")
+    high = np.searchsorted(second_starts, key(t_end[first], plan[first]), side="left")
+    counts = np.maximum(high - low, 0)
+
+    first_pairs = np.repeat(first, counts)
+    candidate = np.repeat(low - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    second_pairs = second[candidate]
+    overlap = (np.minimum(t_end[first_pairs], t_end[second_pairs])
+               - np.maximum(t_start[first_pairs], t_start[second_pairs]))
+    keep = overlap > 0
+    return first_pairs[keep], second_pairs[keep], overlap[keep]
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+
+import os
+import hashlib
+from dataclasses import dataclass
+
+import bson
+from bson import json_util
+
+CACHE_DIR = ".query_cache"
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+GENERATIONS_COLLECTION = "collection_generations"
+
+
+def bump_generation(collection):
+    """Record an in-place write (update, replacement, deletion) to a collection
+
+    Such writes can leave the document count and the largest _id/date unchanged, so the tools writing
+    in place bump a per-collection counter that is part of the fingerprint.
+    """
+    collection.database[GENERATIONS_COLLECTION].update_one({"_id": collection.name}, {"$inc": {"generation": 1}},
+                                                           upsert=True)
+
+
+def collection_fingerprint(collection) -> dict:
+    """Cheap summary of a collection that changes whenever documents are added, removed or rewritten
+
+    Document count (from collection metadata), the largest _id and date, and the generation bumped by
+    the in-place writers (bump_generation).
+    """
+    generation = collection.database[GENERATIONS_COLLECTION].find_one({"_id": collection.name})
+    newest = collection.find_one({}, {"_id": True}, sort=[("_id", -1)])
+    latest = collection.find_one({"date": {"$exists": True}}, {"_id": False, "date": True}, sort=[("date", -1)])
+    return {
+        "count": collection.estimated_document_count(),
+        "max_id": newest["_id"] if newest else None,
+        "max_date": latest["date"] if latest else None,
+        "generation": generation["generation"] if generation else 0
+    }
+
+
+@dataclass
+class QueryCache:
+    """On-disk cache of aggregation results, one BSON file per (database, collection, pipeline)
+
+    Entries are validated against the collection fingerprint on every read and evicted in least
+    recently used order (file mtime) when the cache grows beyond max_bytes.
+    """
+    directory: str = CACHE_DIR
+    max_bytes: int = MAX_CACHE_BYTES
+
+    @staticmethod
+    def key(database_name: str, collection_name: str, pipeline: list) -> str:
+        # Key order is significant in pipelines ($sort, $project), so the pipeline is not key-sorted
+        canonical = json_util.dumps([database_name, collection_name, pipeline], separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.bson")
+
+    def get(self, key: str, fingerprint: dict):
+        """Cached documents for key, or None when missing or computed on a different collection state"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                header, *documents = bson.decode_all(file.read())
+        except (FileNotFoundError, bson.errors.InvalidBSON, ValueError):
+            return None
+        if header.get("fingerprint") != fingerprint:
+            return None
+        os.utime(path)  # most recently used
+        return documents
+
+    def put(self, key: str, fingerprint: dict, documents: list):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        with open(path + ".tmp", 'wb') as file:
+            file.write(bson.encode({"fingerprint": fingerprint}))
+            for document in documents:
+                file.write(bson.encode(document))
+        os.replace(path + ".tmp", path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".bson"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                # collections synchronised concurrently may clear the cache at the same time
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
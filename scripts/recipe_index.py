@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import re
+
+import pandas as pd
+
+from hrtp_core import RECIPE_NAMES
+
+RECIPES_COLLECTION = "recipes"
+RECIPE_FIELD = "recipe"
+
+# e.g. BASIC_SOLVER_rec_0_rep_0_2023_08_01_09:34_0
+RECIPE_PATTERN = re.compile(r"^(?P<planner>.+?)_rec_(?P<rec>\d+)_rep_(?P<rep>\d+)_(?P<timestamp>.+)_(?P<suffix>\d+)$")
+RECIPE_FIELDS = ["planner", "rec", "rep", "timestamp", "suffix"]
+INTEGER_FIELDS = ["rec", "rep", "suffix"]
+
+
+def parse_recipe(recipe: str):
+    """planner, rec, rep, timestamp and suffix of a recipe identifier
+
+    Returns:
+        dict | None: The fields, None if recipe is not a recipe identifier
+    """
+    match = RECIPE_PATTERN.match(recipe) if isinstance(recipe, str) else None
+    if match is None:
+        return None
+    fields = match.groupdict()
+    fields.update({field: int(fields[field]) for field in INTEGER_FIELDS})
+    return fields
+
+
+def recipe_table(recipes, planner_types: dict = RECIPE_NAMES) -> pd.DataFrame:
+    """Lookup table of the distinct recipes, each identifier parsed once
+
+    The planner type is an exact lookup of the parsed planner, so prefixes sharing a substring (TEST,
+    COMPLETE_SOLVER, COMPLETE_HA_SOLVER) cannot be mistaken for one another.
+
+    Args:
+        recipes (iterable): Recipe identifiers, repeated or not (non-identifiers are dropped)
+        planner_types (dict): planner -> planner type
+
+    Returns:
+        pd.DataFrame: Indexed by recipe: planner, rec, rep, timestamp, suffix and planner_type
+        (planner, timestamp and planner_type categorical, planner_type NaN for unknown planners)
+    """
+    identifiers = pd.Series(pd.unique(pd.Series(list(recipes), dtype=object).dropna()), dtype=object)
+    table = identifiers.astype(str).str.extract(RECIPE_PATTERN)
+    table.index = pd.Index(identifiers, name="recipe")
+    return finish_table(table.dropna(how="all"), planner_types)
+
+
+def table_from_documents(documents, planner_types: dict = RECIPE_NAMES) -> pd.DataFrame:
+    """recipe_table from the documents of the recipes collection (already parsed at import time)"""
+    table = pd.DataFrame(list(documents), columns=["_id"] + RECIPE_FIELDS).set_index("_id")
+    table.index.name = "recipe"
+    return finish_table(table, planner_types)
+
+
+def finish_table(table: pd.DataFrame, planner_types: dict) -> pd.DataFrame:
+    for field in INTEGER_FIELDS:
+        table[field] = table[field].astype("int64")
+    table["planner"] = table["planner"].astype("category")
+    table["timestamp"] = table["timestamp"].astype("category")
+    table["planner_type"] = table["planner"].map(planner_types)
+    return table
+
+
+def recipe_documents(recipes) -> list:
+    """Documents of the recipes collection (_id: recipe identifier, then the parsed fields)"""
+    documents = []
+    for recipe in dict.fromkeys(recipes):
+        fields = parse_recipe(recipe)
+        if fields is not None:
+            documents.append({"_id": recipe, **fields})
+    return documents
+
+
+def store_recipes(collection, recipes_collection: str = RECIPES_COLLECTION) -> int:
+    """Parse the recipes of a (task results) collection into the recipes collection of its database
+
+    Returns:
+        int: Number of recipes stored
+    """
+    from pymongo import ReplaceOne
+
+    documents = recipe_documents(collection.distinct(RECIPE_FIELD))
+    if documents:
+        collection.database[recipes_collection].bulk_write(
+            [ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in documents], ordered=False)
+    return len(documents)
+
+
+def load_recipe_table(mongo_interface, results_collection_name: str, planner_types: dict = RECIPE_NAMES) -> pd.DataFrame:
+    """recipe_table of a database: the stored recipes collection, or the recipes of results_collection_name
+    parsed on the fly (dumps, databases imported before the recipes collection existed)"""
+    if mongo_interface.collection_exist(RECIPES_COLLECTION):
+        table = table_from_documents(mongo_interface.query(RECIPES_COLLECTION, [{"$sort": {"_id": 1}}]), planner_types)
+        if len(table):
+            return table
+    documents = mongo_interface.query(results_collection_name, [{"$group": {"_id": f"${RECIPE_FIELD}"}}])
+    return recipe_table((document["_id"] for document in documents), planner_types)
+
+
+def annotate(frame: pd.DataFrame, table: pd.DataFrame, column: str = RECIPE_FIELD, fields=("rec", "rep")) -> pd.DataFrame:
+    """frame with the fields of the recipe of each row (hash join on the recipe identifier)"""
+    values = table.reindex(frame[column].astype(object))[list(fields)]
+    return frame.assign(**{field: values[field].to_numpy() for field in fields})
@@ -1,11 +1,18 @@
 #! /usr/bin/env python3
 
+import re
+
+
 class StatisticalPipeline:
 
     @staticmethod
     def recipes_duration_pipeline() -> list:
         return [
             {
+                '$sort': {          # Lets the (recipe, t_start, t_end) index feed the group as a covered scan
+                    'recipe': 1
+                }
+            }, {
                 '$group': {
                     '_id': '$recipe',
                     'recipe_start': {
@@ -38,8 +45,9 @@ class StatisticalPipeline:
     def grouped_synergies_pipeline() -> list:
         pipeline = [        # Pipeline to group/separate synergies elements by agent  
         {
-            '$sort': {
-                'agent_skill': 1, 
+            '$sort': {      # agent first so that the (agent, agent_skill, concurrent_skill) index backs the sort
+                'agent': 1,
+                'agent_skill': 1,
                 'concurrent_skill': 1
             }
         }, {
@@ -52,3 +60,193 @@ class StatisticalPipeline:
         }
         ]
         return pipeline
+
+    @staticmethod
+    def synergies_pipeline() -> list:
+        """Flat synergy documents (one per skill pair), in index order"""
+        return [
+            {
+                '$sort': {
+                    'agent': 1,
+                    'agent_skill': 1,
+                    'concurrent_skill': 1
+                }
+            }, {
+                '$project': {
+                    '_id': False,
+                    'agent': True,
+                    'concurrent_agent': True,
+                    'agent_skill': True,
+                    'concurrent_skill': True,
+                    'dynamic_risk': True,
+                    'std_err': True,
+                    'counter': True
+                }
+            }
+        ]
+
+    @staticmethod
+    def recommended_indexes() -> dict:
+        """Compound indexes matching the pipelines above, by collection name
+
+        Returns:
+            dict: collection name -> list of index key specifications
+        """
+        task_results_indexes = [
+            [('recipe', 1), ('t_start', 1), ('t_end', 1)],
+            [('date', -1)]      # newest-document lookup of the query cache fingerprint
+        ]
+        return {
+            'task_results_online': task_results_indexes,
+            'task_results_offline': task_results_indexes,
+            'task_results': task_results_indexes,
+            'utils_task_results': task_results_indexes,
+            'task_synergies': [
+                [('agent', 1), ('agent_skill', 1), ('concurrent_skill', 1)]
+            ]
+        }
+
+    @staticmethod
+    def planner_type_expression(planner_types: dict, recipe_field: str = '$_id') -> dict:
+        """Server-side planner type of a recipe from its identifier prefix (e.g. BASIC_SOLVER_rec_0_rep_0_...)
+
+        Args:
+            planner_types (dict): recipe prefix -> planner type
+            recipe_field (str): Field holding the recipe identifier
+
+        Returns:
+            dict: $switch expression (null when no prefix matches)
+        """
+        return {
+            '$switch': {
+                'branches': [
+                    {
+                        'case': {'$regexMatch': {'input': recipe_field, 'regex': f'^{re.escape(prefix)}_rec_'}},
+                        'then': planner_type
+                    } for prefix, planner_type in planner_types.items()
+                ],
+                'default': None
+            }
+        }
+
+    @staticmethod
+    def planner_durations_pipeline(planner_types: dict) -> list:
+        """recipes_duration_pipeline with the planner type of each recipe (unknown recipes are dropped)"""
+        pipeline = StatisticalPipeline.recipes_duration_pipeline()
+        return pipeline[:-1] + [
+            {
+                '$addFields': {
+                    'planner_type': StatisticalPipeline.planner_type_expression(planner_types)
+                }
+            }, {
+                '$match': {
+                    'planner_type': {'$ne': None}
+                }
+            }
+        ] + [
+            {'$project': {**pipeline[-1]['$project'], 'planner_type': True}}
+        ]
+
+    @staticmethod
+    def planner_duration_summary_pipeline(planner_types: dict, baseline: str = "Baseline TP",
+                                          reference: str = "Not Neighboring TP",
+                                          percentiles: tuple = (0.25, 0.5, 0.75)) -> list:
+        """Per planner type duration statistics and reductions, computed entirely by MongoDB (>= 7.0)
+
+        Returns one document per planner type with count, mean, std, median, percentiles and the
+        percentage reduction of the mean duration with respect to the baseline and reference planners.
+        """
+        def reduction_from(planner_mean: str) -> dict:
+            return {
+                '$multiply': [
+                    {'$divide': [{'$subtract': [planner_mean, '$mean_duration']}, planner_mean]}, 100
+                ]
+            }
+
+        def mean_of(planner_type: str) -> dict:
+            return {'$max': {'$cond': [{'$eq': ['$_id', planner_type]}, '$mean_duration', None]}}
+
+        return StatisticalPipeline.planner_durations_pipeline(planner_types)[:-1] + [
+            {
+                '$group': {
+                    '_id': '$planner_type',
+                    'count': {
+                        '$sum': 1
+                    },
+                    'mean_duration': {
+                        '$avg': '$recipe_duration'
+                    },
+                    'std_duration': {
+                        '$stdDevSamp': '$recipe_duration'
+                    },
+                    'median_duration': {
+                        '$median': {'input': '$recipe_duration', 'method': 'approximate'}
+                    },
+                    'percentiles_duration': {
+                        '$percentile': {'input': '$recipe_duration', 'p': list(percentiles), 'method': 'approximate'}
+                    }
+                }
+            }, {
+                '$setWindowFields': {
+                    'output': {
+                        'baseline_mean': mean_of(baseline),
+                        'reference_mean': mean_of(reference)
+                    }
+                }
+            }, {
+                '$addFields': {
+                    'reduction_from_baseline': reduction_from('$baseline_mean'),
+                    'reduction_from_reference': reduction_from('$reference_mean')
+                }
+            }, {
+                '$project': {
+                    '_id': False,
+                    'planner_type': '$_id',
+                    'count': True,
+                    'mean_duration': True,
+                    'std_duration': True,
+                    'median_duration': True,
+                    'percentiles_duration': True,
+                    'reduction_from_baseline': True,
+                    'reduction_from_reference': True
+                }
+            }, {
+                '$sort': {
+                    'planner_type': 1
+                }
+            }
+        ]
+
+    @staticmethod
+    def task_timings_pipeline(planner_types: dict) -> list:
+        """Planned and executed timing of every task, with the planner type of its recipe
+
+        Sorted by (recipe, t_start) so the (recipe, t_start, t_end) index backs the scan.
+        """
+        return [
+            {
+                '$sort': {
+                    'recipe': 1,
+                    't_start': 1
+                }
+            }, {
+                '$project': {
+                    '_id': False,
+                    'recipe': True,
+                    'planner_type': StatisticalPipeline.planner_type_expression(planner_types, '$recipe'),
+                    'agent': True,
+                    'name': True,
+                    't_start': True,
+                    't_end': True,
+                    't_start_planned': True,
+                    't_end_planned': True,
+                    'duration_planned': True,
+                    'duration_real': True,
+                    'planning_time': True
+                }
+            }, {
+                '$match': {
+                    'planner_type': {'$ne': None}
+                }
+            }
+        ]
@@ -0,0 +1,157 @@
+#! /usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+
+from statistical_pipeline import StatisticalPipeline
+from instrumentation import traced
+
+KNOWN_TASK_NAME = {
+    "pick_blue_box_human_right_arm": "Pick Blue Box (H)",
+    "place_blue_box_human_right_arm": "Place Blue Box (H)",
+    "pick_blue_box_ur5_on_guide": "Pick Blue Box (R)",
+    "place_blue_box_ur5_on_guide": "Place Blue Box (R)",
+    "pick_white_box": "Pick White Box",
+    "place_white_box": "Place White Box",
+    "pick_orange_box": "Pick Orange Box",
+    "place_orange_box": "Place Orange Box",
+    "probe": "Probe_circuit"
+}
+
+AGENT_LABELS = {
+    "ur5_on_guide": {"name": "Robot", "abbreviation": "R"},
+    "manipulator": {"name": "Robot", "abbreviation": "R"},
+    "human_right_arm": {"name": "Human", "abbreviation": "H"},
+    "human": {"name": "Human", "abbreviation": "H"}
+}
+
+SYNERGY_VALUES = ["dynamic_risk", "std_err", "counter"]
+
+
+def get_task_name(raw_task_name):
+    """Method for replacing task names (for charts inherent in the paper)
+
+    Args:
+        agent (str): task name in db
+
+    Returns:
+        str: Paper task name
+    """
+    task_name = KNOWN_TASK_NAME.get(raw_task_name, raw_task_name)
+    task_name = task_name.split('_')
+    task_name = ' '.join(singol_word.capitalize() for singol_word in task_name)
+    return task_name
+
+
+def append_agent_to_skill(skill, agent, skill_keyword="pick_blue_box"):
+    """Append the agent to the skill name if the skill contains the specified keyword
+
+    Args:
+        skill (str): The skill name
+        agent (str): The agent name to append
+        skill_keyword (str): The keyword to check in the skill name
+
+    Returns:
+        str: Modified skill name
+    """
+    if skill_keyword in skill:
+        return f"{skill}_{agent}"
+    return skill
+
+
+def get_agent_label(agent):
+    return AGENT_LABELS.get(agent, {"name": agent, "abbreviation": agent})
+
+
+def map_distinct(values: pd.Series, function) -> pd.Series:
+    """Apply function once per distinct value and broadcast the result (categorical output)"""
+    codes, uniques = pd.factorize(values)
+    mapped = np.array([function(value) for value in uniques], dtype=object)
+    return pd.Series(pd.Categorical(mapped[codes]), index=values.index)
+
+
+class SynergyMatrix:
+    """All the synergy matrices of a task_synergies collection
+
+    Synergies are kept in one frame, one row per (agent, agent skill, concurrent agent, concurrent skill).
+    """
+
+    @traced("synergies.build")
+    def __init__(self, synergies: pd.DataFrame, skill_keyword: str = "pick_blue_box"):
+        """
+        Args:
+            synergies (pd.DataFrame): task_synergies documents (agent, concurrent_agent, agent_skill,
+                concurrent_skill, dynamic_risk, std_err, counter)
+            skill_keyword (str): Skills containing it get the agent appended (see append_agent_to_skill)
+        """
+        frame = synergies.reset_index(drop=True)
+        for column in ["agent", "concurrent_agent", "agent_skill", "concurrent_skill"]:
+            frame[column] = frame[column].astype(str).astype("category")
+
+        for skill_column, agent_column, task_column in [("agent_skill", "agent", "agent_task"),
+                                                        ("concurrent_skill", "concurrent_agent", "concurrent_task")]:
+            skills = frame[skill_column].astype(str)
+            with_agent = skills.str.contains(skill_keyword, regex=False)
+            tasks = skills.where(~with_agent, skills + "_" + frame[agent_column].astype(str))
+            frame[task_column] = tasks.astype("category")
+            frame[task_column + "_label"] = map_distinct(frame[task_column], get_task_name)
+
+        self.frame = frame
+        self._positions = {
+            key: position for position, key in
+            enumerate(zip(frame["agent"], frame["agent_skill"], frame["concurrent_agent"], frame["concurrent_skill"]))
+        }
+
+    @classmethod
+    def from_interface(cls, interface, collection_name: str = "task_synergies", **kwargs) -> "SynergyMatrix":
+        """Load the synergies through a MongoInterface (or LocalInterface)"""
+        documents = list(interface.query(collection_name, StatisticalPipeline.synergies_pipeline()))
+        return cls(pd.DataFrame(documents), **kwargs)
+
+    def duplicated(self) -> pd.Series:
+        """Rows describing the same (agent task, concurrent task) pair more than once"""
+        return self.frame.duplicated(["agent", "concurrent_agent", "agent_task", "concurrent_task"])
+
+    def agent_pairs(self) -> list:
+        """(agent, concurrent agent) pairs, in order of appearance"""
+        return list(dict.fromkeys(zip(self.frame["agent"], self.frame["concurrent_agent"])))
+
+    def skills(self, agent: str) -> set:
+        """Skill names of an agent, as stored in the collection"""
+        as_agent = self.frame.loc[self.frame["agent"] == agent, "agent_skill"]
+        as_concurrent = self.frame.loc[self.frame["concurrent_agent"] == agent, "concurrent_skill"]
+        return set(as_agent.astype(str)) | set(as_concurrent.astype(str))
+
+    @traced("synergies.matrices")
+    def matrices(self, agent: str, concurrent_agent: str, labels: bool = True) -> pd.DataFrame:
+        """dynamic_risk, std_err and counter matrices of one agent pair, built with one pivot_table
+
+        Returns:
+            pd.DataFrame: Rows are the agent tasks, columns a (value, concurrent task) MultiIndex
+        """
+        pair = self.frame[(self.frame["agent"] == agent) & (self.frame["concurrent_agent"] == concurrent_agent)]
+        index, columns = ("agent_task_label", "concurrent_task_label") if labels else ("agent_task", "concurrent_task")
+        matrices = pair.pivot_table(index=index, columns=columns, values=SYNERGY_VALUES, aggfunc="first",
+                                    observed=True)
+        matrices.index.name = get_agent_label(agent)["name"] + " Tasks"
+        matrices.columns.names = [None, get_agent_label(concurrent_agent)["name"] + " Tasks"]
+        return matrices
+
+    def matrix(self, agent: str, concurrent_agent: str, value: str = "dynamic_risk", labels: bool = True) -> pd.DataFrame:
+        """Single synergy matrix (rows: agent tasks, columns: concurrent agent tasks)"""
+        return self.matrices(agent, concurrent_agent, labels)[value]
+
+    def lookup(self, agent: str, agent_skill: str, concurrent_agent: str, concurrent_skill: str):
+        """O(1) access to the synergy of a skill pair
+
+        Returns:
+            dict | None: dynamic_risk, std_err and counter, or None if the pair was never observed
+        """
+        position = self._positions.get((agent, agent_skill, concurrent_agent, concurrent_skill))
+        if position is None:
+            return None
+        return {value: self.frame.at[position, value] for value in SYNERGY_VALUES}
+
+    def dynamic_risk(self, agent: str, agent_skill: str, concurrent_agent: str, concurrent_skill: str, default=None):
+        synergy = self.lookup(agent, agent_skill, concurrent_agent, concurrent_skill)
+        return default if synergy is None else synergy["dynamic_risk"]
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# Size of the shipped safety_areas data, scale 1
+RUNS_PER_PLANNER = 50
+PLANS_PER_PLANNER = 25
+DISTANCE_SAMPLES_PER_RUN = 3000  # ~100 s of monitoring at 30 Hz
+SKILLS_PER_AGENT = 4
+
+HUMAN_AGENT = "human_right_arm"
+ROBOT_AGENT = "ur5_on_guide"
+
+# Recipe prefix of task_results_online, recipe prefix of hr_distance.csv and TPs_solutions folder of each planner
+PLANNERS = [
+    ("BASIC_SOLVER", "BASIC_SOLVER", "BaselineTP"),
+    ("NOT_NEIGHBORING_TASKS", "NOT_NEIGHBORING_SOLVER", "NotNeighboring"),
+    ("RELAXED_HA_SOLVER", "RELAXED_HA_SOLVER", "HA_RELAXED"),
+    ("COMPLETE_HA_SOLVER", "COMPLETE_HA_SOLVER", "HA")
+]
+
+# The task sequence of one recipe run: (agent, skill, repetitions)
+RUN_TASKS = [
+    (HUMAN_AGENT, "pick_blue_box", 2), (HUMAN_AGENT, "pick_white_box", 4),
+    (HUMAN_AGENT, "place_blue_box_human_right_arm", 2), (HUMAN_AGENT, "place_white_box", 4),
+    (ROBOT_AGENT, "pick_blue_box", 2), (ROBOT_AGENT, "pick_orange_box", 4),
+    (ROBOT_AGENT, "place_blue_box_ur5_on_guide", 2), (ROBOT_AGENT, "place_orange_box", 4)
+]
+
+META_FILE = "synthetic.json"
+START_DATE = datetime(2023, 7, 19, 10, 0, tzinfo=timezone.utc)
+
+
+def experiment_layout(root: str) -> dict:
+    """Paths of the synthetic experiment, laid out like safety_areas"""
+    return {
+        "collections": os.path.join(root, "Mongodb_Collections"),
+        "task_results_online": os.path.join(root, "Mongodb_Collections", "task_results_online"),
+        "task_synergies": os.path.join(root, "Mongodb_Collections", "task_synergies"),
+        "hr_distance": os.path.join(root, "Distance_Monitoring", "hr_distance.csv"),
+        "plans": os.path.join(root, "TPs_solutions")
+    }
+
+
+def object_ids(start: int, count: int, timestamp: int = 0x64b7b636) -> list:
+    return [f"{timestamp:08x}{counter:016x}" for counter in range(start, start + count)]
+
+
+def write_extended_json(path: str, frame: pd.DataFrame, object_id_column: str = "_id", date_column: str = None):
+    """Write the rows as a mongoexport --jsonArray dump ($oid/$date wrapped fields)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    records = frame.to_dict("records")
+    with open(path, 'w') as file:
+        file.write("[")
+        for index, record in enumerate(records):
+            record[object_id_column] = {"$oid": record[object_id_column]}
+            if date_column is not None:
+                record[date_column] = {"$date": record[date_column]}
+            file.write(("," if index else "") + json.dumps(record))
+        file.write("]")
+
+
+def run_tasks(rng: np.random.Generator, n_runs: int) -> pd.DataFrame:
+    """Executed tasks of n_runs recipe runs: each agent runs its tasks back to back, in a shuffled order"""
+    agents = np.array([agent for agent, _, repetitions in RUN_TASKS for _ in range(repetitions)])
+    skills = np.array([skill for _, skill, repetitions in RUN_TASKS for _ in range(repetitions)])
+    per_run = len(agents)
+
+    order = np.argsort(rng.random((n_runs, per_run)) + (agents == ROBOT_AGENT)[None, :], axis=1)
+    agent = agents[order].ravel()
+    skill = skills[order].ravel()
+    duration_planned = rng.uniform(5.0, 8.0, n_runs * per_run)
+    duration_real = duration_planned * rng.lognormal(0.1, 0.1, n_runs * per_run)
+    planning_time = rng.uniform(0.2, 0.5, n_runs * per_run)
+
+    # back to back along each agent's sequence: exclusive cumulative sums within (run, agent)
+    sequence = np.repeat(np.arange(n_runs) * 2, per_run) + (agent == ROBOT_AGENT)
+    group_order = np.argsort(sequence, kind="stable")
+    rank = np.empty_like(group_order)
+    rank[group_order] = np.arange(len(group_order))
+
+    def exclusive_cumsum(values):
+        values = values[group_order]
+        before = np.cumsum(values) - values
+        starts = np.flatnonzero(np.r_[True, sequence[group_order][1:] != sequence[group_order][:-1]])
+        before -= np.repeat(before[starts], np.diff(np.r_[starts, len(values)]))
+        return before[rank]
+
+    t_start_planned = exclusive_cumsum(duration_planned)
+    run_origin = 1689761327.0 + np.repeat(np.arange(n_runs) * 200.0, per_run)
+    t_start = run_origin + exclusive_cumsum(duration_real + planning_time) + planning_time
+    return pd.DataFrame({
+        "run": np.repeat(np.arange(n_runs), per_run),
+        "name": skill,
+        "agent": agent,
+        "duration_planned": duration_planned,
+        "duration_real": duration_real,
+        "planning_time": planning_time,
+        "t_start": t_start,
+        "t_end": t_start + duration_real,
+        "t_start_planned": t_start_planned,
+        "t_end_planned": t_start_planned + duration_planned
+    })
+
+
+def recipe_names(n_runs_per_planner: int, column: int = 0) -> list:
+    """Recipe names shaped like BASIC_SOLVER_rec_0_rep_0_2023_07_19_12:08_0, planners in PLANNERS order"""
+    names = []
+    for planner in PLANNERS:
+        for run in range(n_runs_per_planner):
+            date = START_DATE + timedelta(minutes=run)
+            names.append(f"{planner[column]}_rec_{run // 5}_rep_{run % 5}_{date:%Y_%m_%d_%H:%M}_{run % 2}")
+    return names
+
+
+def task_results_online(rng: np.random.Generator, scale: float) -> pd.DataFrame:
+    runs_per_planner = max(1, int(round(RUNS_PER_PLANNER * scale)))
+    recipes = np.array(recipe_names(runs_per_planner))
+    tasks = run_tasks(rng, len(recipes))
+    dates = pd.to_datetime(tasks["t_end"], unit="s", utc=True)
+    return pd.DataFrame({
+        "_id": object_ids(0, len(tasks)),
+        "name": tasks["name"],
+        "type": tasks["name"].str.split("_").str[0],
+        "outcome": 1,
+        "duration_planned": tasks["duration_planned"],
+        "duration_real": tasks["duration_real"],
+        "planning_time": tasks["planning_time"],
+        "path_length": rng.uniform(3.0, 7.0, len(tasks)),
+        "date": dates.dt.strftime("%Y-%m-%dT%H:%M:%S.%f").str[:-3] + "Z",
+        "recipe": recipes[tasks["run"]],
+        "agent": tasks["agent"],
+        "t_start": tasks["t_start"],
+        "t_end": tasks["t_end"],
+        "t_start_planned": tasks["t_start_planned"],
+        "t_end_planned": tasks["t_end_planned"]
+    })
+
+
+def task_synergies(rng: np.random.Generator, scale: float) -> pd.DataFrame:
+    """Every (skill, concurrent skill) pair of the two agents; the pairs grow linearly with scale"""
+    n_skills = max(1, int(round(SKILLS_PER_AGENT * np.sqrt(scale))))
+    skills = {agent: [skill for skill_agent, skill, _ in RUN_TASKS if skill_agent == agent]
+              for agent in (HUMAN_AGENT, ROBOT_AGENT)}
+    skills = {agent: (names + [f"skill_{index}" for index in range(len(names), n_skills)])[:n_skills]
+              for agent, names in skills.items()}
+    rows = []
+    for agent, concurrent_agent in ((HUMAN_AGENT, ROBOT_AGENT), (ROBOT_AGENT, HUMAN_AGENT)):
+        for agent_skill in skills[agent]:
+            for concurrent_skill in skills[concurrent_agent]:
+                rows.append((agent, concurrent_agent, agent_skill, concurrent_skill))
+    frame = pd.DataFrame(rows, columns=["agent", "concurrent_agent", "agent_skill", "concurrent_skill"])
+    frame.insert(0, "_id", object_ids(0, len(frame), timestamp=0x64afb48d))
+    frame["success_rate"] = 1
+    frame["dynamic_risk"] = rng.uniform(0.5, 2.0, len(frame))
+    frame["std_err"] = rng.uniform(0.01, 0.1, len(frame))
+    frame["counter"] = rng.integers(5, 30, len(frame))
+    return frame
+
+
+def write_distances(path: str, rng: np.random.Generator, scale: float, chunk_runs: int = 200):
+    """hr_distance.csv with one Recipe per run (Timestamp, Mean columns), written run batch by run batch"""
+    runs_per_planner = max(1, int(round(RUNS_PER_PLANNER * scale)))
+    recipes = recipe_names(runs_per_planner, column=1)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    timestamps = np.arange(DISTANCE_SAMPLES_PER_RUN) / 30.0
+    with open(path, 'w') as file:
+        for first in range(0, len(recipes), chunk_runs):
+            batch = recipes[first:first + chunk_runs]
+            # smooth distance profile around 1.5 m with occasional close approaches
+            walk = np.cumsum(rng.normal(0, 0.02, (len(batch), DISTANCE_SAMPLES_PER_RUN)), axis=1)
+            mean = np.abs(1.5 + walk + 0.8 * np.sin(timestamps / 5.0)[None, :]) + 0.2
+            pd.DataFrame({
+                "Recipe": np.repeat(batch, DISTANCE_SAMPLES_PER_RUN),
+                "Timestamp": np.tile(timestamps, len(batch)),
+                "Mean": mean.ravel()
+            }).to_csv(file, header=first == 0, index=False)
+
+
+def write_plans(directory: str, rng: np.random.Generator, scale: float):
+    """TPs_solutions YAML plans (task_<n> -> t_start, t_end, agent), one folder per planner"""
+    plans_per_planner = max(1, int(round(PLANS_PER_PLANNER * scale)))
+    tasks = run_tasks(rng, plans_per_planner * len(PLANNERS))
+    counters = {}
+    lines = []
+    for run, name, agent, t_start, t_end in zip(tasks["run"], tasks["name"], tasks["agent"],
+                                                tasks["t_start_planned"], tasks["t_end_planned"]):
+        counters[(run, name)] = counters.get((run, name), 0) + 1
+        lines.append((run, f"{name}_{counters[(run, name)]}:\n  t_start: {t_start!r}\n  t_end: {t_end!r}\n"
+                           f"  agent: {agent}\n"))
+    per_run = {}
+    for run, text in lines:
+        per_run.setdefault(run, []).append(text)
+    for run, texts in per_run.items():
+        folder = os.path.join(directory, PLANNERS[run // plans_per_planner][2])
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"recipe_solution_{run % plans_per_planner}_online_phase_2023_07_19_12:08.yaml")
+        with open(path, 'w') as file:
+            file.write("".join(texts))
+
+
+def generate(root: str, scale: float = 1.0, seed: int = 0, parts=("results", "synergies", "distances", "plans")) -> dict:
+    """Write a synthetic experiment under root, reusing it if it was generated with the same parameters
+
+    Returns:
+        dict: experiment_layout of root
+    """
+    layout = experiment_layout(root)
+    meta_path = os.path.join(root, META_FILE)
+    meta = {"scale": scale, "seed": seed, "parts": sorted(parts)}
+    if os.path.isfile(meta_path):
+        with open(meta_path, 'r') as file:
+            if json.load(file) == meta:
+                return layout
+
+    rng = np.random.default_rng(seed)
+    if "results" in parts:
+        write_extended_json(layout["task_results_online"], task_results_online(rng, scale), date_column="date")
+    if "synergies" in parts:
+        write_extended_json(layout["task_synergies"], task_synergies(rng, scale))
+    if "distances" in parts:
+        write_distances(layout["hr_distance"], rng, scale)
+    if "plans" in parts:
+        write_plans(layout["plans"], rng, scale)
+    with open(meta_path, 'w') as file:
+        json.dump(meta, file)
+    return layout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic experiment shaped like the shipped data.")
+    parser.add_argument("directory", help="Output directory")
+    parser.add_argument("--scale", type=float, default=1.0, help="Size relative to the shipped data (e.g. 10, 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    args = parser.parse_args()
+
+    for name, path in generate(args.directory, args.scale, args.seed).items():
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+
+import hrtp_core
+from hrtp_core import DATABASES, RESULTS_COLLECTION, ORDER, open_interface
+from statistical_pipeline import StatisticalPipeline
+from instrumentation import traced
+
+# Only the compared planners
+RECIPE_NAMES = {prefix: planner_type for prefix, planner_type in hrtp_core.RECIPE_NAMES.items() if planner_type in ORDER}
+
+RUN_COLUMNS = ["tasks", "makespan_planned", "makespan_real", "makespan_drift", "mean_start_drift",
+               "max_start_drift", "total_overrun", "max_propagated_delay", "planning_time", "planning_overhead"]
+
+
+def group_bounds(codes: np.ndarray):
+    """Start of every group of a sorted code array, and the group index of every row"""
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.intp)
+    group = np.cumsum(np.r_[False, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.intp)
+    return starts, group
+
+
+def exclusive_group_cumsum(values: np.ndarray, starts: np.ndarray, group: np.ndarray) -> np.ndarray:
+    """Sum of the previous values of the same group (groups contiguous)"""
+    before = np.cumsum(values) - values
+    return before - before[starts][group]
+
+
+@traced("timing.deviations")
+def timing_deviations(tasks: pd.DataFrame) -> pd.DataFrame:
+    """Per-task deviation between the planned and the executed timeline
+
+    Executed times are taken relative to the first executed start of the run, planned ones are already
+    relative to the plan start. Along each agent's sequence (planned order), the start drift is split into
+    the agent's own previous overruns (duration_real - duration_planned) and the propagated delay, i.e.
+    the part inherited from waiting on the other agent or on planning.
+
+    Args:
+        tasks (pd.DataFrame): task_timings_pipeline documents
+
+    Returns:
+        pd.DataFrame: tasks sorted by (recipe, agent, t_start_planned), with run, start_drift, end_drift,
+        overrun, cumulative_overrun and propagated_delay columns
+    """
+    run_codes, runs = pd.factorize(tasks["recipe"], sort=True)
+    agent_codes, _ = pd.factorize(tasks["agent"], sort=True)
+    t_start_planned = tasks["t_start_planned"].to_numpy(dtype=np.float64)
+    order = np.lexsort((t_start_planned, agent_codes, run_codes))
+
+    tasks = tasks.iloc[order].reset_index(drop=True)
+    run_codes, agent_codes = run_codes[order], agent_codes[order]
+    t_start, t_end = tasks["t_start"].to_numpy(dtype=np.float64), tasks["t_end"].to_numpy(dtype=np.float64)
+
+    run_starts, run = group_bounds(run_codes)
+    run_origin = np.minimum.reduceat(t_start, run_starts) if len(run_starts) else np.array([])
+    start_drift = (t_start - run_origin[run]) - tasks["t_start_planned"].to_numpy(dtype=np.float64)
+    end_drift = (t_end - run_origin[run]) - tasks["t_end_planned"].to_numpy(dtype=np.float64)
+    overrun = tasks["duration_real"].to_numpy(dtype=np.float64) - tasks["duration_planned"].to_numpy(dtype=np.float64)
+
+    sequence_starts, sequence = group_bounds(run_codes * (int(agent_codes.max(initial=0)) + 1) + agent_codes)
+    cumulative_overrun = exclusive_group_cumsum(overrun, sequence_starts, sequence)
+
+    tasks["run"] = run
+    tasks["start_drift"] = start_drift
+    tasks["end_drift"] = end_drift
+    tasks["overrun"] = overrun
+    tasks["cumulative_overrun"] = cumulative_overrun
+    tasks["propagated_delay"] = start_drift - cumulative_overrun
+    tasks.attrs["runs"] = list(runs)
+    return tasks
+
+
+@traced("timing.runs")
+def run_deviations(deviations: pd.DataFrame) -> pd.DataFrame:
+    """Per-run drift, delay propagation and planning overhead from timing_deviations output
+
+    Returns:
+        pd.DataFrame: One row per recipe run: recipe, planner_type and RUN_COLUMNS
+    """
+    run = deviations["run"].to_numpy()
+    n_runs = len(deviations.attrs["runs"])
+
+    def per_run(ufunc, column, initial):
+        result = np.full(n_runs, initial)
+        ufunc.at(result, run, deviations[column].to_numpy(dtype=np.float64))
+        return result
+
+    counts = np.bincount(run, minlength=n_runs)
+    makespan_planned = per_run(np.maximum, "t_end_planned", -np.inf) - per_run(np.minimum, "t_start_planned", np.inf)
+    makespan_real = per_run(np.maximum, "t_end", -np.inf) - per_run(np.minimum, "t_start", np.inf)
+    planning_time = np.bincount(run, weights=deviations["planning_time"], minlength=n_runs)
+
+    planner_types = np.empty(n_runs, dtype=object)
+    planner_types[run] = deviations["planner_type"].to_numpy()
+    return pd.DataFrame({
+        "recipe": deviations.attrs["runs"],
+        "planner_type": planner_types,
+        "tasks": counts,
+        "makespan_planned": makespan_planned,
+        "makespan_real": makespan_real,
+        "makespan_drift": makespan_real - makespan_planned,
+        "mean_start_drift": np.bincount(run, weights=deviations["start_drift"], minlength=n_runs) / np.maximum(counts, 1),
+        "max_start_drift": per_run(np.maximum, "start_drift", -np.inf),
+        "total_overrun": np.bincount(run, weights=deviations["overrun"], minlength=n_runs),
+        "max_propagated_delay": per_run(np.maximum, "propagated_delay", -np.inf),
+        "planning_time": planning_time,
+        "planning_overhead": planning_time / makespan_real * 100
+    })
+
+
+def query_run_deviations(mongo_interface, results_collection_name=RESULTS_COLLECTION):
+    """run_deviations of every recipe run of a collection (None when it holds no known recipe)"""
+    pipeline = StatisticalPipeline.task_timings_pipeline(RECIPE_NAMES)
+    tasks = pd.DataFrame(list(mongo_interface.query(results_collection_name, pipeline)))
+    if tasks.empty:
+        return None
+    return run_deviations(timing_deviations(tasks))
+
+
+def planner_summary(runs: pd.DataFrame) -> pd.DataFrame:
+    """Mean run deviations per planner type, planners in ORDER"""
+    summary = runs.groupby("planner_type")[RUN_COLUMNS[1:]].mean()
+    summary = summary.reindex([planner for planner in ORDER if planner in summary.index]
+                              + [planner for planner in summary.index if planner not in ORDER])
+    summary.insert(0, "runs", runs.groupby("planner_type").size())
+    return summary.rename(columns={"planning_overhead": "planning_overhead (%)"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planned vs executed timing of the task plans")
+    parser.add_argument("--experiment", choices=DATABASES.keys(), required=True, help="Select the database to use")
+    parser.add_argument("--latex", action="store_true", help="Output results in LaTeX format")
+    parser.add_argument("--offline", action="store_true", help="Read the collection dumps through the local columnar cache instead of MongoDB")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse cached aggregation results")
+
+    args = parser.parse_args()
+
+    mongo_interface = open_interface(DATABASES[args.experiment], args.offline, use_cache=not args.no_cache)
+
+    runs = query_run_deviations(mongo_interface)
+    if runs is None:
+        return 0
+    summary = planner_summary(runs)
+
+    print(tabulate(summary.astype(object), headers="keys", tablefmt="latex_raw" if args.latex else "github", floatfmt=".2f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import argparse
+
+import pandas as pd
+from pymongo import ReplaceOne, UpdateOne
+
+from MongoInterface import MongoInterface
+from query_cache import bump_generation
+from hrtp_core import DATABASES
+from incremental_statistics import StatisticsState
+
+STATE_COLLECTION = "statistics_state"
+TASK_FIELDS = {"_id": True, "agent": True, "name": True, "recipe": True, "outcome": True, "t_start": True, "t_end": True}
+SYNERGY_KEYS = ("agent", "concurrent_agent", "agent_skill", "concurrent_skill")
+REBUILD_SUFFIX = "_rebuilt"
+
+
+def seed_state(db, source_collection: str, durations_collection: str, synergies_collection: str) -> StatisticsState:
+    """State of the statistics already in the database, with the watermark at the newest task execution
+
+    Built from the stored documents only (the executions are not read); they are kept as they are.
+    Without stored statistics the state is empty, so the first update folds the whole collection.
+    """
+    duration_documents = list(db[durations_collection].find())
+    if not duration_documents:
+        return StatisticsState()
+    newest = db[source_collection].find_one({}, {"_id": True}, sort=[("_id", -1)])
+    return StatisticsState.from_statistics(duration_documents, db[synergies_collection].find(),
+                                           None if newest is None else newest["_id"])
+
+
+def update_statistics(db, source_collection: str = "utils_task_results", durations_collection: str = "task_durations",
+                      synergies_collection: str = "task_synergies", state_collection: str = STATE_COLLECTION) -> int:
+    """Fold the task executions added to source_collection since the last update into the statistics
+
+    Only documents with an _id above the stored watermark are read, plus the already folded executions of
+    the same recipes (needed for the overlaps with the new ones). The first update starts from the statistics
+    already stored (see seed_state) and only records the watermark; only the statistics of the tasks and
+    task pairs that received new executions are rewritten.
+
+    Returns:
+        int: Number of newly folded executions
+    """
+    state = StatisticsState.from_documents(db[state_collection].find())
+    if state.watermark is None and not state.durations:
+        state = seed_state(db, source_collection, durations_collection, synergies_collection)
+        if state.watermark is not None:
+            db[state_collection].bulk_write([ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+                                             for document in state.to_documents()], ordered=False)
+    new_filter = {} if state.watermark is None else {"_id": {"$gt": state.watermark}}
+    new_documents = list(db[source_collection].find(new_filter, TASK_FIELDS).sort("_id", 1))
+    if not new_documents:
+        return 0
+
+    context = []
+    if state.watermark is not None:
+        recipes = list({document["recipe"] for document in new_documents})
+        context = list(db[source_collection].find({"recipe": {"$in": recipes}, "_id": {"$lte": state.watermark}},
+                                                  TASK_FIELDS))
+    tasks = pd.DataFrame(new_documents + context)
+    state.fold(tasks, new=tasks.index < len(new_documents))
+    state.watermark = new_documents[-1]["_id"]
+
+    # Statistics first, state last: an interrupted update is simply redone from the previous state
+    db[durations_collection].bulk_write([ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+                                         for document in state.duration_documents(state.changed_durations)],
+                                        ordered=False)
+    if state.changed_synergies:
+        db[synergies_collection].bulk_write([UpdateOne({key: document[key] for key in SYNERGY_KEYS},
+                                                       {"$set": document}, upsert=True)
+                                             for document in state.synergy_documents(state.changed_synergies)],
+                                            ordered=False)
+    # In-place updates leave the document counts unchanged: the cached results and reports must see them
+    bump_generation(db[durations_collection])
+    bump_generation(db[synergies_collection])
+    db[state_collection].bulk_write([ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+                                     for document in state.to_documents()], ordered=False)
+    return len(new_documents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold new task executions into task_durations and task_synergies.")
+    parser.add_argument("--experiment", choices=DATABASES.keys(), required=True, help="Select the database to use")
+    parser.add_argument("--source", default="utils_task_results", choices=["utils_task_results", "task_results_online"],
+                        help="Collection of the task executions")
+    parser.add_argument("--rebuild", action="store_true",
+                        help=f"Recompute the statistics from all the task executions into separate collections "
+                             f"(suffixed {REBUILD_SUFFIX}), leaving the stored ones untouched")
+
+    args = parser.parse_args()
+
+    mongo_interface = MongoInterface(DATABASES[args.experiment])
+    if args.rebuild:
+        collections = [name + REBUILD_SUFFIX for name in ("task_durations", "task_synergies", STATE_COLLECTION)]
+        for name in collections:
+            mongo_interface.db.drop_collection(name)
+        folded = update_statistics(mongo_interface.db, args.source, *collections)
+    else:
+        folded = update_statistics(mongo_interface.db, args.source)
+    print(f"{folded} new task executions folded")
+
+
+if __name__ == "__main__":
+    main()